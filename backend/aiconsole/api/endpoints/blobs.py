@@ -0,0 +1,56 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import re
+
+from fastapi import APIRouter, Request, Response, status
+from fastapi.responses import FileResponse
+
+from aiconsole.core.blobs.blob_store import get_blob_media_type, get_blob_path
+
+router = APIRouter()
+
+_SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+# Content of a blob never changes, its address is its hash
+_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Shown by the browser, any other content, like HTML or JavaScript output, is only downloaded and never run in the
+# origin of the app
+_INLINE_MEDIA_TYPES = {"image/png", "image/jpeg", "text/plain"}
+
+
+@router.get("/{sha256}")
+async def get_blob(sha256: str, request: Request):
+    if not _SHA256_PATTERN.fullmatch(sha256):
+        return Response(status_code=status.HTTP_400_BAD_REQUEST, content="Invalid blob hash")
+
+    file_path = get_blob_path(sha256)
+    if not file_path.exists():
+        return Response(status_code=status.HTTP_404_NOT_FOUND, content="Blob not found")
+
+    etag = f'"{sha256}"'
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL, "X-Content-Type-Options": "nosniff"}
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    media_type = get_blob_media_type(sha256) or "application/octet-stream"
+    if media_type not in _INLINE_MEDIA_TYPES:
+        headers["Content-Disposition"] = "attachment"
+        headers["Content-Security-Policy"] = "sandbox"
+
+    # Streamed from disk in chunks
+    return FileResponse(file_path, media_type=media_type, headers=headers)
@@ -17,10 +17,12 @@
 
 from fastapi import APIRouter
 
-from aiconsole.api.endpoints.chats import chat, chat_options, index
+from aiconsole.api.endpoints.chats import archive, chat, chat_options, index, search
 
 router = APIRouter()
 
 router.include_router(index.router)
+router.include_router(search.router)
+router.include_router(archive.router)
 router.include_router(chat.router)
 router.include_router(chat_options.router)
@@ -0,0 +1,77 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import tempfile
+from dataclasses import asdict
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from aiconsole.core.chat.chat_archive import encode_archive, export_chats, import_chats
+from aiconsole.core.chat.chat_cache import chat_cache
+from aiconsole.core.chat.locking import chats
+from aiconsole.core.chat.save_chat_history import chat_writer
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    chat_storage_backend,
+)
+from aiconsole.core.project.paths import get_project_directory
+
+router = APIRouter()
+
+
+@router.get("/export")
+async def export_chats_archive(compress: bool = False):
+    # Saves still being written would be missing from the archive
+    await chat_writer().flush()
+
+    file_name = "chats.ndjson.gz" if compress else "chats.ndjson"
+
+    # A blocking iterator, the response reads it in a thread pool
+    return StreamingResponse(
+        encode_archive(export_chats(get_project_directory()), compress=compress),
+        media_type="application/gzip" if compress else "application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{file_name}"'},
+    )
+
+
+@router.post("/import")
+async def import_chats_archive(request: Request, replace: bool = False):
+    await chat_writer().flush()
+
+    # Spooled to disk, so the size of the archive does not matter
+    with tempfile.TemporaryFile() as f:
+        async for chunk in request.stream():
+            f.write(chunk)
+        f.seek(0)
+
+        try:
+            report = await asyncio.to_thread(
+                import_chats,
+                f,
+                get_project_directory(),
+                replace=replace,
+                # Locked chats are being worked on, their next save would overwrite the imported version
+                skip_chat_ids=set(chats),
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if report.imported:
+        chat_cache().clear()
+        await chat_storage_backend().reconcile()
+
+    return asdict(report)
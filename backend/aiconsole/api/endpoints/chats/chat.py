@@ -14,10 +14,16 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from fastapi import APIRouter, Response, status
-from send2trash import send2trash
 
+from aiconsole.core.chat.chat_cache import chat_cache
+from aiconsole.core.chat.chat_journal import truncate_chat_journal
+from aiconsole.core.chat.chat_search_index import chat_search_index
+from aiconsole.core.chat.chat_storage import run_in_storage_thread
 from aiconsole.core.chat.load_chat_history import load_chat_history
-from aiconsole.core.chat.save_chat_history import save_chat_history
+from aiconsole.core.chat.save_chat_history import chat_writer
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    chat_storage_backend,
+)
 from aiconsole.core.project.paths import get_history_directory
 
 router = APIRouter()
@@ -25,9 +31,13 @@ router = APIRouter()
 
 @router.delete("/{chat_id}")
 async def delete_history(chat_id: str):
-    file_path = get_history_directory() / f"{chat_id}.json"
-    if file_path.exists():
-        send2trash(file_path)
+    # A save still being written would bring the chat back
+    await chat_writer().flush(chat_id)
+
+    if chat_storage_backend().delete(chat_id):
+        truncate_chat_journal(chat_id)
+        chat_cache().invalidate(chat_id)
+        await run_in_storage_thread(chat_search_index().remove, get_history_directory(), chat_id)
         return Response(
             status_code=status.HTTP_200_OK,
             content="Chat history deleted successfully",
@@ -41,7 +51,7 @@ async def delete_history(chat_id: str):
 
 @router.get("/{chat_id}/path")
 async def get_history_path(chat_id: str):
-    return {"path": str(get_history_directory() / f"{chat_id}.json")}
+    return {"path": str(chat_storage_backend().get_location(chat_id))}
 
 
 @router.patch("/{chat_id}")
@@ -49,5 +59,5 @@ async def chat_options(chat_id: str, chat_odj: dict):
     chat = await load_chat_history(id=chat_id)
     if chat_odj.get("name"):
         chat.name = str(chat_odj.get("name"))
-        save_chat_history(chat, scope="name")
+        await chat_writer().save(chat, scope="name")
     return Response(status_code=status.HTTP_200_OK)
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Response, status
 from pydantic import BaseModel
 
 from aiconsole.core.chat.load_chat_history import load_chat_history
-from aiconsole.core.chat.save_chat_history import save_chat_history
+from aiconsole.core.chat.save_chat_history import chat_writer
 
 router = APIRouter()
 
@@ -20,5 +20,5 @@ async def chat_options(chat_id: str, chat_options: Optional[PatchChatOptions] =
     if chat_options:
         for field in chat_options.model_dump(exclude_unset=True):
             setattr(chat.chat_options, field, getattr(chat_options, field))
-        save_chat_history(chat, scope="chat_options")
+        await chat_writer().save(chat, scope="chat_options")
     return Response(status_code=status.HTTP_200_OK)
@@ -0,0 +1,27 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from fastapi import APIRouter, Query
+
+from aiconsole.core.chat.chat_search_index import chat_search_index
+
+router = APIRouter()
+
+
+@router.get("/search")
+async def search_chats(q: str, offset: int = Query(0, ge=0), limit: int = Query(20, ge=1, le=100)):
+    results = await chat_search_index().search(q, offset=offset, limit=limit)
+    return results.model_dump()
@@ -0,0 +1,44 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from dataclasses import asdict
+
+from fastapi import APIRouter
+
+from aiconsole.core.chat.chat_cache import chat_cache
+from aiconsole.core.chat.chat_checkpointer import checkpoint_stats
+from aiconsole.core.chat.locking import get_mutation_queue_depths
+
+router = APIRouter()
+
+
+@router.get("/api/stats")
+async def stats():
+    """
+    Runtime counters of the server, for diagnosing its performance.
+    """
+    cache = chat_cache()
+
+    return {
+        "chat_cache": {
+            "hits": cache.hits,
+            "misses": cache.misses,
+            "chats": len(cache),
+            "size_bytes": cache.size_bytes,
+        },
+        "mutation_queues": get_mutation_queue_depths(),
+        "checkpoints": asdict(checkpoint_stats) | {"average_seconds": checkpoint_stats.average_seconds},
+    }
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from aiconsole.api.endpoints import blobs
+from aiconsole.core.blobs.blob_store import put_blob
+
+
+@pytest.fixture
+def client(project_directory: Path) -> TestClient:
+    app = FastAPI()
+    app.include_router(blobs.router, prefix="/api/blobs")
+    return TestClient(app)
+
+
+def test_should_serve_blob_with_caching_headers(client: TestClient):
+    reference = put_blob(b"Hello", "text/plain")
+
+    response = client.get(reference.url)
+
+    assert response.status_code == 200
+    assert response.content == b"Hello"
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "content-disposition" not in response.headers
+    assert "immutable" in response.headers["cache-control"]
+
+    cached = client.get(reference.url, headers={"If-None-Match": response.headers["etag"]})
+    assert cached.status_code == 304
+
+
+@pytest.mark.parametrize("media_type", ["text/html", "application/javascript"])
+def test_should_serve_active_content_as_a_sandboxed_download(client: TestClient, media_type: str):
+    response = client.get(put_blob(b"<script>alert(1)</script>", media_type).url)
+
+    assert response.headers["content-disposition"] == "attachment"
+    assert response.headers["content-security-policy"] == "sandbox"
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+
+def test_should_reject_unknown_and_invalid_hashes(client: TestClient):
+    assert client.get("/api/blobs/" + "0" * 64).status_code == 404
+    assert client.get("/api/blobs/..%2F..%2Fsecret").status_code in (400, 404)
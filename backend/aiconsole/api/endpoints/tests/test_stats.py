@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from aiconsole.api.endpoints import stats
+from aiconsole.core.chat import locking
+from aiconsole.core.chat.chat_cache import chat_cache
+from aiconsole.core.chat.chat_checkpointer import checkpoint_stats
+from aiconsole.core.chat.locking import DefaultChatMutator, SequentialChatMutator
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(stats.router)
+    return TestClient(app)
+
+
+def test_should_report_checkpoint_latency(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(checkpoint_stats, "checkpoints", 2)
+    monkeypatch.setattr(checkpoint_stats, "total_seconds", 0.5)
+    monkeypatch.setattr(checkpoint_stats, "max_seconds", 0.4)
+
+    checkpoints = client.get("/api/stats").json()["checkpoints"]
+
+    assert checkpoints["checkpoints"] == 2
+    assert checkpoints["average_seconds"] == 0.25
+    assert checkpoints["max_seconds"] == 0.4
+
+
+def test_should_report_chat_cache_hits_and_misses(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(chat_cache(), "hits", 3)
+    monkeypatch.setattr(chat_cache(), "misses", 1)
+
+    cache = client.get("/api/stats").json()["chat_cache"]
+
+    assert (cache["hits"], cache["misses"]) == (3, 1)
+
+
+def test_should_report_mutation_queue_depths(client: TestClient, monkeypatch: pytest.MonkeyPatch):
+    # Actors are bound to the event loop they were started on
+    monkeypatch.setattr(locking, "_mutation_actors", {})
+
+    async def noop():
+        pass
+
+    async def queue_work():
+        chat_mutator = SequentialChatMutator(DefaultChatMutator(chat_id="chat", request_id="r", connection=None))
+        for _ in range(3):
+            await chat_mutator.in_sequence(noop)
+        await chat_mutator.wait_for_all_mutations()
+
+    asyncio.run(queue_work())
+
+    assert client.get("/api/stats").json()["mutation_queues"]["chat"]["max_depth"] >= 3
@@ -52,4 +52,6 @@ async def websocket_endpoint(
                 _log.exception(e)
                 _log.error(f"Error handling message: {e}")
     except WebSocketDisconnect:
+        pass
+    finally:
         connection_manager.disconnect(connection)
@@ -18,6 +18,7 @@ from fastapi import APIRouter
 
 from aiconsole.api.endpoints import (
     agents,
+    blobs,
     chats,
     check_key,
     commands_history,
@@ -28,6 +29,7 @@ from aiconsole.api.endpoints import (
     profile,
     projects,
     settings,
+    stats,
     ws,
 )
 
@@ -36,6 +38,7 @@ app_router = APIRouter()
 app_router.include_router(ping.router)
 app_router.include_router(genui.router)
 app_router.include_router(image.router)
+app_router.include_router(blobs.router, prefix="/api/blobs", tags=["Blobs"])
 app_router.include_router(check_key.router)
 app_router.include_router(profile.router, tags=["Profile"])
 app_router.include_router(chats.router, prefix="/api/chats", tags=["Chats"])
@@ -44,4 +47,5 @@ app_router.include_router(agents.router, prefix="/api/agents", tags=["Agents"])
 app_router.include_router(projects.router, prefix="/api/projects", tags=["Projects"])
 app_router.include_router(settings.router, prefix="/api/settings", tags=["Project Settings"])
 app_router.include_router(commands_history.router)
+app_router.include_router(stats.router)
 app_router.include_router(ws.router)
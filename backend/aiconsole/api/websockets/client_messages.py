@@ -47,6 +47,23 @@ class ReleaseLockClientMessage(BaseClientMessage):
 
 class OpenChatClientMessage(BaseClientMessage):
     request_id: str
+    # Send only this many of the latest message groups, older ones are fetched with FetchMessageGroupsClientMessage
+    window: int | None = None
+
+
+class ResumeChatClientMessage(BaseClientMessage):
+    request_id: str
+    # Epoch of the chat from ChatOpenedServerMessage, sequence numbers from another epoch can not be resumed from
+    epoch: str
+    # Sequence number of the last NotifyAboutChatMutationServerMessage the client has seen for the chat
+    last_seq: int
+
+
+class FetchMessageGroupsClientMessage(BaseClientMessage):
+    request_id: str
+    # Cursor from ChatOpenedServerMessage or ChatMessageGroupsServerMessage
+    before_message_group_id: str
+    limit: int
 
 
 class StopChatClientMessage(BaseClientMessage):
@@ -16,58 +16,310 @@
 """
 Connection manager for websockets. Keeps track of all active connections
 """
+import asyncio
+import json
 import logging
+import time
+from collections import deque
 from dataclasses import dataclass
 from functools import lru_cache
+from typing import Callable, Literal
 
 from fastapi import WebSocket
 
 from aiconsole.api.websockets.base_server_message import BaseServerMessage
+from aiconsole.api.websockets.server_messages import (
+    NotifyAboutChatMutationServerMessage,
+)
+from aiconsole.consts import (
+    WEBSOCKET_OUTBOUND_QUEUE_FULL_POLICY,
+    WEBSOCKET_OUTBOUND_QUEUE_SIZE,
+)
+from aiconsole.core.chat.merge_mutations import merge_mutations
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 _log = logging.getLogger(__name__)
 
 
+@dataclass
+class EncodeStats:
+    messages: int = 0
+    total_seconds: float = 0
+    max_seconds: float = 0
+
+    @property
+    def average_seconds(self) -> float:
+        return self.total_seconds / self.messages if self.messages else 0
+
+
+encode_stats = EncodeStats()
+
+
+def encode_server_message(msg: BaseServerMessage) -> str:
+    """
+    Encodes a message into the text of a websocket frame, uses orjson when it is installed.
+    """
+    start = time.perf_counter()
+
+    data = {"type": msg.get_type(), **msg.model_dump(exclude_none=True, mode="json")}
+    if orjson is not None:
+        encoded = orjson.dumps(data).decode()
+    else:
+        # Same format as WebSocket.send_json
+        encoded = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    elapsed = time.perf_counter() - start
+    encode_stats.messages += 1
+    encode_stats.total_seconds += elapsed
+    encode_stats.max_seconds = max(encode_stats.max_seconds, elapsed)
+    _log.debug(f"Encoded {msg.get_type()} ({len(encoded)} chars) in {elapsed * 1000:.3f}ms")
+
+    return encoded
+
+
 @dataclass(frozen=True)
 class AcquiredLock:
     chat_id: str
     request_id: str
 
 
+OutboundQueueFullPolicy = Literal["drop", "coalesce", "disconnect"]
+
+
+@dataclass
+class _OutboundMessage:
+    message: BaseServerMessage
+    # Shared by all the recipients of a broadcast, None if it has to be encoded again
+    encoded: str | None
+
+
 class AICConnection:
-    def __init__(self, websocket: WebSocket):
+    """
+    Messages are queued and written to the websocket by a writer task, so a slow client
+    never blocks the sender. When the queue is full, queue_full_policy decides what happens:
+
+    drop - the new message is discarded
+    coalesce - the new message is merged into the last queued one if both are mergeable chat mutations,
+               otherwise the connection is closed, as the client would miss part of the chat state
+    disconnect - the connection is closed, the client reconnects and reloads its state
+    """
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        max_queue_size: int = WEBSOCKET_OUTBOUND_QUEUE_SIZE,
+        queue_full_policy: OutboundQueueFullPolicy = WEBSOCKET_OUTBOUND_QUEUE_FULL_POLICY,
+        on_close: Callable[["AICConnection"], None] | None = None,
+    ):
         self.websocket = websocket
         self.open_chats_ids: set[str] = set()
         self.acquired_locks: list[AcquiredLock] = []
+        self.max_queue_size = max_queue_size
+        self.queue_full_policy = queue_full_policy
+        self.dropped_messages = 0
+        self.closed = False
+
+        self._on_close = on_close
+        self._outbound: deque[_OutboundMessage] = deque()
+        self._writer_task: asyncio.Task | None = None
+
+    @property
+    def queue_size(self) -> int:
+        return len(self._outbound)
 
     async def send(self, msg: BaseServerMessage):
-        await self.websocket.send_json({"type": msg.get_type(), **msg.model_dump(exclude_none=True, mode="json")})
+        # Encoded right away, the message might reference state that changes before it is written
+        self.enqueue(msg, encode_server_message(msg))
+
+    def enqueue(self, msg: BaseServerMessage, encoded: str | None = None):
+        """
+        Queues the message for sending without waiting for it to be sent.
+        """
+        if self.closed:
+            return
+
+        if len(self._outbound) >= self.max_queue_size and not self._handle_full_queue(msg):
+            return
+
+        self._outbound.append(_OutboundMessage(msg, encoded))
+
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._write())
+
+    async def drain(self):
+        """
+        Waits until everything queued so far has been written to the websocket.
+        """
+        if self._writer_task is not None:
+            await asyncio.shield(self._writer_task)
+
+    def stop(self):
+        """
+        Stops sending, discarding everything still queued.
+        """
+        self.closed = True
+        self._outbound.clear()
+
+        if self._writer_task is not None and self._writer_task is not asyncio.current_task():
+            self._writer_task.cancel()
+
+    def close(self, reason: str):
+        """
+        Closes the connection from the server side.
+        """
+        if self.closed:
+            return
+
+        _log.warning(f"Closing connection: {reason}")
+        self.stop()
+
+        if self._on_close is not None:
+            self._on_close(self)
+
+        # 1013 - try again later
+        asyncio.create_task(self._close_websocket(code=1013, reason=reason))
+
+    def _handle_full_queue(self, msg: BaseServerMessage) -> bool:
+        """
+        Returns whether the message should still be queued.
+        """
+        if self.queue_full_policy == "drop":
+            self.dropped_messages += 1
+            _log.warning(f"Outbound queue full, dropping {msg.get_type()}")
+            return False
+
+        if self.queue_full_policy == "coalesce" and self._outbound:
+            last = self._outbound[-1]
+            merged = _merge_messages(last.message, msg)
+            if merged is not None:
+                self._outbound[-1] = _OutboundMessage(merged, None)
+                return False
+
+        self.close(f"outbound queue full ({len(self._outbound)} messages)")
+        return False
+
+    async def _write(self):
+        try:
+            while self._outbound:
+                item = self._outbound.popleft()
+                await self.websocket.send_text(item.encoded or encode_server_message(item.message))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _log.exception(e)
+            self.close(f"failed to send: {e}")
+        finally:
+            self._writer_task = None
+
+    async def _close_websocket(self, code: int, reason: str):
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception as e:
+            _log.debug(f"Failed to close websocket: {e}")
+
+
+def _merge_messages(first: BaseServerMessage, second: BaseServerMessage) -> BaseServerMessage | None:
+    if not isinstance(first, NotifyAboutChatMutationServerMessage) or not isinstance(
+        second, NotifyAboutChatMutationServerMessage
+    ):
+        return None
+
+    if first.request_id != second.request_id or first.chat_id != second.chat_id:
+        return None
+
+    mutation = merge_mutations(first.mutation, second.mutation)
+    if mutation is None:
+        return None
+
+    # Clients resume from the seq of the last mutation they got, which is now the merged one
+    return NotifyAboutChatMutationServerMessage(
+        request_id=first.request_id, chat_id=first.chat_id, mutation=mutation, seq=second.seq
+    )
 
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: list[AICConnection] = []
+        # chat_id -> connections that have the chat open, mirrors AICConnection.open_chats_ids
+        self._chat_subscribers: dict[str, set[AICConnection]] = {}
+        self._chat_closed_listeners: list[Callable[[str], None]] = []
 
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        connection = AICConnection(websocket)
+        connection = AICConnection(websocket, on_close=self.disconnect)
         self.active_connections.append(connection)
         _log.info("Connected")
         return connection
 
     def disconnect(self, connection: AICConnection):
+        if connection not in self.active_connections:
+            return
+
         self.active_connections.remove(connection)
+        for chat_id in list(connection.open_chats_ids):
+            self.unsubscribe(connection, chat_id)
+        connection.stop()
         _log.info("Disconnected")
 
+    def subscribe(self, connection: AICConnection, chat_id: str):
+        connection.open_chats_ids.add(chat_id)
+        self._chat_subscribers.setdefault(chat_id, set()).add(connection)
+
+    def unsubscribe(self, connection: AICConnection, chat_id: str):
+        connection.open_chats_ids.discard(chat_id)
+
+        subscribers = self._chat_subscribers.get(chat_id)
+        if subscribers is not None:
+            subscribers.discard(connection)
+            if not subscribers:
+                del self._chat_subscribers[chat_id]
+                for listener in self._chat_closed_listeners:
+                    listener(chat_id)
+
+    def on_chat_closed(self, listener: Callable[[str], None]):
+        """
+        Calls the listener with the id of a chat whenever the last connection that had it open closes it.
+        """
+        self._chat_closed_listeners.append(listener)
+
+    def get_chat_subscribers(self, chat_id: str) -> set[AICConnection]:
+        return self._chat_subscribers.get(chat_id, set())
+
     async def send_to_chat(
         self, message: BaseServerMessage, chat_id: str, except_connection: AICConnection | None = None
     ):
-        for connection in self.active_connections:
-            if chat_id in connection.open_chats_ids and except_connection != connection:
-                await connection.send(message)
+        """
+        Never waits for the message to be sent, see AICConnection.
+        """
+        # Encoded once, only if there is anyone to send it to
+        encoded: str | None = None
+        stale: list[AICConnection] = []
+
+        # Copied, a connection with a full queue can be disconnected while enqueueing
+        for connection in list(self.get_chat_subscribers(chat_id)):
+            if connection.closed:
+                stale.append(connection)
+            elif except_connection != connection:
+                if encoded is None:
+                    encoded = encode_server_message(message)
+                connection.enqueue(message, encoded)
+
+        for connection in stale:
+            _log.debug(f"Removing stale subscription of chat {chat_id}")
+            self.unsubscribe(connection, chat_id)
 
     async def send_to_all(self, message: BaseServerMessage):
-        for connection in self.active_connections:
-            await connection.send(message)
+        if not self.active_connections:
+            return
+
+        encoded = encode_server_message(message)
+        # Copied, a connection with a full queue can be disconnected while enqueueing
+        for connection in list(self.active_connections):
+            connection.enqueue(message, encoded)
 
 
 @lru_cache
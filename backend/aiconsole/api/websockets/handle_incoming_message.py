@@ -23,10 +23,12 @@ from aiconsole.api.websockets.client_messages import (
     AcceptCodeClientMessage,
     AcquireLockClientMessage,
     CloseChatClientMessage,
+    FetchMessageGroupsClientMessage,
     InitChatMutationClientMessage,
     OpenChatClientMessage,
     ProcessChatClientMessage,
     ReleaseLockClientMessage,
+    ResumeChatClientMessage,
     StopChatClientMessage,
 )
 from aiconsole.api.websockets.connection_manager import (
@@ -35,10 +37,10 @@ from aiconsole.api.websockets.connection_manager import (
     connection_manager,
 )
 from aiconsole.api.websockets.do_process_chat import do_process_chat
-from aiconsole.api.websockets.render_materials import (
-    render_materials,
-)
+from aiconsole.api.websockets.mutation_broadcaster import mutation_broadcaster
+from aiconsole.api.websockets.render_materials import render_materials
 from aiconsole.api.websockets.server_messages import (
+    ChatMessageGroupsServerMessage,
     ChatOpenedServerMessage,
     NotificationServerMessage,
     ResponseServerMessage,
@@ -72,6 +74,8 @@ async def handle_incoming_message(connection: AICConnection, json: dict):
         AcquireLockClientMessage.__name__: _handle_acquire_lock_ws_message,
         ReleaseLockClientMessage.__name__: _handle_release_lock_ws_message,
         OpenChatClientMessage.__name__: _handle_open_chat_ws_message,
+        ResumeChatClientMessage.__name__: _handle_resume_chat_ws_message,
+        FetchMessageGroupsClientMessage.__name__: _handle_fetch_message_groups_ws_message,
         StopChatClientMessage.__name__: _handle_stop_chat_ws_message,
         CloseChatClientMessage.__name__: _handle_close_chat_ws_message,
         InitChatMutationClientMessage.__name__: _handle_init_chat_mutation_ws_message,
@@ -118,7 +122,6 @@ async def _handle_acquire_lock_ws_message(connection: AICConnection, json: dict)
 
 
 async def _handle_release_lock_ws_message(connection: AICConnection, json: dict):
-
     message = ReleaseLockClientMessage(**json)
 
     chat_mutator = SequentialChatMutator(
@@ -143,11 +146,10 @@ async def _handle_release_lock_ws_message(connection: AICConnection, json: dict)
 
 
 async def _handle_open_chat_ws_message(connection: AICConnection, json: dict):
-
     message = OpenChatClientMessage(**json)
 
     try:
-        connection.open_chats_ids.add(message.chat_id)
+        connection_manager().subscribe(connection, message.chat_id)
 
         chat_mutator = SequentialChatMutator(
             DefaultChatMutator(
@@ -159,6 +161,9 @@ async def _handle_open_chat_ws_message(connection: AICConnection, json: dict):
 
         chat = await chat_mutator.read()
 
+        # Mutations already contained in the chat must reach the client before the chat itself
+        await mutation_broadcaster().flush(message.chat_id)
+
         if message.chat_id in connection.open_chats_ids:
             await connection.send(
                 ResponseServerMessage(
@@ -166,9 +171,20 @@ async def _handle_open_chat_ws_message(connection: AICConnection, json: dict):
                 )
             )
 
+            before_message_group_id = None
+
+            if message.window is not None and len(chat.message_groups) > message.window:
+                window_start = len(chat.message_groups) - max(message.window, 1)
+                before_message_group_id = chat.message_groups[window_start].id
+                # Shallow copy, sending encodes it right away
+                chat = chat.model_copy(update={"message_groups": chat.message_groups[window_start:]})
+
             await connection.send(
                 ChatOpenedServerMessage(
                     chat=chat,
+                    seq=mutation_broadcaster().get_seq(message.chat_id),
+                    epoch=mutation_broadcaster().get_epoch(message.chat_id),
+                    before_message_group_id=before_message_group_id,
                 )
             )
     except Exception as e:
@@ -184,6 +200,75 @@ async def _handle_open_chat_ws_message(connection: AICConnection, json: dict):
         )
 
 
+async def _handle_fetch_message_groups_ws_message(connection: AICConnection, json: dict):
+    message = FetchMessageGroupsClientMessage(**json)
+
+    try:
+        chat = await SequentialChatMutator(
+            DefaultChatMutator(chat_id=message.chat_id, request_id=message.request_id, connection=connection)
+        ).read()
+
+        group = chat.get_message_group(message.before_message_group_id)
+        if group is None:
+            raise ValueError(f"Message group {message.before_message_group_id} not found, it might have been deleted")
+
+        end = next(i for i, other in enumerate(chat.message_groups) if other is group)
+        start = max(end - max(message.limit, 1), 0)
+
+        await connection.send(
+            ChatMessageGroupsServerMessage(
+                request_id=message.request_id,
+                chat_id=message.chat_id,
+                message_groups=chat.message_groups[start:end],
+                before_message_group_id=chat.message_groups[start].id if start > 0 else None,
+            )
+        )
+        await connection.send(
+            ResponseServerMessage(request_id=message.request_id, payload={"chat_id": message.chat_id}, is_error=False)
+        )
+    except Exception as e:
+        _log.error(f"Error during fetching message groups of chat {message.chat_id}: {e}")
+
+        await connection.send(
+            ResponseServerMessage(
+                request_id=message.request_id,
+                payload={"error": f"Error during fetching message groups: {e}", "chat_id": message.chat_id},
+                is_error=True,
+            )
+        )
+
+
+async def _handle_resume_chat_ws_message(connection: AICConnection, json: dict):
+    message = ResumeChatClientMessage(**json)
+
+    missed = mutation_broadcaster().get_sent_since(message.chat_id, message.epoch, message.last_seq)
+
+    if missed is None:
+        _log.info(
+            f"Can't resume chat {message.chat_id} from {message.last_seq} of epoch {message.epoch}, sending the whole chat"
+        )
+        await _handle_open_chat_ws_message(connection, json)
+        return
+
+    # connection.send only queues, so no mutation is broadcast in between and none is sent twice or skipped
+    connection_manager().subscribe(connection, message.chat_id)
+    for missed_message in missed:
+        await connection.send(missed_message)
+
+    await connection.send(
+        ResponseServerMessage(
+            request_id=message.request_id,
+            payload={
+                "chat_id": message.chat_id,
+                "resumed": True,
+                "seq": mutation_broadcaster().get_seq(message.chat_id),
+                "epoch": mutation_broadcaster().get_epoch(message.chat_id),
+            },
+            is_error=False,
+        )
+    )
+
+
 async def _handle_stop_chat_ws_message(connection: AICConnection, json: dict):
     message: StopChatClientMessage | None = None
     try:
@@ -207,7 +292,7 @@ async def _handle_stop_chat_ws_message(connection: AICConnection, json: dict):
 
 async def _handle_close_chat_ws_message(connection: AICConnection, json: dict):
     message = CloseChatClientMessage(**json)
-    connection.open_chats_ids.discard(message.chat_id)
+    connection_manager().unsubscribe(connection, message.chat_id)
 
 
 async def _handle_init_chat_mutation_ws_message(connection: AICConnection | None, json: dict):
@@ -221,7 +306,9 @@ async def _handle_init_chat_mutation_ws_message(connection: AICConnection | None
 
 
 async def _handle_accept_code_ws_message(connection: AICConnection, json: dict):
-    events_to_sub: list[type[InternalEvent]] = [WaitForEnvEvent, ]
+    events_to_sub: list[type[InternalEvent]] = [
+        WaitForEnvEvent,
+    ]
 
     message = AcceptCodeClientMessage(**json)
 
@@ -288,7 +375,6 @@ async def _handle_accept_code_ws_message(connection: AICConnection, json: dict):
 async def _handle_process_chat_ws_message(connection: AICConnection, json: dict):
     message = ProcessChatClientMessage(**json)
     try:
-
         chat_mutator = SequentialChatMutator(
             DefaultChatMutator(
                 chat_id=message.chat_id,
@@ -300,9 +386,8 @@ async def _handle_process_chat_ws_message(connection: AICConnection, json: dict)
         async def f():
             await acquire_lock(chat_id=message.chat_id, request_id=message.request_id)
 
-        await chat_mutator.in_sequence(f)
-
-        await chat_mutator.wait_for_all_mutations()
+        # Propagate lock acquisition errors instead of processing the chat without a lock
+        await (await chat_mutator.in_sequence(f))
 
         await do_process_chat(chat_mutator)
     finally:
@@ -0,0 +1,230 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Broadcasts chat mutations to the connections that have the chat open.
+
+Consecutive Append* mutations on the same target are merged for up to flush_window_ms
+before being sent, so a streamed LLM response does not turn into one websocket frame per token.
+Mutations are always sent in the order they were applied.
+
+Every sent mutation gets the next sequence number of its chat, and the most recent ones are kept,
+so a client that reconnects can get just the mutations it missed instead of the whole chat.
+Sequence numbers are only kept while the chat is open and for a while after, when they start over
+the chat gets a new epoch, so a client never resumes from a number of another epoch.
+"""
+import asyncio
+import logging
+import uuid
+from collections import defaultdict, deque
+from dataclasses import dataclass
+from functools import lru_cache
+
+from aiconsole.api.websockets.connection_manager import (
+    AICConnection,
+    connection_manager,
+)
+from aiconsole.api.websockets.server_messages import (
+    NotifyAboutChatMutationServerMessage,
+)
+from aiconsole.consts import (
+    MUTATION_BROADCAST_FLUSH_WINDOW_MS,
+    MUTATION_BROADCAST_MAX_BATCH_SIZE,
+    MUTATION_REPLAY_BUFFER_SIZE,
+    MUTATION_REPLAY_RETENTION_SECONDS,
+)
+from aiconsole.core.chat.chat_mutations import ChatMutation
+from aiconsole.core.chat.merge_mutations import merge_mutations
+
+_log = logging.getLogger(__name__)
+
+
+@dataclass
+class _PendingMutation:
+    request_id: str
+    mutation: ChatMutation
+    except_connection: AICConnection | None
+
+    def try_merge(self, request_id: str, mutation: ChatMutation, except_connection: AICConnection | None) -> bool:
+        if self.request_id != request_id or self.except_connection is not except_connection:
+            return False
+
+        merged = merge_mutations(self.mutation, mutation)
+        if merged is None:
+            return False
+
+        self.mutation = merged
+        return True
+
+
+class MutationBroadcaster:
+    def __init__(
+        self,
+        flush_window_ms: float = MUTATION_BROADCAST_FLUSH_WINDOW_MS,
+        max_batch_size: int = MUTATION_BROADCAST_MAX_BATCH_SIZE,
+        replay_buffer_size: int = MUTATION_REPLAY_BUFFER_SIZE,
+        replay_retention_seconds: float = MUTATION_REPLAY_RETENTION_SECONDS,
+    ):
+        self.flush_window_ms = flush_window_ms
+        self.max_batch_size = max_batch_size
+        self.replay_buffer_size = replay_buffer_size
+        self.replay_retention_seconds = replay_retention_seconds
+
+        self._epochs: dict[str, str] = {}
+        self._seq: dict[str, int] = defaultdict(int)
+        self._sent: dict[str, deque[NotifyAboutChatMutationServerMessage]] = {}
+        self._release_tasks: dict[str, asyncio.Task] = {}
+
+        self._pending: dict[str, list[_PendingMutation]] = defaultdict(list)
+        self._pending_count: dict[str, int] = defaultdict(int)
+        self._flush_tasks: dict[str, asyncio.Task] = {}
+        self._send_locks: dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
+    async def broadcast(
+        self,
+        request_id: str,
+        chat_id: str,
+        mutation: ChatMutation,
+        except_connection: AICConnection | None = None,
+    ):
+        if self.flush_window_ms <= 0:
+            await self._send(chat_id, [_PendingMutation(request_id, mutation, except_connection)])
+            return
+
+        pending = self._pending[chat_id]
+
+        if not pending or not pending[-1].try_merge(request_id, mutation, except_connection):
+            pending.append(_PendingMutation(request_id, mutation, except_connection))
+
+        self._pending_count[chat_id] += 1
+
+        if self._pending_count[chat_id] >= self.max_batch_size:
+            await self.flush(chat_id)
+        elif chat_id not in self._flush_tasks:
+            self._flush_tasks[chat_id] = asyncio.create_task(self._flush_after_window(chat_id))
+
+    async def flush(self, chat_id: str):
+        """
+        Sends everything buffered for the chat. Call before sending any chat message that
+        must be ordered after the already applied mutations.
+        """
+        flush_task = self._flush_tasks.pop(chat_id, None)
+        if flush_task is not None and flush_task is not asyncio.current_task():
+            flush_task.cancel()
+
+        pending = self._pending.pop(chat_id, [])
+        self._pending_count.pop(chat_id, None)
+
+        await self._send(chat_id, pending)
+
+    def get_epoch(self, chat_id: str) -> str:
+        """
+        Epoch of the sequence numbers of the chat, a new one once they start over.
+        """
+        if chat_id not in self._epochs:
+            self._epochs[chat_id] = uuid.uuid4().hex
+        return self._epochs[chat_id]
+
+    def get_seq(self, chat_id: str) -> int:
+        """
+        Sequence number of the last mutation sent for the chat, 0 if none was sent in the current epoch.
+        """
+        return self._seq.get(chat_id, 0)
+
+    def get_sent_since(self, chat_id: str, epoch: str, seq: int) -> list[NotifyAboutChatMutationServerMessage] | None:
+        """
+        Mutations sent after the one with the given epoch and sequence number, None if some of them are no longer kept.
+        """
+        current_seq = self.get_seq(chat_id)
+
+        if epoch != self._epochs.get(chat_id) or seq > current_seq:
+            # Sequence number from before a restart of the server, or from before the chat was released
+            return None
+
+        sent = self._sent.get(chat_id, deque())
+        if current_seq - seq > len(sent):
+            return None
+
+        return list(sent)[len(sent) - (current_seq - seq) :]
+
+    def release(self, chat_id: str):
+        """
+        Forgets the sequence numbers and sent mutations of the chat after replay_retention_seconds, unless it is opened
+        again in the meantime. Called once no connection has the chat open.
+        """
+        release_task = self._release_tasks.pop(chat_id, None)
+        if release_task is not None:
+            release_task.cancel()
+
+        self._release_tasks[chat_id] = asyncio.create_task(self._release_after_retention(chat_id))
+
+    async def _release_after_retention(self, chat_id: str):
+        try:
+            while True:
+                await asyncio.sleep(self.replay_retention_seconds)
+                if connection_manager().get_chat_subscribers(chat_id):
+                    return
+
+                # Nobody gets them, but they must not be numbered in the next epoch
+                await self.flush(chat_id)
+
+                send_lock = self._send_locks.get(chat_id)
+                is_sending = chat_id in self._pending or (send_lock is not None and send_lock.locked())
+                # Opened again or still being mutated, like by a response generated for a closed chat
+                if not is_sending and not connection_manager().get_chat_subscribers(chat_id):
+                    break
+
+            self._epochs.pop(chat_id, None)
+            self._seq.pop(chat_id, None)
+            self._sent.pop(chat_id, None)
+            self._send_locks.pop(chat_id, None)
+            _log.debug(f"Released sent mutations of chat {chat_id}")
+        except Exception as e:
+            _log.exception(e)
+        finally:
+            if self._release_tasks.get(chat_id) is asyncio.current_task():
+                del self._release_tasks[chat_id]
+
+    async def _flush_after_window(self, chat_id: str):
+        await asyncio.sleep(self.flush_window_ms / 1000)
+        try:
+            await self.flush(chat_id)
+        except Exception as e:
+            _log.exception(e)
+
+    async def _send(self, chat_id: str, pending: list[_PendingMutation]):
+        # Lock keeps batches from concurrent flushes from interleaving
+        async with self._send_locks[chat_id]:
+            for item in pending:
+                self._seq[chat_id] += 1
+                message = NotifyAboutChatMutationServerMessage(
+                    request_id=item.request_id,
+                    chat_id=chat_id,
+                    mutation=item.mutation,
+                    seq=self._seq[chat_id],
+                )
+
+                if chat_id not in self._sent:
+                    self._sent[chat_id] = deque(maxlen=self.replay_buffer_size)
+                self._sent[chat_id].append(message)
+
+                await connection_manager().send_to_chat(message, chat_id, except_connection=item.except_connection)
+
+
+@lru_cache
+def mutation_broadcaster() -> MutationBroadcaster:
+    broadcaster = MutationBroadcaster()
+    connection_manager().on_chat_closed(broadcaster.release)
+    return broadcaster
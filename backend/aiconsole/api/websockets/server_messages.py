@@ -18,7 +18,7 @@ import os
 from aiconsole.api.websockets.base_server_message import BaseServerMessage
 from aiconsole.core.assets.types import AssetType
 from aiconsole.core.chat.chat_mutations import ChatMutation
-from aiconsole.core.chat.types import Chat
+from aiconsole.core.chat.types import AICMessageGroup, Chat
 
 
 class NotificationServerMessage(BaseServerMessage):
@@ -67,16 +67,14 @@ class NotifyAboutChatMutationServerMessage(BaseServerMessage):
     request_id: str
     chat_id: str
     mutation: ChatMutation
+    # Per chat, increases by one with every mutation sent, see MutationBroadcaster
+    seq: int | None = None
 
     def model_dump(self, **kwargs):
-        # include type of mutation in the dump of "mutation"
-        return {
-            **super().model_dump(**kwargs),
-            "mutation": {
-                **self.mutation.model_dump(**kwargs),
-                "type": self.mutation.__class__.__name__,
-            },
-        }
+        # include type of mutation in the dump of "mutation", reusing the mutation dumped along with the message
+        dump = super().model_dump(**kwargs)
+        dump["mutation"] = {**dump["mutation"], "type": self.mutation.__class__.__name__}
+        return dump
 
 
 class ResponseServerMessage(BaseServerMessage):
@@ -95,3 +93,18 @@ class ResponseServerMessage(BaseServerMessage):
 
 class ChatOpenedServerMessage(BaseServerMessage):
     chat: Chat
+    # Sequence number of the last mutation contained in the chat
+    seq: int = 0
+    # Sequence numbers start over in a new epoch, after a restart of the server or once the chat was left closed
+    epoch: str | None = None
+    # Set when the chat was opened with a window and has older message groups, see ChatMessageGroupsServerMessage
+    before_message_group_id: str | None = None
+
+
+class ChatMessageGroupsServerMessage(BaseServerMessage):
+    request_id: str
+    chat_id: str
+    # Oldest first, directly preceding the group the request was made with
+    message_groups: list[AICMessageGroup]
+    # Cursor for the next older page, None if there are no older groups
+    before_message_group_id: str | None = None
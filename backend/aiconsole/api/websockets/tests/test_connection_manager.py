@@ -0,0 +1,219 @@
+import asyncio
+import json
+
+import pytest
+
+from aiconsole.api.websockets import connection_manager as connection_manager_module
+from aiconsole.api.websockets.connection_manager import AICConnection, ConnectionManager
+from aiconsole.api.websockets.server_messages import (
+    NotifyAboutChatMutationServerMessage,
+)
+from aiconsole.core.chat.chat_mutations import (
+    AppendToContentMessageMutation,
+    SetIsStreamingMessageMutation,
+)
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent: list[str] = []
+        self.closed_with: int | None = None
+        self.unblocked = asyncio.Event()
+        self.unblocked.set()
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        await self.unblocked.wait()
+        self.sent.append(data)
+
+    async def close(self, code: int, reason: str):
+        self.closed_with = code
+
+
+def _message(content_delta: str = "Zażółć", seq: int | None = None) -> NotifyAboutChatMutationServerMessage:
+    return NotifyAboutChatMutationServerMessage(
+        request_id="r",
+        chat_id="chat",
+        mutation=AppendToContentMessageMutation(message_id="m", content_delta=content_delta),
+        seq=seq,
+    )
+
+
+def _stalled_connection(manager: ConnectionManager, policy) -> tuple[AICConnection, FakeWebSocket]:
+    websocket = FakeWebSocket()
+    websocket.unblocked.clear()
+    connection = AICConnection(websocket, max_queue_size=2, queue_full_policy=policy, on_close=manager.disconnect)  # type: ignore
+    manager.active_connections.append(connection)
+    manager.subscribe(connection, "chat")
+    return connection, websocket
+
+
+@pytest.mark.asyncio
+async def test_should_encode_message_once_for_all_subscribers(monkeypatch: pytest.MonkeyPatch):
+    manager = ConnectionManager()
+    websockets = [FakeWebSocket() for _ in range(3)]
+    connections = [await manager.connect(websocket) for websocket in websockets]  # type: ignore
+    for connection in connections[:2]:
+        manager.subscribe(connection, "chat")
+
+    encoded_messages = []
+    encode = connection_manager_module.encode_server_message
+
+    def counting_encode(message):
+        encoded_messages.append(message)
+        return encode(message)
+
+    monkeypatch.setattr(connection_manager_module, "encode_server_message", counting_encode)
+
+    await manager.send_to_chat(_message(), "chat")
+    for connection in connections:
+        await connection.drain()
+
+    assert len(encoded_messages) == 1
+    assert websockets[0].sent == websockets[1].sent
+    assert websockets[2].sent == []
+    assert json.loads(websockets[0].sent[0]) == {
+        "type": "NotifyAboutChatMutationServerMessage",
+        "request_id": "r",
+        "chat_id": "chat",
+        "mutation": {"type": "AppendToContentMessageMutation", "message_id": "m", "content_delta": "Zażółć"},
+    }
+
+
+@pytest.mark.asyncio
+async def test_should_encode_the_same_with_and_without_orjson(monkeypatch: pytest.MonkeyPatch):
+    encoded = connection_manager_module.encode_server_message(_message())
+
+    monkeypatch.setattr(connection_manager_module, "orjson", None)
+
+    assert connection_manager_module.encode_server_message(_message()) == encoded
+
+
+@pytest.mark.asyncio
+async def test_should_not_wait_for_a_stalled_connection():
+    manager = ConnectionManager()
+    stalled_connection, stalled_websocket = _stalled_connection(manager, "drop")
+    websocket = FakeWebSocket()
+    connection = await manager.connect(websocket)  # type: ignore
+    manager.subscribe(connection, "chat")
+
+    await asyncio.wait_for(manager.send_to_chat(_message(), "chat"), timeout=1)
+    await connection.drain()
+
+    assert len(websocket.sent) == 1
+    assert stalled_websocket.sent == []
+
+    stalled_connection.stop()
+
+
+@pytest.mark.asyncio
+async def test_should_drop_messages_when_queue_is_full():
+    manager = ConnectionManager()
+    connection, websocket = _stalled_connection(manager, "drop")
+
+    for i in range(5):
+        await manager.send_to_chat(_message(str(i)), "chat")
+        # Let the writer pick up the first message
+        await asyncio.sleep(0)
+
+    # One is being sent, two are queued
+    assert connection.dropped_messages == 2
+
+    websocket.unblocked.set()
+    await connection.drain()
+    assert [json.loads(data)["mutation"]["content_delta"] for data in websocket.sent] == ["0", "1", "2"]
+
+
+@pytest.mark.asyncio
+async def test_should_coalesce_messages_when_queue_is_full():
+    manager = ConnectionManager()
+    connection, websocket = _stalled_connection(manager, "coalesce")
+
+    for i in range(5):
+        await manager.send_to_chat(_message(str(i), seq=i + 1), "chat")
+        # Let the writer pick up the first message
+        await asyncio.sleep(0)
+
+    websocket.unblocked.set()
+    await connection.drain()
+    assert [json.loads(data)["mutation"]["content_delta"] for data in websocket.sent] == ["0", "1", "234"]
+    # The last seen seq stays the seq of the last mutation sent
+    assert [json.loads(data)["seq"] for data in websocket.sent] == [1, 2, 5]
+    assert connection in manager.active_connections
+
+
+@pytest.mark.asyncio
+async def test_should_disconnect_when_queue_is_full_and_messages_can_not_be_coalesced():
+    manager = ConnectionManager()
+    connection, websocket = _stalled_connection(manager, "coalesce")
+
+    for _ in range(5):
+        await manager.send_to_chat(
+            NotifyAboutChatMutationServerMessage(
+                request_id="r",
+                chat_id="chat",
+                mutation=SetIsStreamingMessageMutation(message_id="m", is_streaming=True),
+            ),
+            "chat",
+        )
+    await asyncio.sleep(0)
+
+    assert connection.closed
+    assert connection not in manager.active_connections
+    assert websocket.closed_with == 1013
+
+
+@pytest.mark.asyncio
+async def test_should_send_to_all_when_a_connection_is_disconnected_on_send():
+    manager = ConnectionManager()
+    stalled, _ = _stalled_connection(manager, "disconnect")
+    websocket = FakeWebSocket()
+    connection = await manager.connect(websocket)  # type: ignore
+
+    for _ in range(3):
+        await manager.send_to_all(_message())
+    await asyncio.sleep(0)
+
+    assert stalled.closed
+    assert manager.active_connections == [connection]
+    assert len(websocket.sent) == 3
+
+
+@pytest.mark.asyncio
+async def test_should_keep_chat_subscribers_index_up_to_date():
+    manager = ConnectionManager()
+    first = await manager.connect(FakeWebSocket())  # type: ignore
+    second = await manager.connect(FakeWebSocket())  # type: ignore
+
+    closed: list[str] = []
+    manager.on_chat_closed(closed.append)
+
+    manager.subscribe(first, "chat")
+    manager.subscribe(second, "chat")
+    manager.subscribe(second, "other")
+    assert manager.get_chat_subscribers("chat") == {first, second}
+
+    manager.unsubscribe(first, "chat")
+    assert manager.get_chat_subscribers("chat") == {second}
+    assert closed == []
+
+    manager.disconnect(second)
+    assert manager.get_chat_subscribers("chat") == set()
+    assert manager.get_chat_subscribers("other") == set()
+    assert second.open_chats_ids == set()
+    assert sorted(closed) == ["chat", "other"]
+
+
+@pytest.mark.asyncio
+async def test_should_remove_stale_subscribers_on_send():
+    manager = ConnectionManager()
+    connection = await manager.connect(FakeWebSocket())  # type: ignore
+    manager.subscribe(connection, "chat")
+
+    # Stopped without going through disconnect
+    connection.stop()
+    await manager.send_to_chat(_message(), "chat")
+
+    assert manager.get_chat_subscribers("chat") == set()
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from aiconsole.api.websockets.connection_manager import connection_manager
+from aiconsole.api.websockets.mutation_broadcaster import MutationBroadcaster
+from aiconsole.api.websockets.server_messages import (
+    NotifyAboutChatMutationServerMessage,
+)
+from aiconsole.core.chat.chat_mutations import (
+    AppendToCodeToolCallMutation,
+    AppendToContentMessageMutation,
+    SetIsStreamingMessageMutation,
+)
+
+
+@pytest.fixture
+def sent(monkeypatch: pytest.MonkeyPatch) -> list[NotifyAboutChatMutationServerMessage]:
+    sent: list[NotifyAboutChatMutationServerMessage] = []
+
+    async def send_to_chat(message, chat_id, except_connection=None):
+        sent.append(message)
+
+    monkeypatch.setattr(connection_manager(), "send_to_chat", send_to_chat)
+    return sent
+
+
+@pytest.mark.asyncio
+async def test_should_merge_consecutive_deltas_on_the_same_target(sent):
+    broadcaster = MutationBroadcaster(flush_window_ms=10, max_batch_size=1000)
+
+    for delta in ["Hel", "lo", " world"]:
+        await broadcaster.broadcast("r", "chat", AppendToContentMessageMutation(message_id="m", content_delta=delta))
+
+    assert sent == []
+
+    await asyncio.sleep(0.05)
+
+    assert [message.mutation for message in sent] == [
+        AppendToContentMessageMutation(message_id="m", content_delta="Hello world")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_should_keep_order_across_targets(sent):
+    broadcaster = MutationBroadcaster(flush_window_ms=1000, max_batch_size=1000)
+
+    mutations = [
+        AppendToContentMessageMutation(message_id="m", content_delta="a"),
+        AppendToCodeToolCallMutation(tool_call_id="t", code_delta="b"),
+        AppendToCodeToolCallMutation(tool_call_id="t", code_delta="c"),
+        SetIsStreamingMessageMutation(message_id="m", is_streaming=False),
+        AppendToContentMessageMutation(message_id="m", content_delta="d"),
+    ]
+
+    for mutation in mutations:
+        await broadcaster.broadcast("r", "chat", mutation)
+
+    await broadcaster.flush("chat")
+
+    assert [message.mutation for message in sent] == [
+        AppendToContentMessageMutation(message_id="m", content_delta="a"),
+        AppendToCodeToolCallMutation(tool_call_id="t", code_delta="bc"),
+        SetIsStreamingMessageMutation(message_id="m", is_streaming=False),
+        AppendToContentMessageMutation(message_id="m", content_delta="d"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_should_flush_when_batch_is_full(sent):
+    broadcaster = MutationBroadcaster(flush_window_ms=1000, max_batch_size=3)
+
+    for _ in range(3):
+        await broadcaster.broadcast("r", "chat", AppendToContentMessageMutation(message_id="m", content_delta="x"))
+
+    assert [message.mutation for message in sent] == [
+        AppendToContentMessageMutation(message_id="m", content_delta="xxx")
+    ]
+
+
+@pytest.mark.asyncio
+async def test_should_number_sent_mutations_per_chat(sent):
+    broadcaster = MutationBroadcaster(flush_window_ms=0)
+
+    await broadcaster.broadcast("r", "chat", SetIsStreamingMessageMutation(message_id="m", is_streaming=True))
+    await broadcaster.broadcast("r", "other", SetIsStreamingMessageMutation(message_id="m", is_streaming=True))
+    await broadcaster.broadcast("r", "chat", SetIsStreamingMessageMutation(message_id="m", is_streaming=False))
+
+    assert [(message.chat_id, message.seq) for message in sent] == [("chat", 1), ("other", 1), ("chat", 2)]
+    assert broadcaster.get_seq("chat") == 2
+
+
+@pytest.mark.asyncio
+async def test_should_return_mutations_missed_since_seq(sent):
+    broadcaster = MutationBroadcaster(flush_window_ms=0, replay_buffer_size=3)
+
+    for i in range(5):
+        await broadcaster.broadcast("r", "chat", AppendToContentMessageMutation(message_id="m", content_delta=str(i)))
+
+    epoch = broadcaster.get_epoch("chat")
+    missed = broadcaster.get_sent_since("chat", epoch, 3)
+    assert missed is not None
+    assert [(message.seq, message.mutation.content_delta) for message in missed] == [(4, "3"), (5, "4")]  # type: ignore
+
+    assert broadcaster.get_sent_since("chat", epoch, 5) == []
+    assert broadcaster.get_sent_since("chat", epoch, 2) is not None
+
+    # Too old, or from before a restart
+    assert broadcaster.get_sent_since("chat", epoch, 1) is None
+    assert broadcaster.get_sent_since("chat", epoch, 6) is None
+    assert broadcaster.get_sent_since("chat", MutationBroadcaster().get_epoch("chat"), 4) is None
+
+
+@pytest.mark.asyncio
+async def test_should_start_a_new_epoch_once_the_chat_is_released(sent):
+    broadcaster = MutationBroadcaster(flush_window_ms=0, replay_retention_seconds=0.01)
+
+    await broadcaster.broadcast("r", "chat", SetIsStreamingMessageMutation(message_id="m", is_streaming=True))
+    epoch = broadcaster.get_epoch("chat")
+
+    broadcaster.release("chat")
+    await asyncio.sleep(0.05)
+
+    assert broadcaster.get_seq("chat") == 0
+    assert broadcaster.get_sent_since("chat", epoch, 0) is None
+    assert broadcaster.get_epoch("chat") != epoch
+    assert not broadcaster._release_tasks and not broadcaster._sent and not broadcaster._send_locks
+
+
+@pytest.mark.asyncio
+async def test_should_keep_sent_mutations_of_a_chat_opened_again(sent, monkeypatch: pytest.MonkeyPatch):
+    broadcaster = MutationBroadcaster(flush_window_ms=0, replay_retention_seconds=0.01)
+    monkeypatch.setattr(connection_manager(), "get_chat_subscribers", lambda chat_id: {object()})
+
+    await broadcaster.broadcast("r", "chat", SetIsStreamingMessageMutation(message_id="m", is_streaming=True))
+    epoch = broadcaster.get_epoch("chat")
+
+    broadcaster.release("chat")
+    await asyncio.sleep(0.05)
+
+    assert broadcaster.get_sent_since("chat", epoch, 0) is not None
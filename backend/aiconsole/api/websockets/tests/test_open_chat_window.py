@@ -0,0 +1,116 @@
+import asyncio
+import json
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from aiconsole.api.websockets.connection_manager import (
+    AICConnection,
+    connection_manager,
+)
+from aiconsole.api.websockets.handle_incoming_message import (
+    _handle_fetch_message_groups_ws_message,
+    _handle_open_chat_ws_message,
+)
+from aiconsole.api.websockets.mutation_broadcaster import mutation_broadcaster
+from aiconsole.core.chat import locking
+from aiconsole.core.chat.actor_id import ActorId
+from aiconsole.core.chat.chat_cache import chat_cache
+from aiconsole.core.chat.save_chat_history import save_chat_history
+from aiconsole.core.chat.types import AICMessageGroup, Chat
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent: list[dict] = []
+
+    async def send_text(self, data: str):
+        self.sent.append(json.loads(data))
+
+
+@pytest.fixture(autouse=True)
+def project_directory(project_directory: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    # Chat actors are bound to the event loop of the test that started them
+    monkeypatch.setattr(locking, "_mutation_actors", {})
+    chat_cache().clear()
+
+    save_chat_history(
+        Chat(
+            id="chat",
+            name="",
+            last_modified=datetime.now(),
+            message_groups=[
+                AICMessageGroup(
+                    id=f"g{i}",
+                    actor_id=ActorId(type="user", id="user"),
+                    role="user",
+                    task="",
+                    materials_ids=[],
+                    analysis="",
+                    messages=[],
+                )
+                for i in range(10)
+            ],
+        )
+    )
+    return project_directory
+
+
+async def _request(handler, json_data: dict) -> list[dict]:
+    websocket = FakeWebSocket()
+    connection = AICConnection(websocket)  # type: ignore
+    await handler(connection, json_data)
+    await connection.drain()
+    connection_manager().unsubscribe(connection, json_data["chat_id"])
+    connection.stop()
+
+    # Idle actors and pending releases of chats would outlive the event loop of the test
+    workers = [actor._worker for actor in locking._mutation_actors.values() if actor._worker is not None]
+    locking._mutation_actors.clear()
+    workers += mutation_broadcaster()._release_tasks.values()
+    mutation_broadcaster()._release_tasks.clear()
+    for worker in workers:
+        worker.cancel()
+    await asyncio.gather(*workers, return_exceptions=True)
+
+    return websocket.sent
+
+
+def _group_ids(message: dict) -> list[str]:
+    groups = message["chat"]["message_groups"] if "chat" in message else message["message_groups"]
+    return [group["id"] for group in groups]
+
+
+@pytest.mark.asyncio
+async def test_should_open_chat_with_latest_groups_and_fetch_older_ones():
+    _, opened = await _request(_handle_open_chat_ws_message, {"chat_id": "chat", "request_id": "r1", "window": 4})
+
+    assert _group_ids(opened) == ["g6", "g7", "g8", "g9"]
+    assert opened["before_message_group_id"] == "g6"
+
+    older, response = await _request(
+        _handle_fetch_message_groups_ws_message,
+        {"chat_id": "chat", "request_id": "r2", "before_message_group_id": "g6", "limit": 4},
+    )
+
+    assert _group_ids(older) == ["g2", "g3", "g4", "g5"]
+    assert older["before_message_group_id"] == "g2"
+    assert response["is_error"] is False
+
+    oldest, _ = await _request(
+        _handle_fetch_message_groups_ws_message,
+        {"chat_id": "chat", "request_id": "r3", "before_message_group_id": "g2", "limit": 4},
+    )
+
+    assert _group_ids(oldest) == ["g0", "g1"]
+    assert "before_message_group_id" not in oldest
+
+
+@pytest.mark.asyncio
+async def test_should_open_whole_chat_without_window():
+    _, opened = await _request(_handle_open_chat_ws_message, {"chat_id": "chat", "request_id": "r1"})
+
+    assert len(_group_ids(opened)) == 10
+    assert "before_message_group_id" not in opened
+    assert opened["epoch"] == mutation_broadcaster().get_epoch("chat")
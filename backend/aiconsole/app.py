@@ -24,6 +24,8 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from aiconsole.api.routers import app_router
 from aiconsole.consts import log_config
+from aiconsole.core.chat.chat_checkpointer import chat_checkpointer
+from aiconsole.core.chat.save_chat_history import chat_writer
 from aiconsole.core.project.paths import get_project_directory_safe
 from aiconsole.core.settings.fs.settings_file_storage import SettingsFileStorage
 from aiconsole.core.settings.settings import settings
@@ -42,6 +44,8 @@ logger = getLogger(__name__)
 async def lifespan(app: FastAPI):
     settings().configure(SettingsFileStorage(project_path=get_project_directory_safe()))
     yield
+    await chat_checkpointer().checkpoint_all()
+    await chat_writer().flush()
 
 
 def app():
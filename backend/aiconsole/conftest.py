@@ -0,0 +1,58 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+from aiconsole.core.chat.actor_id import ActorId
+from aiconsole.core.chat.types import AICMessage, AICMessageGroup, AICToolCall, Chat
+from aiconsole.core.project import project
+
+
+@pytest.fixture
+def project_directory(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """
+    The temporary directory of the test as the current, initialized project.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(project, "_project_initialized", True)
+    return tmp_path
+
+
+def _make_chat(chat_id: str = "chat", content: str = "Hello", output: str | None = None, **fields: Any) -> Chat:
+    return Chat(
+        id=chat_id,
+        name="",
+        last_modified=datetime.now(),
+        message_groups=[
+            AICMessageGroup(
+                id="g",
+                actor_id=ActorId(type="user", id="user"),
+                role="user",
+                task="",
+                materials_ids=[],
+                analysis="",
+                messages=[
+                    AICMessage(
+                        id="m",
+                        timestamp="",
+                        content=content,
+                        tool_calls=(
+                            [AICToolCall(id="t", language="python", code="", headline="", output=output)]
+                            if output is not None
+                            else []
+                        ),
+                    )
+                ],
+            )
+        ],
+        **fields,
+    )
+
+
+@pytest.fixture
+def make_chat() -> Callable[..., Chat]:
+    """
+    Factory of chats with a single user message, with a tool call if its output is given.
+    """
+    return _make_chat
@@ -15,6 +15,7 @@
 # limitations under the License.
 import os
 from pathlib import Path
+from typing import Literal
 
 # this is a path to the root of the project - usually the installed one
 # this is pointing to the backend/aiconsole directory
@@ -53,6 +54,73 @@ DIRECTOR_PREFERRED_TOKENS: int = 1000
 
 MAX_RECENT_PROJECTS = 8
 
+# Requests too large for the context window of their model are fitted to it by these strategies, in order,
+# see context_builder. The last turns of a chat, each starting with a user message, are never elided.
+CONTEXT_STRATEGIES: list[str] = os.environ.get(
+    "CONTEXT_STRATEGIES", "truncate_outputs,drop_tool_outputs,summarize_turns,drop_turns"
+).split(",")
+CONTEXT_KEEP_LAST_TURNS: int = int(os.environ.get("CONTEXT_KEEP_LAST_TURNS", 2))
+# Tool outputs longer than this are cut to their head and tail by the truncate_outputs strategy
+CONTEXT_TRUNCATED_OUTPUT_TOKENS: int = int(os.environ.get("CONTEXT_TRUNCATED_OUTPUT_TOKENS", 1000))
+
+# Consecutive Append* chat mutations on the same target are merged for this long before being broadcast, 0 disables it
+MUTATION_BROADCAST_FLUSH_WINDOW_MS: float = float(os.environ.get("MUTATION_BROADCAST_FLUSH_WINDOW_MS", 30))
+# Buffered mutations of a single chat that force an immediate broadcast
+MUTATION_BROADCAST_MAX_BATCH_SIZE: int = int(os.environ.get("MUTATION_BROADCAST_MAX_BATCH_SIZE", 256))
+# Recently broadcast mutations kept per chat for clients resuming after a reconnect
+MUTATION_REPLAY_BUFFER_SIZE: int = int(os.environ.get("MUTATION_REPLAY_BUFFER_SIZE", 1000))
+# How long they are kept once no connection has the chat open, so a client can still resume after a reconnect
+MUTATION_REPLAY_RETENTION_SECONDS: float = float(os.environ.get("MUTATION_REPLAY_RETENTION_SECONDS", 60))
+
+# Every applied chat mutation is appended to a per chat journal so a crash does not lose unsaved work
+CHAT_JOURNAL_ENABLED: bool = os.environ.get("CHAT_JOURNAL_ENABLED", "1") == "1"
+# Size of the journaled mutations after which the chat is compacted into a new snapshot. Chats being mutated
+# are also snapshotted by the checkpointer, which truncates the journal, so this only bounds its worst case
+CHAT_JOURNAL_COMPACT_BYTES: int = int(os.environ.get("CHAT_JOURNAL_COMPACT_BYTES", 4 * 1024 * 1024))
+
+# Chats locked for a long time are saved in the background once dirty for this long or after this many mutations
+CHAT_CHECKPOINT_INTERVAL_SECONDS: float = float(os.environ.get("CHAT_CHECKPOINT_INTERVAL_SECONDS", 10))
+CHAT_CHECKPOINT_EVERY_MUTATIONS: int = int(os.environ.get("CHAT_CHECKPOINT_EVERY_MUTATIONS", 500))
+# While a response streams into a chat its checkpoint waits for a pause this long, but at most the max delay
+CHAT_CHECKPOINT_STREAMING_BACKOFF_SECONDS: float = float(
+    os.environ.get("CHAT_CHECKPOINT_STREAMING_BACKOFF_SECONDS", 2)
+)
+CHAT_CHECKPOINT_MAX_DELAY_SECONDS: float = float(os.environ.get("CHAT_CHECKPOINT_MAX_DELAY_SECONDS", 60))
+
+# Bounds of the in-memory cache of chats loaded from disk
+CHAT_CACHE_MAX_CHATS: int = int(os.environ.get("CHAT_CACHE_MAX_CHATS", 32))
+CHAT_CACHE_MAX_BYTES: int = int(os.environ.get("CHAT_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Token counts of request messages remembered across LLM requests, see token_counter
+TOKEN_COUNT_CACHE_SIZE: int = int(os.environ.get("TOKEN_COUNT_CACHE_SIZE", 20000))
+
+# Project disk cache of streamed LLM responses, see response_cache: "off", "record" to replay cached responses and
+# record the missing ones, or "replay" to only replay them and fail on a miss, for offline test runs
+LLM_RESPONSE_CACHE: Literal["off", "record", "replay"] = os.environ.get("LLM_RESPONSE_CACHE", "off")  # type: ignore
+# Cached responses older than this are requested again, 0 keeps them until they are evicted by size
+LLM_RESPONSE_CACHE_TTL_SECONDS: float = float(os.environ.get("LLM_RESPONSE_CACHE_TTL_SECONDS", 7 * 24 * 60 * 60))
+# Least recently replayed responses are evicted above this size
+LLM_RESPONSE_CACHE_MAX_BYTES: int = int(os.environ.get("LLM_RESPONSE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Replay speed relative to the recorded timing of the chunks, 1 replays them as recorded, 0 without any delays
+LLM_RESPONSE_CACHE_REPLAY_SPEED: float = float(os.environ.get("LLM_RESPONSE_CACHE_REPLAY_SPEED", 0))
+
+# Tool call outputs at least this large are kept in the project blob store instead of the chat, see blob_store
+BLOB_THRESHOLD_BYTES: int = int(os.environ.get("BLOB_THRESHOLD_BYTES", 16 * 1024))
+# Characters of the start and of the end of a stored text output kept in the chat
+BLOB_INLINE_TEXT_CHARS: int = int(os.environ.get("BLOB_INLINE_TEXT_CHARS", 2 * 1024))
+
+# Threads reading and writing chat files off the event loop
+CHAT_STORAGE_THREADS: int = int(os.environ.get("CHAT_STORAGE_THREADS", 4))
+# Where chats are stored: "json" keeps a file per chat, "sqlite" a single database in the chats directory
+CHAT_STORAGE_BACKEND: Literal["json", "sqlite"] = os.environ.get("CHAT_STORAGE_BACKEND", "json")  # type: ignore
+
+# Messages queued for a single websocket connection, and what happens when a slow client lets the queue fill up:
+# "drop" the message, "coalesce" it into the last queued one, or "disconnect" the client
+WEBSOCKET_OUTBOUND_QUEUE_SIZE: int = int(os.environ.get("WEBSOCKET_OUTBOUND_QUEUE_SIZE", 1024))
+WEBSOCKET_OUTBOUND_QUEUE_FULL_POLICY: Literal["drop", "coalesce", "disconnect"] = os.environ.get(  # type: ignore
+    "WEBSOCKET_OUTBOUND_QUEUE_FULL_POLICY", "coalesce"
+)
+
 
 LOG_FORMAT: str = "{name} {funcName} {message}"
 LOG_STYLE: str = "{"
@@ -0,0 +1,206 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Project local, content-addressed store for large tool call outputs, like images produced by the code interpreter.
+
+A stored output is replaced in the tool call by a short reference, [blob:<media type>:<size>:<sha256>],
+the content itself is served by the /api/blobs endpoint and left out of the LLM context. Large single outputs,
+like images, are stored as they arrive. Text is kept in the chat as it streams and, once complete, only its start
+and end are kept around a reference to the full text, see StreamedOutput.
+"""
+import base64
+import hashlib
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from aiconsole.consts import BLOB_INLINE_TEXT_CHARS, BLOB_THRESHOLD_BYTES
+from aiconsole.core.chat.chat_storage import run_in_storage_thread, write_atomically
+from aiconsole.core.project.paths import get_aic_directory
+
+BLOB_REFERENCE_PATTERN = re.compile(
+    r"\[blob:(?P<media_type>[\w.+-]+/[\w.+-]+):(?P<size>\d+):(?P<sha256>[0-9a-f]{64})\]"
+)
+
+# Outputs of these types are base64 encoded text, stored decoded
+_BASE64_MEDIA_TYPES = {"image/png", "image/jpeg"}
+
+
+@dataclass(frozen=True)
+class BlobReference:
+    sha256: str
+    media_type: str
+    size: int
+
+    def __str__(self) -> str:
+        return f"[blob:{self.media_type}:{self.size}:{self.sha256}]"
+
+    @property
+    def url(self) -> str:
+        return f"/api/blobs/{self.sha256}"
+
+    def placeholder(self) -> str:
+        """
+        Short description of the blob, used instead of its content in LLM context.
+        """
+        if self.media_type == "text/plain":
+            # Between the start and the end of the text, see StreamedOutput
+            return f"[... text output of {_format_size(self.size)} in total, only its start and end are shown ...]"
+        return f"[{self.media_type} output of {_format_size(self.size)}, not shown]"
+
+
+def get_blobs_directory(project_path: Path | None = None) -> Path:
+    return get_aic_directory(project_path) / "blobs"
+
+
+def get_blob_path(sha256: str, project_path: Path | None = None) -> Path:
+    return get_blobs_directory(project_path) / sha256[:2] / sha256
+
+
+def put_blob(data: bytes, media_type: str, project_path: Path | None = None) -> BlobReference:
+    sha256 = hashlib.sha256(data).hexdigest()
+    file_path = get_blob_path(sha256, project_path)
+    meta_path = file_path.with_suffix(".meta")
+
+    # Same content is stored once, the media type is written on its own, a write interrupted between the two is
+    # completed by the next put of the same content
+    if not file_path.exists():
+        os.makedirs(file_path.parent, exist_ok=True)
+        write_atomically(file_path, data)
+    if not meta_path.exists():
+        write_atomically(meta_path, media_type.encode("utf8"))
+
+    return BlobReference(sha256=sha256, media_type=media_type, size=len(data))
+
+
+def get_blob_media_type(sha256: str, project_path: Path | None = None) -> str | None:
+    meta_path = get_blob_path(sha256, project_path).with_suffix(".meta")
+    if not meta_path.exists():
+        return None
+    return meta_path.read_text(encoding="utf8").strip()
+
+
+async def externalize_output(content: str, media_type: str = "text/plain") -> str:
+    """
+    Stores image, HTML or JavaScript content of at least BLOB_THRESHOLD_BYTES as a blob and returns a reference to it,
+    text and smaller content is returned as is. The blob is written by a storage thread.
+    """
+    # Quick check before encoding, a character is at most 4 bytes. Text is shortened once complete, see StreamedOutput
+    if media_type == "text/plain" or len(content) * 4 < BLOB_THRESHOLD_BYTES:
+        return content
+
+    if media_type in _BASE64_MEDIA_TYPES:
+        try:
+            data = base64.b64decode(content, validate=True)
+        except ValueError:
+            return content
+    else:
+        data = content.encode("utf8")
+
+    if len(data) < BLOB_THRESHOLD_BYTES:
+        return content
+
+    # Kept on its own line, so it stays intact between other streamed output
+    return f"\n{await run_in_storage_thread(put_blob, data, media_type)}\n"
+
+
+class StreamedOutput:
+    """
+    Output of a tool call, streamed to the chat as it arrives. Once complete, if its text, apart from references
+    to blobs stored already, adds up to BLOB_THRESHOLD_BYTES, each long text is moved to a blob and only its start and
+    end are kept, so long outputs, like pip or build logs, stay readable without filling the chat and the LLM context,
+    and the error at the end of a failed run is kept.
+    """
+
+    def __init__(self, threshold: int = BLOB_THRESHOLD_BYTES, inline_chars: int = BLOB_INLINE_TEXT_CHARS):
+        self.threshold = threshold
+        self.inline_chars = inline_chars
+        self._chunks: list[str] = []
+        # An upper bound of the bytes of text, references included
+        self._bytes = 0
+
+    def append(self, delta: str) -> str:
+        self._chunks.append(delta)
+        self._bytes += len(delta.encode("utf8"))
+        return delta
+
+    async def externalize(self) -> str | None:
+        """
+        Returns the output to replace the streamed one with, if any of it was moved to blobs.
+        """
+        if self._bytes < self.threshold:
+            return None
+
+        output = "".join(self._chunks)
+        texts: list[str] = []
+        references: list[str] = []
+        position = 0
+        for match in BLOB_REFERENCE_PATTERN.finditer(output):
+            texts.append(output[position : match.start()])
+            references.append(match[0])
+            position = match.end()
+        texts.append(output[position:])
+
+        if sum(len(text.encode("utf8")) for text in texts) < self.threshold:
+            return None
+
+        externalized = []
+        is_externalized = False
+        for i, text in enumerate(texts):
+            if len(text) > 2 * self.inline_chars:
+                is_externalized = True
+                reference = await run_in_storage_thread(put_blob, text.encode("utf8"), "text/plain")
+                head, tail = _split_head_and_tail(text, self.inline_chars)
+                text = f"{head}\n{reference}\n{tail}"
+            externalized.append(text)
+            if i < len(references):
+                externalized.append(references[i])
+
+        return "".join(externalized) if is_externalized else None
+
+
+def _split_head_and_tail(text: str, chars: int) -> tuple[str, str]:
+    # At line boundaries, if there are any close enough
+    head = text[:chars]
+    if (end := head.rfind("\n")) >= chars // 2:
+        head = head[:end]
+
+    tail = text[-chars:]
+    if 0 <= (start := tail.find("\n")) < chars // 2:
+        tail = tail[start + 1 :]
+
+    return head, tail
+
+
+def replace_blob_references(text: str) -> str:
+    """
+    Replaces references to blobs with short placeholders, for text sent to the LLM.
+    """
+    return BLOB_REFERENCE_PATTERN.sub(
+        lambda match: BlobReference(
+            sha256=match["sha256"], media_type=match["media_type"], size=int(match["size"])
+        ).placeholder(),
+        text,
+    )
+
+
+def _format_size(size: int) -> str:
+    if size < 1024:
+        return f"{size} B"
+    if size < 1024 * 1024:
+        return f"{size / 1024:.0f} KB"
+    return f"{size / 1024 / 1024:.1f} MB"
@@ -0,0 +1,113 @@
+import base64
+
+import pytest
+
+from aiconsole.core.blobs.blob_store import (
+    BLOB_REFERENCE_PATTERN,
+    StreamedOutput,
+    externalize_output,
+    get_blob_media_type,
+    get_blob_path,
+    put_blob,
+    replace_blob_references,
+)
+from aiconsole.core.chat.actor_id import ActorId
+from aiconsole.core.chat.convert_messages import convert_message
+from aiconsole.core.chat.types import AICMessage, AICMessageGroup, AICToolCall
+
+pytestmark = pytest.mark.usefixtures("project_directory")
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 100
+
+
+@pytest.mark.asyncio
+async def test_should_keep_small_and_text_outputs_inline():
+    assert await externalize_output("Hello") == "Hello"
+    assert await externalize_output("x" * 100_000) == "x" * 100_000
+
+
+@pytest.mark.asyncio
+async def test_should_store_large_images_decoded_and_once():
+    content = base64.b64encode(PNG).decode()
+
+    reference = await externalize_output(content, "image/png")
+    match = BLOB_REFERENCE_PATTERN.search(reference)
+
+    assert match is not None
+    assert match["media_type"] == "image/png"
+    assert get_blob_path(match["sha256"]).read_bytes() == PNG
+    assert get_blob_media_type(match["sha256"]) == "image/png"
+
+    assert await externalize_output(content, "image/png") == reference
+
+
+@pytest.mark.asyncio
+async def test_should_show_the_llm_the_start_and_end_of_stored_text():
+    output = StreamedOutput(threshold=1000, inline_chars=100)
+    output.append("".join(f"Collecting package-{i}\n" for i in range(1000)))
+    output.append("Traceback (most recent call last):\nValueError: failed")
+    externalized = await output.externalize()
+    assert externalized is not None
+
+    group = AICMessageGroup(
+        id="g",
+        actor_id=ActorId(type="agent", id="agent"),
+        role="assistant",
+        task="",
+        materials_ids=[],
+        analysis="",
+        messages=[],
+    )
+    message = AICMessage(
+        id="m", timestamp="", content="", tool_calls=[AICToolCall(id="t", code="", headline="", output=externalized)]
+    )
+    content = convert_message(group, message)[-1].content
+
+    assert isinstance(content, str)
+    assert content.startswith("Collecting package-0\nCollecting package-1\n")
+    assert "[... text output of 22 KB in total, only its start and end are shown ...]" in content
+    assert content.endswith("Traceback (most recent call last):\nValueError: failed")
+    assert "[blob:" not in content and len(content) < 400
+
+
+@pytest.mark.asyncio
+async def test_should_move_long_streamed_text_to_a_blob_once_complete():
+    output = StreamedOutput(threshold=1000, inline_chars=100)
+    image_reference = await externalize_output(base64.b64encode(PNG).decode(), "image/png")
+
+    streamed = "".join(output.append(f"Collecting package-{i}\n") for i in range(100)) + output.append(image_reference)
+    externalized = await output.externalize()
+
+    assert externalized is not None
+    references = BLOB_REFERENCE_PATTERN.findall(externalized)
+    assert [media_type for media_type, _, _ in references] == ["text/plain", "image/png"]
+    assert get_blob_path(references[0][2]).read_text() == streamed[: streamed.index("[blob:")]
+    assert externalized.startswith("Collecting package-0\n")
+    assert "Collecting package-99\n" in externalized
+
+
+@pytest.mark.asyncio
+async def test_should_keep_small_streamed_outputs_and_count_bytes():
+    output = StreamedOutput(threshold=1000, inline_chars=100)
+    output.append("ż" * 400)
+    assert await output.externalize() is None
+
+    output.append("ż" * 100)
+    assert await output.externalize() is not None
+
+
+@pytest.mark.asyncio
+async def test_should_keep_streamed_text_shorter_than_its_start_and_end():
+    output = StreamedOutput(threshold=1000, inline_chars=1000)
+    output.append("x" * 1500)
+
+    assert await output.externalize() is None
+
+
+def test_should_repair_missing_media_type_of_stored_blob():
+    reference = put_blob(b"data", "text/csv")
+    get_blob_path(reference.sha256).with_suffix(".meta").unlink()
+
+    put_blob(b"data", "text/csv")
+
+    assert get_blob_media_type(reference.sha256) == "text/csv"
@@ -59,11 +59,13 @@ def _handle_CreateMessageGroupMutation(chat: Chat, mutation: CreateMessageGroupM
     )
 
     chat.message_groups.append(message_group)
+    chat.index_message_group(message_group)
 
 
 def _handle_DeleteMessageGroupMutation(chat, mutation: DeleteMessageGroupMutation) -> None:
     message_group = _get_message_group(chat, mutation.message_group_id)
     chat.message_groups = [group for group in chat.message_groups if group.id != message_group.id]
+    chat.unindex_message_group(message_group)
 
 
 def _handle_SetIsAnalysisInProgressMutation(chat, mutation: SetIsAnalysisInProgressMutation) -> None:
@@ -120,12 +122,13 @@ def _handle_CreateMessageMutation(chat, mutation: CreateMessageMutation) -> None
     message = AICMessage(
         id=mutation.message_id,
         content=mutation.content,
-        timestamp=datetime.now().isoformat(),
+        timestamp=mutation.timestamp or datetime.now().isoformat(),
         requested_format=None,
         tool_calls=[],
         is_streaming=False,
     )
     message_group.messages.append(message)
+    chat.index_message(message_group, message)
 
 
 def _handle_DeleteMessageMutation(chat, mutation: DeleteMessageMutation) -> None:
@@ -133,10 +136,12 @@ def _handle_DeleteMessageMutation(chat, mutation: DeleteMessageMutation) -> None
     message_location.message_group.messages = [
         m for m in message_location.message_group.messages if m.id != mutation.message_id
     ]
+    chat.unindex_message(message_location.message)
 
     # Remove message group if it's empty
     if not message_location.message_group.messages:
         chat.message_groups = [group for group in chat.message_groups if group.id != message_location.message_group.id]
+        chat.unindex_message_group(message_location.message_group)
 
 
 def _handle_SetContentMessageMutation(chat, mutation: SetContentMessageMutation) -> None:
@@ -144,8 +149,9 @@ def _handle_SetContentMessageMutation(chat, mutation: SetContentMessageMutation)
 
 
 def _handle_AppendToContentMessageMutation(chat, mutation: AppendToContentMessageMutation) -> None:
-    _get_message_location(chat, mutation.message_id).message.content += mutation.content_delta
-    _get_message_location(chat, mutation.message_id).message.is_streaming = True
+    message = _get_message_location(chat, mutation.message_id).message
+    message.append_text("content", mutation.content_delta)
+    message.is_streaming = True
 
 
 def _handle_SetMessageIsStreamingMutation(chat, mutation: SetIsStreamingMessageMutation) -> None:
@@ -153,7 +159,8 @@ def _handle_SetMessageIsStreamingMutation(chat, mutation: SetIsStreamingMessageM
 
 
 def _handle_CreateToolCallMutation(chat, mutation: CreateToolCallMutation) -> None:
-    message = _get_message_location(chat, mutation.message_id).message
+    message_location = _get_message_location(chat, mutation.message_id)
+    message = message_location.message
     tool_call = AICToolCall(
         id=mutation.tool_call_id,
         language=mutation.language,
@@ -162,21 +169,25 @@ def _handle_CreateToolCallMutation(chat, mutation: CreateToolCallMutation) -> No
         output=mutation.output,
     )
     message.tool_calls.append(tool_call)
+    chat.index_tool_call(message_location.message_group, message, tool_call)
 
 
 def _handle_DeleteToolCallMutation(chat, mutation: DeleteToolCallMutation) -> None:
     tool_call = _get_tool_call_location(chat, mutation.tool_call_id)
     tool_call.message.tool_calls = [tc for tc in tool_call.message.tool_calls if tc.id != mutation.tool_call_id]
+    chat.unindex_tool_call(tool_call.tool_call)
 
     # Remove message if it's empty
     if not tool_call.message.tool_calls and not tool_call.message.content:
         tool_call.message_group.messages = [
             m for m in tool_call.message_group.messages if m.id != tool_call.message.id
         ]
+        chat.unindex_message(tool_call.message)
 
     # Remove message group if it's empty
     if not tool_call.message_group.messages:
         chat.message_groups = [group for group in chat.message_groups if group.id != tool_call.message_group.id]
+        chat.unindex_message_group(tool_call.message_group)
 
 
 def _handle_SetToolCallHeadlineMutation(chat, mutation: SetHeadlineToolCallMutation) -> None:
@@ -192,7 +203,7 @@ def _handle_SetToolCallCodeMutation(chat, mutation: SetCodeToolCallMutation) ->
 
 
 def _handle_AppendToToolCallCodeMutation(chat, mutation: AppendToCodeToolCallMutation) -> None:
-    _get_tool_call_location(chat, mutation.tool_call_id).tool_call.code += mutation.code_delta
+    _get_tool_call_location(chat, mutation.tool_call_id).tool_call.append_text("code", mutation.code_delta)
 
 
 def _handle_SetToolCallLanguageMutation(chat, mutation: SetLanguageToolCallMutation) -> None:
@@ -204,10 +215,7 @@ def _handle_SetToolCallOutputMutation(chat, mutation: SetOutputToolCallMutation)
 
 
 def _handle_AppendToToolCallOutputMutation(chat, mutation: AppendToOutputToolCallMutation) -> None:
-    tool_call = _get_tool_call_location(chat, mutation.tool_call_id).tool_call
-    if tool_call.output is None:
-        tool_call.output = ""
-    tool_call.output += mutation.output_delta
+    _get_tool_call_location(chat, mutation.tool_call_id).tool_call.append_text("output", mutation.output_delta)
 
 
 def _handle_SetToolCallIsStreamingMutation(chat, mutation: SetIsStreamingToolCallMutation) -> None:
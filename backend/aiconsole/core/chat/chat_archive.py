@@ -0,0 +1,356 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Moves all chats of a project in and out as a single NDJSON archive, optionally gzip compressed.
+
+The first line is a header, every further line is either a chat or a blob its tool calls refer to, see blob_store.
+Blobs come before the first chat referring to them. Archives are read and written one line at a time,
+so memory use does not depend on the size of the archive, and chats are validated in worker processes.
+"""
+import base64
+import gzip
+import hashlib
+import logging
+import os
+import re
+import time
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, Literal
+
+from aiconsole.core.blobs.blob_store import (
+    BLOB_REFERENCE_PATTERN,
+    get_blob_media_type,
+    get_blob_path,
+    put_blob,
+)
+from aiconsole.core.chat.chat_journal import replay_chat_journal, truncate_chat_journal
+from aiconsole.core.chat.chat_search_index import chat_search_index
+from aiconsole.core.chat.chat_storage import dump_json, load_json
+from aiconsole.core.chat.load_chat_history import (
+    CHAT_SCHEMA_VERSION,
+    get_chat_name,
+    migrate_chat_data,
+)
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    chat_storage_backend,
+)
+from aiconsole.core.chat.types import Chat
+from aiconsole.core.project.paths import get_history_directory
+
+_log = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT = "aiconsole-chats"
+ARCHIVE_VERSION = 1
+
+# Chat ids end up in file names
+_CHAT_ID_PATTERN = re.compile(r"[\w-]+")
+
+# Exported lines are sent in chunks of at least this size
+_CHUNK_SIZE = 64 * 1024
+
+_GZIP_MAGIC = b"\x1f\x8b"
+
+
+@dataclass
+class ArchiveExportReport:
+    chats: int = 0
+    blobs: int = 0
+    failed: int = 0
+
+
+@dataclass
+class ArchiveImportReport:
+    imported: int = 0
+    skipped: int = 0
+    failed: int = 0
+    blobs: int = 0
+    seconds: float = 0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.imported} chats imported, {self.skipped} skipped, {self.failed} failed, "
+            f"{self.blobs} blobs in {self.seconds:.2f}s"
+        )
+
+
+def export_chats(project_path: Path | None = None, report: ArchiveExportReport | None = None) -> Iterator[bytes]:
+    """
+    Yields the lines of an archive of all chats of the project, most recently modified first. Blocking.
+    """
+    report = report or ArchiveExportReport()
+    storage = chat_storage_backend()
+    exported_blobs: set[str] = set()
+
+    yield dump_json({"type": "header", "format": ARCHIVE_FORMAT, "version": ARCHIVE_VERSION}) + b"\n"
+
+    for chat_id in storage.list_chat_ids(project_path):
+        try:
+            chat = storage.load(chat_id, project_path)
+            if chat is None:
+                continue  # deleted in the meantime
+            replay_chat_journal(chat, project_path)
+
+            content = chat.model_dump(mode="json", exclude={"id", "last_modified", "lock_id", "journal_seq"})
+            line = dump_json(
+                {
+                    "type": "chat",
+                    "id": chat_id,
+                    "last_modified": chat.last_modified.isoformat(),
+                    "chat": {**content, "schema_version": CHAT_SCHEMA_VERSION},
+                }
+            )
+        except Exception as e:
+            _log.exception(e)
+            _log.error(f"Failed to export chat {chat_id}: {e}")
+            report.failed += 1
+            continue
+
+        for sha256 in _referenced_blobs(chat):
+            if sha256 in exported_blobs:
+                continue
+            exported_blobs.add(sha256)
+
+            blob_line = _blob_line(sha256, project_path)
+            if blob_line is not None:
+                report.blobs += 1
+                yield blob_line
+
+        report.chats += 1
+        yield line + b"\n"
+
+
+def encode_archive(lines: Iterable[bytes], compress: bool = False) -> Iterator[bytes]:
+    """
+    Joins the lines into larger chunks, gzip compressed if requested.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS) if compress else None
+    buffer: list[bytes] = []
+    buffered = 0
+
+    for line in lines:
+        buffer.append(line)
+        buffered += len(line)
+
+        if buffered >= _CHUNK_SIZE:
+            chunk = b"".join(buffer)
+            buffer.clear()
+            buffered = 0
+
+            if compressor is not None:
+                chunk = compressor.compress(chunk)
+            if chunk:
+                yield chunk
+
+    chunk = b"".join(buffer)
+    if compressor is not None:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def read_archive_lines(f: BinaryIO) -> Iterator[bytes]:
+    """
+    Yields the non empty lines of an archive, decompressing it if it is gzip compressed.
+    """
+    # Buffered streams can be peeked into, anything else must be seekable
+    if hasattr(f, "peek"):
+        magic = f.peek(2)[:2]  # type: ignore
+    else:
+        magic = f.read(2)
+        f.seek(0)
+
+    stream: BinaryIO = gzip.GzipFile(fileobj=f) if magic == _GZIP_MAGIC else f  # type: ignore
+
+    for line in stream:
+        if line.strip():
+            yield line
+
+
+def import_chats(
+    f: BinaryIO,
+    project_path: Path | None = None,
+    replace: bool = False,
+    skip_chat_ids: set[str] | None = None,
+    workers: int | None = None,
+    on_progress: Callable[[ArchiveImportReport], None] | None = None,
+) -> ArchiveImportReport:
+    """
+    Imports the chats of an archive into the project. Chats already in the project are skipped, unless replace is set,
+    chats in skip_chat_ids are always skipped. Raises ValueError if f is not an archive. Blocking.
+    """
+    storage = chat_storage_backend()
+    history_directory = get_history_directory(project_path)
+    existing = set(storage.list_chat_ids(project_path))
+    skip_chat_ids = skip_chat_ids or set()
+
+    workers = workers or os.cpu_count() or 1
+    report = ArchiveImportReport()
+    start = time.perf_counter()
+
+    lines = read_archive_lines(f)
+    _check_header(next(lines, b""))
+
+    def store(future: Future[tuple[str, dict, datetime]]) -> None:
+        try:
+            chat_id, content, last_modified = future.result()
+
+            storage.put(history_directory, chat_id, content, last_modified)
+            # The stored chat was replaced as a whole, older journaled mutations do not apply to it
+            truncate_chat_journal(chat_id, project_path)
+            chat_search_index().index_chat(history_directory, chat_id, content)
+
+            report.imported += 1
+        except Exception as e:
+            _log.error(f"Failed to import chat: {e}")
+            report.failed += 1
+
+        report.seconds = time.perf_counter() - start
+        if on_progress is not None:
+            on_progress(report)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Validated chats are stored in archive order, with a bounded number of them in flight
+        pending: deque[Future[tuple[str, dict, datetime]]] = deque()
+
+        for line in lines:
+            try:
+                record_type, chat_id = _peek_record(line)
+
+                if record_type == "blob":
+                    _import_blob(line, project_path)
+                    report.blobs += 1
+                    continue
+
+                if chat_id in skip_chat_ids or (chat_id in existing and not replace):
+                    report.skipped += 1
+                    continue
+            except Exception as e:
+                _log.error(f"Failed to import archive line: {e}")
+                report.failed += 1
+                continue
+
+            # A chat repeated in the archive is an existing one by the time its later copy is read
+            existing.add(chat_id)
+            pending.append(executor.submit(validate_chat_line, line))
+
+            while len(pending) > workers * 4:
+                store(pending.popleft())
+
+        while pending:
+            store(pending.popleft())
+
+    report.seconds = time.perf_counter() - start
+
+    return report
+
+
+def validate_chat_line(line: bytes) -> tuple[str, dict, datetime]:
+    """
+    Returns the id, content as stored and last modification time of an archived chat. Runs in a worker process.
+    """
+    record = load_json(line)
+    chat_id = record["id"]
+    data = record["chat"]
+
+    if data.get("schema_version") != CHAT_SCHEMA_VERSION:
+        migrate_chat_data(data)
+
+    chat = Chat(
+        **{
+            **{k: v for k, v in data.items() if k not in ("id", "last_modified", "lock_id", "journal_seq")},
+            "id": chat_id,
+            "name": get_chat_name(data),
+            "last_modified": datetime.fromisoformat(record["last_modified"]),
+        }
+    )
+
+    content = chat.model_dump(exclude={"id", "last_modified", "lock_id"})
+    content["journal_seq"] = 0
+    content["schema_version"] = CHAT_SCHEMA_VERSION
+
+    return chat_id, content, chat.last_modified
+
+
+def _check_header(line: bytes) -> None:
+    try:
+        header = load_json(line)
+    except ValueError:
+        header = None
+
+    if not isinstance(header, dict) or header.get("type") != "header" or header.get("format") != ARCHIVE_FORMAT:
+        raise ValueError("Not a chat archive")
+
+    if header.get("version", 0) > ARCHIVE_VERSION:
+        raise ValueError(f"Unsupported chat archive version {header.get('version')}")
+
+
+def _peek_record(line: bytes) -> tuple[Literal["chat", "blob"], str]:
+    """
+    Returns the type of the record and the id of the chat, without validating the chat.
+    """
+    record = load_json(line)
+
+    if record.get("type") == "blob":
+        return "blob", ""
+
+    if record.get("type") != "chat":
+        raise ValueError(f"Unknown record type {record.get('type')}")
+
+    chat_id = record.get("id")
+    if not isinstance(chat_id, str) or not _CHAT_ID_PATTERN.fullmatch(chat_id):
+        raise ValueError(f"Invalid chat id {chat_id!r}")
+
+    return "chat", chat_id
+
+
+def _referenced_blobs(chat: Chat) -> Iterator[str]:
+    for message_group in chat.message_groups:
+        for message in message_group.messages:
+            for tool_call in message.tool_calls:
+                if tool_call.output:
+                    for match in BLOB_REFERENCE_PATTERN.finditer(tool_call.output):
+                        yield match["sha256"]
+
+
+def _blob_line(sha256: str, project_path: Path | None) -> bytes | None:
+    file_path = get_blob_path(sha256, project_path)
+    media_type = get_blob_media_type(sha256, project_path)
+
+    if media_type is None or not file_path.exists():
+        _log.warning(f"Blob {sha256} is missing, not exported")
+        return None
+
+    with open(file_path, "rb") as f:
+        data = base64.b64encode(f.read()).decode("ascii")
+
+    return dump_json({"type": "blob", "sha256": sha256, "media_type": media_type, "data": data}) + b"\n"
+
+
+def _import_blob(line: bytes, project_path: Path | None) -> None:
+    record = load_json(line)
+
+    data = base64.b64decode(record["data"], validate=True)
+
+    # Chats refer to the blob by this hash
+    if hashlib.sha256(data).hexdigest() != record["sha256"]:
+        raise ValueError(f"Content of blob {record['sha256']} does not match its hash")
+
+    put_blob(data, record["media_type"], project_path)
@@ -0,0 +1,129 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+In-memory LRU of chats loaded from disk, so reopening a chat does not re-parse and re-migrate its file.
+
+Entries remember the mtime and size of the chat file at load time and are dropped as soon as
+the file on disk no longer matches. The cached Chat objects are shared, like the ones in locking.chats.
+"""
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from aiconsole.consts import CHAT_CACHE_MAX_BYTES, CHAT_CACHE_MAX_CHATS
+from aiconsole.core.chat.types import Chat
+from aiconsole.core.project.paths import get_history_directory
+
+_log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class _FileStamp:
+    mtime_ns: int
+    size: int
+
+
+@dataclass
+class _CacheEntry:
+    chat: Chat
+    stamp: _FileStamp | None
+
+
+def _stamp(file_path: Path) -> _FileStamp | None:
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return _FileStamp(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+
+
+class ChatCache:
+    def __init__(self, max_chats: int = CHAT_CACHE_MAX_CHATS, max_bytes: int = CHAT_CACHE_MAX_BYTES):
+        self.max_chats = max_chats
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Path, _CacheEntry] = OrderedDict()
+        self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """
+        Approximated by the size of the chat files the cached chats were loaded from.
+        """
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: str) -> Chat | None:
+        file_path = self._file_path(chat_id)
+        entry = self._entries.get(file_path)
+
+        if entry is None or entry.stamp != _stamp(file_path):
+            if entry is not None:
+                self._remove(file_path)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(file_path)
+        self.hits += 1
+        return entry.chat
+
+    def put(self, chat: Chat) -> None:
+        """
+        Caches the chat as the current state of its file, call right after loading or saving it.
+        """
+        file_path = self._file_path(chat.id)
+        self._remove(file_path)
+
+        entry = _CacheEntry(chat=chat, stamp=_stamp(file_path))
+        self._entries[file_path] = entry
+        self._bytes += entry.stamp.size if entry.stamp else 0
+
+        while self._entries and (len(self._entries) > self.max_chats or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+
+    def restamp(self, chat: Chat) -> None:
+        """
+        Keeps the chat cached after it was saved, if it still is.
+        """
+        entry = self._entries.get(self._file_path(chat.id))
+        if entry is not None and entry.chat is chat:
+            self.put(chat)
+
+    def invalidate(self, chat_id: str) -> None:
+        self._remove(self._file_path(chat_id))
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, file_path: Path) -> None:
+        entry = self._entries.pop(file_path, None)
+        if entry is not None and entry.stamp:
+            self._bytes -= entry.stamp.size
+
+    def _file_path(self, chat_id: str) -> Path:
+        return (get_history_directory() / f"{chat_id}.json").absolute()
+
+
+@lru_cache
+def chat_cache() -> ChatCache:
+    return ChatCache()
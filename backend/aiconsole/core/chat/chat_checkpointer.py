@@ -0,0 +1,157 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+A locked chat is saved when its lock is released, which for a long director loop can be many minutes of work
+that only exists in memory. ChatCheckpointer saves such chats in the background while they are still locked.
+
+A chat is checkpointed once it has been dirty for CHAT_CHECKPOINT_INTERVAL_SECONDS or has received
+CHAT_CHECKPOINT_EVERY_MUTATIONS mutations. While a response is being streamed into it the checkpoint waits
+for a pause, so the chat is not snapshotted after every few tokens, but never longer than
+CHAT_CHECKPOINT_MAX_DELAY_SECONDS.
+"""
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+
+from aiconsole.consts import (
+    CHAT_CHECKPOINT_EVERY_MUTATIONS,
+    CHAT_CHECKPOINT_INTERVAL_SECONDS,
+    CHAT_CHECKPOINT_MAX_DELAY_SECONDS,
+    CHAT_CHECKPOINT_STREAMING_BACKOFF_SECONDS,
+)
+from aiconsole.core.chat.chat_mutations import ChatMutation
+from aiconsole.core.chat.merge_mutations import COALESCABLE_MUTATIONS
+from aiconsole.core.chat.save_chat_history import chat_writer
+from aiconsole.core.chat.types import Chat
+
+_log = logging.getLogger(__name__)
+
+# How often dirty chats are checked
+_TICK_SECONDS = 0.5
+
+
+@dataclass
+class CheckpointStats:
+    checkpoints: int = 0
+    failures: int = 0
+    total_seconds: float = 0
+    max_seconds: float = 0
+    last_seconds: float = 0
+
+    @property
+    def average_seconds(self) -> float:
+        return self.total_seconds / self.checkpoints if self.checkpoints else 0
+
+    def record(self, seconds: float) -> None:
+        self.checkpoints += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.last_seconds = seconds
+
+
+checkpoint_stats = CheckpointStats()
+
+
+@dataclass
+class _DirtyChat:
+    chat: Chat
+    dirty_since: float
+    last_mutation_at: float
+    mutations: int = 0
+    streaming: bool = False
+
+
+class ChatCheckpointer:
+    def __init__(self):
+        self._dirty: dict[str, _DirtyChat] = {}
+        self._task: asyncio.Task | None = None
+
+    def mark_dirty(self, chat: Chat, mutation: ChatMutation) -> None:
+        now = time.monotonic()
+
+        dirty = self._dirty.get(chat.id)
+        if dirty is None or dirty.chat is not chat:
+            dirty = self._dirty[chat.id] = _DirtyChat(chat=chat, dirty_since=now, last_mutation_at=now)
+
+        dirty.mutations += 1
+        dirty.last_mutation_at = now
+        dirty.streaming = type(mutation) in COALESCABLE_MUTATIONS
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def forget(self, chat_id: str) -> None:
+        """
+        Called when the chat is saved by other means, e.g. when its lock is released.
+        """
+        self._dirty.pop(chat_id, None)
+
+    async def checkpoint_all(self) -> None:
+        """
+        Checkpoints every dirty chat right away, used on shutdown.
+        """
+        while self._dirty:
+            _, dirty = self._dirty.popitem()
+            await self._checkpoint(dirty.chat)
+
+    def _is_due(self, dirty: _DirtyChat, now: float) -> bool:
+        age = now - dirty.dirty_since
+
+        if age >= CHAT_CHECKPOINT_MAX_DELAY_SECONDS:
+            return True
+
+        if dirty.streaming and now - dirty.last_mutation_at < CHAT_CHECKPOINT_STREAMING_BACKOFF_SECONDS:
+            return False
+
+        return age >= CHAT_CHECKPOINT_INTERVAL_SECONDS or dirty.mutations >= CHAT_CHECKPOINT_EVERY_MUTATIONS
+
+    async def _run(self):
+        try:
+            while self._dirty:
+                await asyncio.sleep(_TICK_SECONDS)
+
+                now = time.monotonic()
+                for chat_id, dirty in list(self._dirty.items()):
+                    if self._dirty.get(chat_id) is dirty and self._is_due(dirty, now):
+                        del self._dirty[chat_id]
+                        await self._checkpoint(dirty.chat)
+        finally:
+            self._task = None
+
+    async def _checkpoint(self, chat: Chat):
+        # Released in the meantime, release_lock has already saved it
+        if chat.lock_id is None:
+            return
+
+        start = time.perf_counter()
+        try:
+            await chat_writer().save(chat, scope="message_groups")
+        except Exception as e:
+            checkpoint_stats.failures += 1
+            _log.exception(e)
+            _log.error(f"Failed to checkpoint chat {chat.id}: {e}")
+            return
+
+        seconds = time.perf_counter() - start
+        checkpoint_stats.record(seconds)
+        _log.info(f"Checkpointed chat {chat.id} in {seconds * 1000:.1f}ms")
+
+
+@lru_cache
+def chat_checkpointer() -> ChatCheckpointer:
+    return ChatCheckpointer()
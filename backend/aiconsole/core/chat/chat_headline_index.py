@@ -0,0 +1,274 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Persistent index of chat headlines, so listing chats does not parse every chat file.
+
+Stored next to the chats as an append-only file of JSON lines, the last line of a chat wins.
+Every entry remembers the mtime and size of the chat file it was taken from, entries that no
+longer match the directory are refreshed by reconcile, which runs when a project is opened.
+"""
+import asyncio
+import json
+import logging
+import os
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+
+from aiconsole.core.chat.chat_journal import get_chat_journal_path
+from aiconsole.core.chat.chat_storage import load_json, run_in_storage_thread
+from aiconsole.core.chat.load_chat_history import (
+    CHAT_SCHEMA_VERSION,
+    get_chat_name,
+    load_chat_history,
+    migrate_chat_data,
+)
+from aiconsole.core.chat.types import ChatHeadline
+from aiconsole.core.project.paths import get_history_directory
+
+_log = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = ".headlines.jsonl"
+
+
+@dataclass
+class _IndexEntry:
+    id: str
+    name: str
+    mtime_ns: int
+    size: int
+
+    @property
+    def last_modified(self) -> datetime:
+        return datetime.fromtimestamp(self.mtime_ns / 1e9)
+
+
+class ChatHeadlineIndex:
+    def __init__(self):
+        self._history_directory: Path | None = None
+        self._entries: dict[str, _IndexEntry] = {}
+        self._lines = 0
+        self._lock = asyncio.Lock()
+        # Changes made while reconcile builds the entries, they are newer than anything it read
+        self._changed_while_reconciling: dict[str, _IndexEntry | None] | None = None
+
+    async def get_headlines(
+        self, offset: int = 0, limit: int | None = None, since: datetime | None = None
+    ) -> list[ChatHeadline]:
+        """
+        Most recently modified first.
+        """
+        await self._ensure_loaded()
+
+        entries = sorted(self._entries.values(), key=lambda entry: entry.mtime_ns, reverse=True)
+        if since is not None:
+            if since.tzinfo is not None:
+                # last_modified is naive local time
+                since = since.astimezone().replace(tzinfo=None)
+            entries = [entry for entry in entries if entry.last_modified > since]
+
+        entries = entries[offset : offset + limit if limit is not None else None]
+
+        return [ChatHeadline(id=entry.id, name=entry.name, last_modified=entry.last_modified) for entry in entries]
+
+    def update(self, chat_id: str, content: dict) -> None:
+        """
+        Call after the chat file has been written with content.
+        """
+        file_path = get_history_directory() / f"{chat_id}.json"
+        stat = os.stat(file_path)
+        self._write(_IndexEntry(id=chat_id, name=get_chat_name(content), mtime_ns=stat.st_mtime_ns, size=stat.st_size))
+
+    def remove(self, chat_id: str) -> None:
+        if self._is_loaded() and chat_id not in self._entries:
+            return
+
+        self._append_line({"id": chat_id, "deleted": True})
+        if self._is_loaded():
+            self._entries.pop(chat_id, None)
+        if self._changed_while_reconciling is not None:
+            self._changed_while_reconciling[chat_id] = None
+
+    async def reconcile(self) -> None:
+        """
+        Brings the index up to date with the chats directory, rereading the headlines of only the chats which changed.
+        """
+        async with self._lock:
+            await self._reconcile()
+
+    async def _ensure_loaded(self) -> None:
+        if self._is_loaded():
+            return
+
+        async with self._lock:
+            if not self._is_loaded():
+                await self._reconcile()
+
+    async def _reconcile(self) -> None:
+        history_directory = get_history_directory()
+        self._changed_while_reconciling = {}
+
+        try:
+            entries, lines = await run_in_storage_thread(_read_index, history_directory)
+            on_disk = await run_in_storage_thread(_scan_chats_directory, history_directory)
+
+            removed = [chat_id for chat_id in entries if chat_id not in on_disk]
+            changed = {
+                chat_id: stat
+                for chat_id, stat in on_disk.items()
+                if chat_id not in entries
+                or entries[chat_id].mtime_ns != stat.st_mtime_ns
+                or entries[chat_id].size != stat.st_size
+            }
+
+            names = await asyncio.gather(*(_read_name(chat_id) for chat_id in changed), return_exceptions=True)
+
+            new_lines: list[dict] = []
+            for chat_id in removed:
+                del entries[chat_id]
+                new_lines.append({"id": chat_id, "deleted": True})
+
+            for (chat_id, stat), name in zip(changed.items(), names):
+                if isinstance(name, BaseException):
+                    _log.error(f"Failed to index chat {chat_id}: {name}")
+                    continue
+
+                entry = entries[chat_id] = _IndexEntry(
+                    id=chat_id, name=name, mtime_ns=stat.st_mtime_ns, size=stat.st_size
+                )
+                new_lines.append(asdict(entry))
+
+            if new_lines:
+                await run_in_storage_thread(_append_lines, history_directory, new_lines)
+                lines += len(new_lines)
+
+            if changed:
+                _log.info(f"Reindexed {len(changed)} of {len(on_disk)} chats")
+
+            for chat_id, changed_entry in self._changed_while_reconciling.items():
+                if changed_entry is None:
+                    entries.pop(chat_id, None)
+                else:
+                    entries[chat_id] = changed_entry
+        finally:
+            self._changed_while_reconciling = None
+
+        # Only complete entries are ever visible
+        self._entries = entries
+        self._lines = lines
+        self._history_directory = history_directory
+
+        # Drop lines superseded by later ones
+        if self._lines > 2 * len(self._entries) + 100:
+            self._compact()
+
+    def _is_loaded(self) -> bool:
+        return self._history_directory == get_history_directory()
+
+    def _write(self, entry: _IndexEntry) -> None:
+        self._append_line(asdict(entry))
+        if self._is_loaded():
+            self._entries[entry.id] = entry
+        if self._changed_while_reconciling is not None:
+            self._changed_while_reconciling[entry.id] = entry
+
+    def _append_line(self, data: dict) -> None:
+        _append_lines(get_history_directory(), [data])
+
+        if self._is_loaded():
+            self._lines += 1
+
+    def _compact(self) -> None:
+        file_path = get_history_directory() / INDEX_FILE_NAME
+        temp_path = file_path.with_suffix(".tmp")
+
+        with open(temp_path, "w", encoding="utf8", errors="replace") as f:
+            for entry in self._entries.values():
+                f.write(json.dumps(asdict(entry)) + "\n")
+
+        os.replace(temp_path, file_path)
+        self._lines = len(self._entries)
+
+
+def _read_index(history_directory: Path) -> tuple[dict[str, _IndexEntry], int]:
+    """
+    Entries of the index file of the directory and the number of its lines.
+    """
+    entries: dict[str, _IndexEntry] = {}
+    lines = 0
+
+    file_path = history_directory / INDEX_FILE_NAME
+    if not file_path.exists():
+        return entries, lines
+
+    with open(file_path, "r", encoding="utf8", errors="replace") as f:
+        for line in f:
+            try:
+                data = json.loads(line)
+                if data.get("deleted"):
+                    entries.pop(data["id"], None)
+                else:
+                    entries[data["id"]] = _IndexEntry(**data)
+            except (json.JSONDecodeError, TypeError, KeyError):
+                # Incomplete last line, the chat will be reindexed
+                _log.warning(f"Ignoring corrupted line of chat headline index {file_path}")
+            lines += 1
+
+    return entries, lines
+
+
+def _scan_chats_directory(history_directory: Path) -> dict[str, os.stat_result]:
+    on_disk: dict[str, os.stat_result] = {}
+    if history_directory.is_dir():
+        with os.scandir(history_directory) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".json"):
+                    on_disk[entry.name.split(".")[0]] = entry.stat()
+    return on_disk
+
+
+async def _read_name(chat_id: str) -> str:
+    if await run_in_storage_thread(get_chat_journal_path(chat_id).exists):
+        # Mutations not saved to the file yet, e.g. the first message of a chat whose processing was interrupted
+        return (await load_chat_history(chat_id)).name
+
+    return await run_in_storage_thread(_read_chat_name, get_history_directory() / f"{chat_id}.json")
+
+
+def _read_chat_name(file_path: Path) -> str:
+    """
+    Reads only the headline fields, without building the chat.
+    """
+    with open(file_path, "rb") as f:
+        data = load_json(f.read())
+
+    if data.get("schema_version") != CHAT_SCHEMA_VERSION:
+        migrate_chat_data(data)
+
+    return get_chat_name(data)
+
+
+def _append_lines(history_directory: Path, lines: list[dict]) -> None:
+    os.makedirs(history_directory, exist_ok=True)
+
+    with open(history_directory / INDEX_FILE_NAME, "a", encoding="utf8", errors="replace") as f:
+        f.write("".join(json.dumps(data) + "\n" for data in lines))
+
+
+@lru_cache
+def chat_headline_index() -> ChatHeadlineIndex:
+    return ChatHeadlineIndex()
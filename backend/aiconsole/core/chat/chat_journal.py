@@ -0,0 +1,222 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Append-only log of the mutations applied to a chat since its last snapshot (the <id>.json file).
+
+Every journal entry carries a sequence number, the snapshot stores the sequence number of the
+last mutation it contains, so entries already compacted into the snapshot are never replayed twice.
+
+Entries are only queued on the event loop, a storage thread writes them in batches, so a streamed
+response does not do a file write per token.
+"""
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Annotated, TextIO
+
+from pydantic import Field, TypeAdapter
+
+from aiconsole.consts import CHAT_JOURNAL_COMPACT_BYTES, CHAT_JOURNAL_ENABLED
+from aiconsole.core.chat.apply_mutation import MUTATION_HANDLERS, apply_mutation
+from aiconsole.core.chat.chat_mutations import ChatMutation
+from aiconsole.core.chat.chat_storage import submit_to_storage_thread, write_atomically
+from aiconsole.core.chat.types import Chat
+from aiconsole.core.project.paths import get_history_directory
+
+_log = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".journal.jsonl"
+
+_mutation_adapter: TypeAdapter[ChatMutation] = TypeAdapter(Annotated[ChatMutation, Field(discriminator="type")])
+
+
+class _ChatJournal:
+    def __init__(self, file_path: Path):
+        self.file_path = file_path
+
+        # Guards the queued entries, held only briefly, also on the event loop
+        self._lock = threading.Lock()
+        self._pending: list[tuple[int, str]] = []
+        self._is_flush_scheduled = False
+        self._bytes_since_snapshot = 0
+
+        # Guards the file, held by storage threads while writing
+        self._file_lock = threading.Lock()
+        self._file: TextIO | None = None
+
+    def append(self, seq: int, line: str) -> bool:
+        """
+        Queues the entry for writing, returns whether the journal has grown enough to be compacted.
+        """
+        with self._lock:
+            self._pending.append((seq, line))
+            self._bytes_since_snapshot += len(line)
+
+            is_compaction_due = self._bytes_since_snapshot >= CHAT_JOURNAL_COMPACT_BYTES
+            if is_compaction_due:
+                # Counted from the snapshot being taken, the journal itself is truncated once it is written
+                self._bytes_since_snapshot = 0
+
+            is_flush_needed = not self._is_flush_scheduled
+            self._is_flush_scheduled = True
+
+        if is_flush_needed:
+            submit_to_storage_thread(self.flush)
+
+        return is_compaction_due
+
+    def flush(self) -> None:
+        """
+        Writes the queued entries. Blocking, run it in a storage thread.
+        """
+        try:
+            with self._file_lock:
+                with self._lock:
+                    self._is_flush_scheduled = False
+                    entries, self._pending = self._pending, []
+
+                if not entries:
+                    return
+
+                if self._file is None:
+                    os.makedirs(self.file_path.parent, exist_ok=True)
+                    self._file = open(self.file_path, "a", encoding="utf8", errors="replace")
+
+                self._file.write("".join(line for _, line in entries))
+                self._file.flush()
+        except Exception as e:
+            _log.exception(f"Failed to write chat journal {self.file_path}: {e}")
+
+    def replayed(self, size: int) -> None:
+        with self._lock:
+            self._bytes_since_snapshot = size
+
+    def truncate(self, up_to_seq: int | None) -> None:
+        """
+        Removes the entries up to the given sequence number, all of them if it is None. Blocking.
+        """
+        with self._file_lock:
+            with self._lock:
+                if up_to_seq is None:
+                    self._pending = []
+                    self._bytes_since_snapshot = 0
+                else:
+                    self._pending = [(seq, line) for seq, line in self._pending if seq > up_to_seq]
+
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+            kept = []
+            if up_to_seq is not None and self.file_path.exists():
+                kept = [line for seq, line in _read_entries(self.file_path) if seq > up_to_seq]
+
+            if kept:
+                write_atomically(self.file_path, "".join(kept).encode("utf8"))
+            elif self.file_path.exists():
+                os.remove(self.file_path)
+
+
+_journals: dict[Path, _ChatJournal] = {}
+# Journals are also looked up by storage threads, replaying them
+_journals_lock = threading.Lock()
+
+
+def _get_journal(file_path: Path) -> _ChatJournal:
+    with _journals_lock:
+        journal = _journals.get(file_path)
+        if journal is None:
+            journal = _journals[file_path] = _ChatJournal(file_path)
+        return journal
+
+
+def _read_entries(file_path: Path) -> list[tuple[int, str]]:
+    entries = []
+    with open(file_path, "r", encoding="utf8", errors="replace") as f:
+        for line in f:
+            try:
+                entries.append((json.loads(line)["seq"], line))
+            except json.JSONDecodeError:
+                # Last line might be incomplete if the process died while writing it
+                _log.warning(f"Ignoring corrupted tail of chat journal {file_path}")
+                break
+    return entries
+
+
+def get_chat_journal_path(chat_id: str, project_path: Path | None = None) -> Path:
+    return get_history_directory(project_path) / f"{chat_id}{JOURNAL_SUFFIX}"
+
+
+def append_to_chat_journal(chat: Chat, mutation: ChatMutation) -> None:
+    """
+    Records an already applied mutation, compacting the journal into a snapshot every CHAT_JOURNAL_COMPACT_BYTES.
+    """
+    if not CHAT_JOURNAL_ENABLED or mutation.__class__.__name__ not in MUTATION_HANDLERS:
+        return
+
+    chat.journal_seq += 1
+    line = json.dumps({"seq": chat.journal_seq, "mutation": mutation.model_dump(mode="json")}) + "\n"
+
+    if _get_journal(get_chat_journal_path(chat.id)).append(chat.journal_seq, line):
+        from aiconsole.core.chat.save_chat_history import chat_writer
+
+        chat_writer().schedule(chat, scope="message_groups")
+
+
+def replay_chat_journal(chat: Chat, project_path: Path | None = None) -> None:
+    """
+    Applies the journal entries newer than the snapshot the chat was loaded from.
+    """
+    file_path = get_chat_journal_path(chat.id, project_path)
+
+    with _journals_lock:
+        journal = _journals.get(file_path)
+    if journal is not None:
+        journal.flush()
+
+    if not file_path.exists():
+        return
+
+    replayed = 0
+
+    for seq, line in _read_entries(file_path):
+        if seq <= chat.journal_seq:
+            continue
+
+        try:
+            apply_mutation(chat, _mutation_adapter.validate_python(json.loads(line)["mutation"]))
+        except Exception as e:
+            _log.exception(f"Failed to replay mutation {seq} of chat {chat.id}: {e}")
+
+        chat.journal_seq = seq
+        replayed += len(line)
+
+    _get_journal(file_path).replayed(replayed)
+
+
+def truncate_chat_journal(chat_id: str, project_path: Path | None = None, up_to_seq: int | None = None) -> None:
+    """
+    Removes the journal entries up to the given sequence number, the whole journal if it is None. Call only after
+    the entries have been persisted in a snapshot.
+    """
+    file_path = get_chat_journal_path(chat_id, project_path)
+
+    with _journals_lock:
+        journal = _journals.pop(file_path, None) if up_to_seq is None else _journals.get(file_path)
+
+    (journal or _ChatJournal(file_path)).truncate(up_to_seq)
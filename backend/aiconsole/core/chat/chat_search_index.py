@@ -0,0 +1,352 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Full-text search over all chats of a project, in an SQLite FTS5 index stored next to the chats.
+
+Every chat is split into segments (its name, message contents, tool call code and output, analyses),
+each indexed as its own document. Writing a chat reindexes only the segments whose text changed.
+Chats are ranked by their best matching segment, which is also where the snippet comes from.
+Chats changed while the app was not running are reindexed by reconcile, which runs in the
+background when a project is opened.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator
+
+from aiconsole.core.chat.chat_storage import run_in_storage_thread
+from aiconsole.core.chat.load_chat_history import get_chat_name, load_chat_history
+from aiconsole.core.chat.types import ChatSearchResult, ChatSearchResults
+from aiconsole.core.project.paths import get_history_directory
+
+_log = logging.getLogger(__name__)
+
+INDEX_FILE_NAME = ".search.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    indexed_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    chat_id TEXT NOT NULL,
+    key TEXT NOT NULL,
+    message_group_id TEXT,
+    field TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (chat_id, key)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    text, content = 'segments', content_rowid = 'id', tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS segments_insert AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts (rowid, text) VALUES (new.id, new.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS segments_delete AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts (segments_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+"""
+
+# Marks the matched words in snippets, characters which do not occur in chats
+_HIGHLIGHT_START = "\x02"
+_HIGHLIGHT_END = "\x03"
+_SNIPPET_TOKENS = 24
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def _segments(content: dict) -> dict[str, tuple[str | None, str, str]]:
+    """
+    Searchable parts of a chat stored as content, key -> (message group id, field, text).
+    """
+    segments: dict[str, tuple[str | None, str, str]] = {"name": (None, "name", get_chat_name(content))}
+
+    for group in content["message_groups"]:
+        group_id = group["id"]
+        segments[f"{group_id}:analysis"] = (group_id, "analysis", group.get("analysis") or "")
+
+        for message in group["messages"]:
+            segments[message["id"]] = (group_id, "content", message.get("content") or "")
+
+            for tool_call in message.get("tool_calls") or []:
+                segments[f"{tool_call['id']}:code"] = (group_id, "code", tool_call.get("code") or "")
+                segments[f"{tool_call['id']}:output"] = (group_id, "output", tool_call.get("output") or "")
+
+    return {key: segment for key, segment in segments.items() if segment[2]}
+
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf8", errors="replace"), digest_size=16).hexdigest()
+
+
+def _match_expression(query: str) -> str | None:
+    """
+    All words of the query have to match, the last one is matched as a prefix as it might not be finished yet.
+    """
+    words = _WORD_PATTERN.findall(query)
+    if not words:
+        return None
+
+    terms = [f'"{word}"' for word in words]
+    # Single letter prefixes would match nearly everything
+    if len(words[-1]) > 1:
+        terms[-1] += "*"
+
+    return " ".join(terms)
+
+
+def _parse_snippet(snippet: str) -> tuple[str, list[tuple[int, int]]]:
+    text = []
+    highlights = []
+    length = 0
+    start = 0
+
+    for part in re.split(f"([{_HIGHLIGHT_START}{_HIGHLIGHT_END}])", snippet):
+        if part == _HIGHLIGHT_START:
+            start = length
+        elif part == _HIGHLIGHT_END:
+            highlights.append((start, length))
+        else:
+            text.append(part)
+            length += len(part)
+
+    return "".join(text), highlights
+
+
+class ChatSearchIndex:
+    def __init__(self):
+        self._connections: dict[Path, sqlite3.Connection] = {}
+        # Connections are shared by the storage threads, one transaction at a time
+        self._lock = threading.Lock()
+        self._reconcile_task: asyncio.Task | None = None
+
+    def index_chat(self, history_directory: Path, chat_id: str, content: dict) -> None:
+        """
+        Call after the chat has been written with content. Blocking, run it in a storage thread.
+        """
+        segments = _segments(content)
+
+        with self._transaction(history_directory) as db:
+            existing = {
+                key: (id, digest)
+                for id, key, digest in db.execute("SELECT id, key, digest FROM segments WHERE chat_id = ?", (chat_id,))
+            }
+
+            digests = {key: _digest(text) for key, (_, _, text) in segments.items()}
+            for key, (id, digest) in existing.items():
+                if digests.get(key) != digest:
+                    db.execute("DELETE FROM segments WHERE id = ?", (id,))
+
+            db.executemany(
+                """
+                INSERT INTO segments (chat_id, key, message_group_id, field, digest, text)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                [
+                    (chat_id, key, message_group_id, field, digests[key], text)
+                    for key, (message_group_id, field, text) in segments.items()
+                    if key not in existing or existing[key][1] != digests[key]
+                ],
+            )
+
+            db.execute(
+                "INSERT OR REPLACE INTO chats (id, name, indexed_at) VALUES (?, ?, ?)",
+                (chat_id, segments["name"][2] if "name" in segments else "", time.time()),
+            )
+
+    def remove(self, history_directory: Path, chat_id: str) -> None:
+        if not (history_directory / INDEX_FILE_NAME).exists():
+            return
+
+        with self._transaction(history_directory) as db:
+            db.execute("DELETE FROM segments WHERE chat_id = ?", (chat_id,))
+            db.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+
+    async def search(self, query: str, offset: int = 0, limit: int = 20) -> ChatSearchResults:
+        """
+        Chats matching all words of the query, best matches first.
+        """
+        return await run_in_storage_thread(self._search, get_history_directory(), query, offset, limit)
+
+    def _search(self, history_directory: Path, query: str, offset: int, limit: int) -> ChatSearchResults:
+        expression = _match_expression(query)
+        if expression is None or not (history_directory / INDEX_FILE_NAME).exists():
+            return ChatSearchResults(results=[], has_more=False)
+
+        with self._transaction(history_directory) as db:
+            # Every matching segment is ranked by bm25, the default rank of FTS5, so a strong match in an old chat
+            # is not missed. The bare segment_id of a group is taken from the row with the MIN rank.
+            matches = db.execute(
+                """
+                SELECT best.chat_id, chats.name, best.rank, best.segment_id
+                FROM (
+                    SELECT segments.chat_id, MIN(matches.rank) AS rank, matches.segment_id
+                    FROM (
+                        SELECT rowid AS segment_id, rank
+                        FROM segments_fts WHERE segments_fts MATCH ?
+                    ) AS matches
+                    JOIN segments ON segments.id = matches.segment_id
+                    GROUP BY segments.chat_id
+                ) AS best
+                JOIN chats ON chats.id = best.chat_id
+                ORDER BY best.rank, chats.indexed_at DESC
+                LIMIT ? OFFSET ?
+                """,
+                (expression, limit + 1, offset),
+            ).fetchall()
+
+            has_more = len(matches) > limit
+            matches = matches[:limit]
+
+            # Snippets only for the best segment of each chat on the page
+            segment_ids = [segment_id for _, _, _, segment_id in matches]
+            snippets = {
+                id: (message_group_id, field, snippet)
+                for id, message_group_id, field, snippet in db.execute(
+                    f"""
+                    SELECT segments.id, segments.message_group_id, segments.field,
+                    snippet(segments_fts, 0, ?, ?, '…', {_SNIPPET_TOKENS})
+                    FROM segments_fts JOIN segments ON segments.id = segments_fts.rowid
+                    WHERE segments_fts MATCH ? AND segments_fts.rowid IN ({", ".join("?" * len(segment_ids))})
+                    """,
+                    (_HIGHLIGHT_START, _HIGHLIGHT_END, expression, *segment_ids),
+                )
+            }
+
+        results = []
+        for chat_id, name, rank, segment_id in matches:
+            message_group_id, field, snippet = snippets[segment_id]
+            text, highlights = _parse_snippet(snippet)
+            results.append(
+                ChatSearchResult(
+                    chat_id=chat_id,
+                    name=name,
+                    message_group_id=message_group_id,
+                    field=field,
+                    snippet=text,
+                    highlights=highlights,
+                    # bm25 is lower for better matches
+                    score=-rank,
+                )
+            )
+
+        return ChatSearchResults(results=results, has_more=has_more)
+
+    def start_reconcile(self) -> None:
+        """
+        Reconciles in the background, indexing all chats of a project the first time can take a while.
+        A reconcile of a previously opened project stops on its own.
+        """
+        self._reconcile_task = asyncio.create_task(self.reconcile())
+
+    async def reconcile(self) -> None:
+        """
+        Indexes the chats modified since they were last indexed and drops the deleted ones.
+        """
+        from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+            chat_storage_backend,
+        )
+
+        history_directory = get_history_directory()
+
+        headlines = await chat_storage_backend().get_headlines()
+        indexed_at = await run_in_storage_thread(self._get_indexed_at, history_directory)
+
+        for chat_id in indexed_at.keys() - {headline.id for headline in headlines}:
+            await run_in_storage_thread(self.remove, history_directory, chat_id)
+
+        stale = [
+            headline.id
+            for headline in headlines
+            if indexed_at.get(headline.id, float("-inf")) < headline.last_modified.timestamp()
+        ]
+
+        for chat_id in stale:
+            # Another project was opened in the meantime
+            if get_history_directory() != history_directory:
+                return
+
+            try:
+                chat = await load_chat_history(chat_id)
+                content = chat.model_dump(exclude={"id", "last_modified", "lock_id"})
+                await run_in_storage_thread(self.index_chat, history_directory, chat_id, content)
+            except Exception as e:
+                _log.exception(e)
+                _log.error(f"Failed to index chat {chat_id} for search: {e}")
+
+        if stale:
+            _log.info(f"Indexed {len(stale)} of {len(headlines)} chats for search")
+
+    def _get_indexed_at(self, history_directory: Path) -> dict[str, float]:
+        if not (history_directory / INDEX_FILE_NAME).exists():
+            return {}
+
+        with self._transaction(history_directory) as db:
+            return dict(db.execute("SELECT id, indexed_at FROM chats").fetchall())
+
+    def close(self) -> None:
+        with self._lock:
+            for db in self._connections.values():
+                db.close()
+            self._connections.clear()
+
+    @contextmanager
+    def _transaction(self, history_directory: Path) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            db = self._connect(history_directory)
+            db.execute("BEGIN")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _connect(self, history_directory: Path) -> sqlite3.Connection:
+        file_path = history_directory / INDEX_FILE_NAME
+
+        db = self._connections.get(file_path)
+        if db is None:
+            history_directory.mkdir(parents=True, exist_ok=True)
+
+            db = sqlite3.connect(file_path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode = WAL")
+            # Commits are not synced to disk, a crash can lose the last few updates, reconcile catches up on them
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.executescript(_SCHEMA)
+
+            self._connections[file_path] = db
+
+        return db
+
+
+@lru_cache
+def chat_search_index() -> ChatSearchIndex:
+    return ChatSearchIndex()
@@ -0,0 +1,85 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+File I/O of chats runs in a dedicated thread pool, so reading or writing a large chat does not stall the event loop.
+"""
+import asyncio
+import json
+import os
+import tempfile
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, TypeVar
+
+from aiconsole.consts import CHAT_STORAGE_THREADS
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+T = TypeVar("T")
+
+_executor = ThreadPoolExecutor(max_workers=CHAT_STORAGE_THREADS, thread_name_prefix="chat-storage")
+
+
+async def run_in_storage_thread(func: Callable[..., T], *args, **kwargs) -> T:
+    return await asyncio.get_running_loop().run_in_executor(_executor, partial(func, *args, **kwargs))
+
+
+def submit_to_storage_thread(func: Callable[..., T], *args, **kwargs) -> Future[T]:
+    """
+    Like run_in_storage_thread, for callers not awaiting the result, also outside of the event loop.
+    """
+    return _executor.submit(func, *args, **kwargs)
+
+
+def dump_json(data: Any) -> bytes:
+    """
+    Encoding holds the GIL, and with it the event loop, so use orjson when it is installed, it is several times faster.
+    """
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data).encode("utf8")
+
+
+def join_json_fields(fields: dict[str, bytes]) -> bytes:
+    """
+    Encodes an object whose field values are already encoded, in the order of fields.
+    """
+    return b"{" + b",".join(dump_json(key) + b":" + value for key, value in fields.items()) + b"}"
+
+
+def load_json(content: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def write_atomically(file_path: Path, content: bytes) -> None:
+    """
+    Readers see either the old or the new content, never a partially written file.
+    """
+    fd, temp_path = tempfile.mkstemp(dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
@@ -16,6 +16,7 @@
 
 import json
 
+from aiconsole.core.blobs.blob_store import replace_blob_references
 from aiconsole.core.chat.types import AICMessage, AICMessageGroup, Chat
 from aiconsole.core.gpt.types import (
     GPTFunctionCall,
@@ -67,6 +68,8 @@ def convert_message(group: AICMessageGroup, message: AICMessage) -> list[GPTRequ
             if content == "":
                 content = "No output"
 
+            content = replace_blob_references(content)
+
             result.append(GPTRequestToolMessage(tool_call_id=tool_call_id, content=content))
 
     return result
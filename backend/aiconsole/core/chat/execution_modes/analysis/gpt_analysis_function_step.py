@@ -39,6 +39,7 @@ from aiconsole.core.chat.execution_modes.analysis.create_plan_class import (
 )
 from aiconsole.core.chat.types import Chat
 from aiconsole.core.gpt.consts import GPTMode
+from aiconsole.core.gpt.context_builder import context_builder
 from aiconsole.core.gpt.gpt_executor import GPTExecutor
 from aiconsole.core.gpt.request import GPTRequest
 from aiconsole.core.gpt.tool_definition import ToolDefinition, ToolFunctionDefinition
@@ -180,6 +181,7 @@ async def gpt_analysis_function_step(
         presence_penalty=2,
         min_tokens=DIRECTOR_MIN_TOKENS,
         preferred_tokens=DIRECTOR_PREFERRED_TOKENS,
+        context_builder=context_builder(),
     )
 
     if force_call:
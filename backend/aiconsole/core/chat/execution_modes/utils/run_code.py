@@ -3,6 +3,7 @@ import traceback
 from aiconsole.api.websockets.connection_manager import connection_manager
 from aiconsole.api.websockets.server_messages import ErrorServerMessage
 from aiconsole.core.assets.materials.material import Material
+from aiconsole.core.blobs.blob_store import StreamedOutput
 from aiconsole.core.chat.chat_mutations import (
     AppendToOutputToolCallMutation,
     SetIsExecutingToolCallMutation,
@@ -23,6 +24,7 @@ async def run_code(
         raise Exception(f"Tool call {tool_call_id} should have been created")
 
     tool_call = tool_call_location.tool_call
+    output = StreamedOutput()
 
     try:
         await chat_mutator.mutate(
@@ -47,7 +49,7 @@ async def run_code(
                 await chat_mutator.mutate(
                     AppendToOutputToolCallMutation(
                         tool_call_id=tool_call_id,
-                        output_delta=token,
+                        output_delta=output.append(token),
                     )
                 )
         except Exception:
@@ -58,10 +60,19 @@ async def run_code(
             await chat_mutator.mutate(
                 AppendToOutputToolCallMutation(
                     tool_call_id=tool_call_id,
-                    output_delta=traceback.format_exc().strip(),
+                    output_delta=output.append(traceback.format_exc().strip()),
                 )
             )
     finally:
+        externalized_output = await output.externalize()
+        if externalized_output is not None:
+            await chat_mutator.mutate(
+                SetOutputToolCallMutation(
+                    tool_call_id=tool_call_id,
+                    output=externalized_output,
+                )
+            )
+
         await chat_mutator.mutate(
             SetIsExecutingToolCallMutation(
                 tool_call_id=tool_call_id,
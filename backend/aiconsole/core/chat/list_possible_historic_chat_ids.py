@@ -14,21 +14,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import os
 from pathlib import Path
 
-from aiconsole.core.project.paths import get_history_directory
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    chat_storage_backend,
+)
 
 
 def list_possible_historic_chat_ids(project_path: Path | None = None):
-    history_directory = get_history_directory(project_path)
-    if history_directory.exists() and history_directory.is_dir():
-        entries = os.scandir(history_directory)
-
-        files = [entry for entry in entries if entry.is_file() and entry.name.endswith(".json")]
-        # Sort the files based on modification time (descending order)
-        files = sorted(files, key=lambda entry: os.path.getmtime(entry.path), reverse=True)
-
-        return [file.name.split(".")[0] for file in files]
-    else:
-        return []
+    return chat_storage_backend().list_chat_ids(project_path)
@@ -14,134 +14,129 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-import os
 import uuid
 from datetime import datetime
 from pathlib import Path
 
+from aiconsole.core.chat.chat_journal import replay_chat_journal
+from aiconsole.core.chat.chat_storage import run_in_storage_thread
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    chat_storage_backend,
+)
 from aiconsole.core.chat.types import Chat
-from aiconsole.core.project.paths import get_history_directory
 
+# Increase when the format of chat files changes, and convert the older ones in migrate_chat_data
+CHAT_SCHEMA_VERSION = 1
 
-async def load_chat_history(id: str, project_path: Path | None = None) -> Chat:
-    history_directory = get_history_directory(project_path)
-    file_path = history_directory / f"{id}.json"
 
-    if file_path.exists():
-        with open(file_path, "r", encoding="utf8", errors="replace") as f:
-            data = json.load(f)
+def get_chat_name(data: dict) -> str:
+    """
+    Name of the chat stored as data, chats which were not renamed by the user are named after their first message.
+    """
+
+    def extract_default_headline():
+        for group in data["message_groups"]:
+            if "messages" in group and group["messages"]:
+                for msg in group["messages"]:
+                    return msg.get("content")
 
-            # Convert old format
-            if "message_groups" not in data or not data["message_groups"]:
-                data["message_groups"] = []
+    if "title_edited" not in data or not data["title_edited"]:
+        return extract_default_headline() or "New Chat"
 
-                if "messages" in data and data["messages"]:
-                    for message in data["messages"]:
-                        data["message_groups"].append(
+    if "name" in data and data["name"]:
+        return data["name"]
+    elif "headline" in data and data["headline"]:
+        return data["headline"]
+    elif "title" in data and data["title"]:
+        return data["title"]
+    else:
+        return extract_default_headline() or "New Chat"
+
+
+def migrate_chat_data(data: dict) -> dict:
+    """
+    Converts data of a chat file saved in any older format to the current one, in place.
+    """
+    # Convert old format
+    if "message_groups" not in data or not data["message_groups"]:
+        data["message_groups"] = []
+
+        if "messages" in data and data["messages"]:
+            for message in data["messages"]:
+                data["message_groups"].append(
+                    {
+                        "id": message["id"] if "id" in message else uuid.uuid4().hex,
+                        "role": message["role"] if "role" in message else "",
+                        "task": message["task"] if "task" in message and message["task"] else "",
+                        "agent_id": message["agent_id"] if "agent_id" in message else "",
+                        "materials_ids": (
+                            message["materials_ids"] if "materials_ids" in message and message["materials_ids"] else []
+                        ),
+                        "messages": [
                             {
                                 "id": message["id"] if "id" in message else uuid.uuid4().hex,
-                                "role": message["role"] if "role" in message else "",
-                                "task": message["task"] if "task" in message and message["task"] else "",
-                                "agent_id": message["agent_id"] if "agent_id" in message else "",
-                                "materials_ids": (
-                                    message["materials_ids"]
-                                    if "materials_ids" in message and message["materials_ids"]
-                                    else []
-                                ),
-                                "messages": [
-                                    {
-                                        "id": message["id"] if "id" in message else uuid.uuid4().hex,
-                                        "timestamp": message["timestamp"] if "timestamp" in message else "",
-                                        "content": message["content"] if "content" in message else "",
-                                    }
-                                ],
+                                "timestamp": message["timestamp"] if "timestamp" in message else "",
+                                "content": message["content"] if "content" in message else "",
                             }
-                        )
-                    del data["messages"]
-
-            # Add tool_calls to each message
-            for group in data["message_groups"]:
-                if "messages" in group and group["messages"]:
-                    for msg in group["messages"]:
-                        if "tool_calls" not in msg:
-                            msg["tool_calls"] = []
-
-            # For all tool calls without headline add an empty headline
-            for group in data["message_groups"]:
-                if "messages" in group and group["messages"]:
-                    for msg in group["messages"]:
-                        if "tool_calls" in msg and msg["tool_calls"]:
-                            for tool_call in msg["tool_calls"]:
-                                if "headline" not in tool_call:
-                                    tool_call["headline"] = ""
-
-            # For each tool with "shell" language change it to "python"
-            for group in data["message_groups"]:
-                if "messages" in group and group["messages"]:
-                    for msg in group["messages"]:
-                        if "tool_calls" in msg and msg["tool_calls"]:
-                            for tool_call in msg["tool_calls"]:
-                                if "language" in tool_call and tool_call["language"] == "shell":
-                                    tool_call["language"] = "python"
-
-            # For each tool call add "type" field with default "function" value
-            for group in data["message_groups"]:
-                if "messages" in group and group["messages"]:
-                    for msg in group["messages"]:
-                        if "tool_calls" in msg and msg["tool_calls"]:
-                            for tool_call in msg["tool_calls"]:
-                                if "type" not in tool_call:
-                                    tool_call["type"] = "function"
-
-            # For each agent_id change it to actor_id
-            for group in data["message_groups"]:
-                if "agent_id" in group:
-                    group["actor_id"] = {
-                        "type": "user" if group["agent_id"] == "user" else "agent",
-                        "id": group["agent_id"],
+                        ],
                     }
-                    del group["agent_id"]
-
-            # Add "analysis" to each message group
-            for group in data["message_groups"]:
-                if "analysis" not in group:
-                    group["analysis"] = ""
-
-            def extract_default_headline():
-                for group in data["message_groups"]:
-                    if "messages" in group and group["messages"]:
-                        for msg in group["messages"]:
-                            return msg.get("content")
-
-            if "name" not in data or not data["name"]:
-                if "headline" in data and data["headline"]:
-                    data["name"] = data["headline"]
-                elif "title" in data and data["title"]:
-                    data["name"] = data["title"]
-                else:
-                    data["name"] = extract_default_headline() or "New Chat"
-
-            if "title_edited" not in data or not data["title_edited"]:
-                data["title_edited"] = False
-                data["name"] = extract_default_headline() or "New Chat"
-
-            if "id" in data:
-                del data["id"]
-
-            if "last_modified" in data:
-                del data["last_modified"]
-
-            return Chat(
-                id=id,
-                last_modified=datetime.fromtimestamp(os.path.getmtime(file_path)),
-                **data,
-            )
-    else:
-        return Chat(
+                )
+            del data["messages"]
+
+    for group in data["message_groups"]:
+        # Change agent_id to actor_id
+        if "agent_id" in group:
+            group["actor_id"] = {
+                "type": "user" if group["agent_id"] == "user" else "agent",
+                "id": group["agent_id"],
+            }
+            del group["agent_id"]
+
+        if "analysis" not in group:
+            group["analysis"] = ""
+
+        if "messages" in group and group["messages"]:
+            for msg in group["messages"]:
+                if "tool_calls" not in msg:
+                    msg["tool_calls"] = []
+
+                for tool_call in msg["tool_calls"] or []:
+                    if "headline" not in tool_call:
+                        tool_call["headline"] = ""
+
+                    if "language" in tool_call and tool_call["language"] == "shell":
+                        tool_call["language"] = "python"
+
+                    if "type" not in tool_call:
+                        tool_call["type"] = "function"
+
+    data["schema_version"] = CHAT_SCHEMA_VERSION
+
+    return data
+
+
+async def load_chat_history(id: str, project_path: Path | None = None) -> Chat:
+    from aiconsole.core.chat.save_chat_history import chat_writer
+
+    # The file must reflect saves of the chat which are still being written
+    await chat_writer().flush(id)
+
+    return await run_in_storage_thread(_load_chat_history, id, project_path)
+
+
+def _load_chat_history(id: str, project_path: Path | None = None) -> Chat:
+    chat = chat_storage_backend().load(id, project_path)
+
+    if chat is None:
+        chat = Chat(
             id=id,
             name="",
             title_edited=False,
             last_modified=datetime.now(),
             message_groups=[],
         )
+
+    # Mutations applied after the last snapshot, e.g. when the process died during generation
+    replay_chat_journal(chat, project_path)
+
+    return chat
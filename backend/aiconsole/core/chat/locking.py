@@ -5,14 +5,11 @@ from typing import Callable, Coroutine
 
 from fastapi import HTTPException
 
-from aiconsole.api.websockets.connection_manager import (
-    AICConnection,
-    connection_manager,
-)
-from aiconsole.api.websockets.server_messages import (
-    NotifyAboutChatMutationServerMessage,
-)
+from aiconsole.api.websockets.connection_manager import AICConnection
+from aiconsole.api.websockets.mutation_broadcaster import mutation_broadcaster
 from aiconsole.core.chat.apply_mutation import apply_mutation
+from aiconsole.core.chat.chat_cache import chat_cache
+from aiconsole.core.chat.chat_checkpointer import chat_checkpointer
 from aiconsole.core.chat.chat_mutations import (
     ChatMutation,
     LockAcquiredMutation,
@@ -20,7 +17,10 @@ from aiconsole.core.chat.chat_mutations import (
 )
 from aiconsole.core.chat.chat_mutator import ChatMutator
 from aiconsole.core.chat.load_chat_history import load_chat_history
-from aiconsole.core.chat.save_chat_history import save_chat_history
+from aiconsole.core.chat.save_chat_history import chat_writer
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    chat_storage_backend,
+)
 from aiconsole.core.chat.types import Chat
 
 chats: dict[str, Chat] = {}
@@ -45,7 +45,7 @@ async def acquire_lock(chat_id: str, request_id: str, skip_mutating_clients: boo
         await wait_for_lock(chat_id)
 
     if chat_id not in chats:
-        chat_history = await load_chat_history(chat_id)
+        chat_history = await _load_chat(chat_id)
         chat_history.lock_id = None
         chats[chat_id] = chat_history
 
@@ -53,19 +53,26 @@ async def acquire_lock(chat_id: str, request_id: str, skip_mutating_clients: boo
     lock_events[chat_id].clear()
 
     if not skip_mutating_clients:
-        await connection_manager().send_to_chat(
-            NotifyAboutChatMutationServerMessage(
-                request_id=request_id, chat_id=chat_id, mutation=LockAcquiredMutation(lock_id=request_id)
-            ),
-            chat_id,
+        await mutation_broadcaster().broadcast(
+            request_id=request_id, chat_id=chat_id, mutation=LockAcquiredMutation(lock_id=request_id)
         )
     return chats[chat_id]
 
 
+async def _load_chat(chat_id: str) -> Chat:
+    chat = chat_cache().get(chat_id)
+
+    if chat is None:
+        chat = await load_chat_history(chat_id)
+        chat_cache().put(chat)
+
+    return chat
+
+
 async def _read_chat_outside_of_lock(chat_id: str):
     _log.debug(f"Reading chat{chat_id}")
     if chat_id not in chats:
-        return await load_chat_history(chat_id)
+        return await _load_chat(chat_id)
 
     return chats[chat_id]
 
@@ -73,16 +80,16 @@ async def _read_chat_outside_of_lock(chat_id: str):
 async def release_lock(chat_id: str, request_id: str) -> None:
     if chat_id in chats and chats[chat_id].lock_id == request_id:
         chats[chat_id].lock_id = None
-        save_chat_history(chats[chat_id], scope="message_groups")
+        chat_checkpointer().forget(chat_id)
+        chat_writer().schedule(chats[chat_id], scope="message_groups")
+        chat_cache().put(chats[chat_id])
         del chats[chat_id]
         lock_events[chat_id].set()
 
-        await connection_manager().send_to_chat(
-            NotifyAboutChatMutationServerMessage(
-                request_id=request_id, chat_id=chat_id, mutation=LockReleasedMutation(lock_id=request_id)
-            ),
-            chat_id,
+        await mutation_broadcaster().broadcast(
+            request_id=request_id, chat_id=chat_id, mutation=LockReleasedMutation(lock_id=request_id)
         )
+        await mutation_broadcaster().flush(chat_id)
 
 
 class DefaultChatMutator(ChatMutator):
@@ -102,42 +109,108 @@ class DefaultChatMutator(ChatMutator):
             )
 
         apply_mutation(self.chat, mutation)
+        chat_storage_backend().record_mutation(self.chat, mutation)
+        chat_checkpointer().mark_dirty(self.chat, mutation)
 
-        await connection_manager().send_to_chat(
-            NotifyAboutChatMutationServerMessage(
-                request_id=self.request_id,
-                chat_id=self.chat_id,
-                mutation=mutation,
-            ),
-            self.chat_id,
+        await mutation_broadcaster().broadcast(
+            request_id=self.request_id,
+            chat_id=self.chat_id,
+            mutation=mutation,
             except_connection=self.connection,
         )
 
 
-# This lock is responsible for sequencing the mutations and reads on a given chat
-_waiting_mutations: dict[str, list[Coroutine]] = defaultdict(lambda: [])
-_running_mutations: dict[str, asyncio.Task | None] = defaultdict(lambda: None)
-
-
-def _check_mutation_queue(chat_id: str):
-    if _running_mutations[chat_id] is not None:
-        return
+class _ChatMutationActor:
+    """
+    Applies the mutations and reads of a single chat one by one, in the order they were submitted.
 
-    if not _waiting_mutations[chat_id]:
-        return
+    The worker task is started on the first submission and exits after the chat
+    has been idle for mutation_actor_idle_timeout seconds.
+    """
 
-    h = _waiting_mutations[chat_id].pop()
-    task = asyncio.create_task(h)
-    _running_mutations[chat_id] = task
-
-    def clear_task(future):
-        if _running_mutations[chat_id] == future:
-            _running_mutations[chat_id] = None
-            _check_mutation_queue(chat_id)
-        else:
-            _log.error(f"Task {chat_id} already cleared")
+    def __init__(self, chat_id: str):
+        self.chat_id = chat_id
+        self._queue: asyncio.Queue[tuple[Callable[[], Coroutine], asyncio.Future]] = asyncio.Queue()
+        self._worker: asyncio.Task | None = None
+        self.max_queue_depth = 0
 
-    task.add_done_callback(clear_task)
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, f: Callable[[], Coroutine]) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((f, future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+
+        return future
+
+    async def _run(self):
+        try:
+            while True:
+                try:
+                    f, future = await asyncio.wait_for(self._queue.get(), timeout=mutation_actor_idle_timeout)
+                except asyncio.TimeoutError:
+                    # No await between the timeout and the removal, so nothing can be submitted in between
+                    if self._queue.empty():
+                        if _mutation_actors.get(self.chat_id) is self:
+                            del _mutation_actors[self.chat_id]
+                        return
+                    continue
+
+                # Caller is no longer interested (e.g. the chat was stopped), skip the work
+                if future.cancelled():
+                    continue
+
+                try:
+                    result = await f()
+                except asyncio.CancelledError:
+                    future.cancel()
+                    # Only the cancellation of the worker itself stops it, not f cancelling its own work
+                    if asyncio.current_task().cancelling():  # type: ignore
+                        raise
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                else:
+                    if not future.done():
+                        future.set_result(result)
+        except asyncio.CancelledError:
+            # Nothing would run the remaining work until the next submission
+            while not self._queue.empty():
+                _, future = self._queue.get_nowait()
+                future.cancel()
+            raise
+
+
+_mutation_actors: dict[str, _ChatMutationActor] = {}
+
+mutation_actor_idle_timeout = 5  # Time in seconds after which an idle chat actor is shut down
+
+
+def _get_mutation_actor(chat_id: str) -> _ChatMutationActor:
+    if chat_id not in _mutation_actors:
+        _mutation_actors[chat_id] = _ChatMutationActor(chat_id)
+
+    return _mutation_actors[chat_id]
+
+
+def get_mutation_queue_depths() -> dict[str, dict[str, int]]:
+    """
+    Number of mutations and reads waiting to be applied now and at most so far, per chat with a running actor.
+    """
+    return {
+        chat_id: {"depth": actor.queue_depth, "max_depth": actor.max_queue_depth}
+        for chat_id, actor in _mutation_actors.items()
+    }
+
+
+def _log_exception(future: asyncio.Future):
+    if not future.cancelled() and future.exception():
+        _log.exception(future.exception())
 
 
 class SequentialChatMutator(ChatMutator):
@@ -153,36 +226,27 @@ class SequentialChatMutator(ChatMutator):
         async def h():
             await self.mutator.mutate(mutation)
 
-        _waiting_mutations[self.mutator.chat_id].append(h())
-        _check_mutation_queue(self.mutator.chat_id)
-
-        await self.wait_for_all_mutations()
+        await _get_mutation_actor(self.mutator.chat_id).submit(h)
 
     async def wait_for_all_mutations(self):
-        chat_id = self.mutator.chat_id
-        while _waiting_mutations[chat_id] or _running_mutations[chat_id] is not None:
-            running_mutation = _running_mutations[chat_id]
-            if running_mutation:
-                await running_mutation
-            else:
-                await asyncio.sleep(0)
-
-    async def in_sequence(self, f: Callable[[], Coroutine]):
-        _waiting_mutations[self.mutator.chat_id].append(f())
-        _check_mutation_queue(self.mutator.chat_id)
+        """
+        Waits until everything submitted to this chat so far has been applied.
+        """
 
-    async def read(self) -> Chat:
-        while True:
-            running_mutation = _running_mutations[self.mutator.chat_id]
-
-            if running_mutation is None:
-                break
+        async def barrier():
+            pass
 
-            await running_mutation
+        await _get_mutation_actor(self.mutator.chat_id).submit(barrier)
 
-            if running_mutation.exception():
-                _log.exception(running_mutation.exception())
+    async def in_sequence(self, f: Callable[[], Coroutine]) -> asyncio.Future:
+        """
+        Schedules f after all previously submitted work, does not wait for it to run.
+        """
+        future = _get_mutation_actor(self.mutator.chat_id).submit(f)
+        future.add_done_callback(_log_exception)
+        return future
 
-            await asyncio.sleep(0)
+    async def read(self) -> Chat:
+        await self.wait_for_all_mutations()
 
         return await _read_chat_outside_of_lock(chat_id=self.mutator.chat_id)
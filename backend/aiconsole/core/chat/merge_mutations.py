@@ -0,0 +1,52 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from aiconsole.core.chat.chat_mutations import (
+    AppendToAnalysisMessageGroupMutation,
+    AppendToCodeToolCallMutation,
+    AppendToContentMessageMutation,
+    AppendToHeadlineToolCallMutation,
+    AppendToOutputToolCallMutation,
+    AppendToTaskMessageGroupMutation,
+    ChatMutation,
+)
+
+# Mutation type -> (target id field, delta field)
+COALESCABLE_MUTATIONS: dict[type, tuple[str, str]] = {
+    AppendToContentMessageMutation: ("message_id", "content_delta"),
+    AppendToCodeToolCallMutation: ("tool_call_id", "code_delta"),
+    AppendToHeadlineToolCallMutation: ("tool_call_id", "headline_delta"),
+    AppendToOutputToolCallMutation: ("tool_call_id", "output_delta"),
+    AppendToTaskMessageGroupMutation: ("message_group_id", "task_delta"),
+    AppendToAnalysisMessageGroupMutation: ("message_group_id", "analysis_delta"),
+}
+
+
+def merge_mutations(first: ChatMutation, second: ChatMutation) -> ChatMutation | None:
+    """
+    Returns a single mutation with the effect of applying first and then second, or None if they can't be merged.
+    """
+    fields = COALESCABLE_MUTATIONS.get(type(second))
+
+    if fields is None or type(first) is not type(second):
+        return None
+
+    target_field, delta_field = fields
+
+    if getattr(first, target_field) != getattr(second, target_field):
+        return None
+
+    # Build a new object, the merged ones might be shared with the caller
+    return first.model_copy(update={delta_field: getattr(first, delta_field) + getattr(second, delta_field)})
@@ -0,0 +1,129 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Converts all chat files of a project to the current CHAT_SCHEMA_VERSION at once,
+so loading them afterwards takes the fast path.
+"""
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Literal
+
+from aiconsole.core.chat.load_chat_history import (
+    CHAT_SCHEMA_VERSION,
+    get_chat_name,
+    migrate_chat_data,
+)
+from aiconsole.core.chat.types import Chat
+from aiconsole.core.project.paths import get_history_directory
+
+_log = logging.getLogger(__name__)
+
+MigrationStatus = Literal["migrated", "current", "failed"]
+
+
+@dataclass
+class MigrationReport:
+    total: int = 0
+    migrated: int = 0
+    current: int = 0
+    failed: int = 0
+    bytes: int = 0
+    seconds: float = 0
+    failed_files: list[Path] = field(default_factory=list)
+
+    @property
+    def done(self) -> int:
+        return self.migrated + self.current + self.failed
+
+    def __str__(self) -> str:
+        seconds = max(self.seconds, 1e-9)
+        return (
+            f"{self.done}/{self.total} chats ({self.migrated} migrated, {self.current} already current, "
+            f"{self.failed} failed) in {self.seconds:.2f}s, "
+            f"{self.done / seconds:.0f} chats/s, {self.bytes / seconds / 1024 / 1024:.1f} MB/s"
+        )
+
+
+def migrate_chat_file(file_path: Path) -> tuple[MigrationStatus, int]:
+    """
+    Migrates a single chat file in place, keeping its modification time. Returns the status and the size of the file.
+    """
+    try:
+        stat = os.stat(file_path)
+
+        with open(file_path, "r", encoding="utf8", errors="replace") as f:
+            data = json.load(f)
+
+        if data.get("schema_version") == CHAT_SCHEMA_VERSION:
+            return "current", stat.st_size
+
+        migrate_chat_data(data)
+
+        # Make sure the result loads before replacing the original
+        Chat(
+            **{
+                **{k: v for k, v in data.items() if k not in ("id", "last_modified", "schema_version")},
+                "id": file_path.stem,
+                "name": get_chat_name(data),
+                "last_modified": datetime.fromtimestamp(stat.st_mtime),
+            }
+        )
+
+        temp_path = file_path.with_suffix(".json.tmp")
+        with open(temp_path, "w", encoding="utf8", errors="replace") as f:
+            json.dump(data, f)
+        os.replace(temp_path, file_path)
+
+        # Chats are listed by modification time, migration should not reorder them
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        return "migrated", stat.st_size
+    except Exception as e:
+        _log.exception(f"Failed to migrate chat file {file_path}: {e}")
+        return "failed", 0
+
+
+def migrate_chats(
+    project_path: Path,
+    workers: int | None = None,
+    on_progress: Callable[[MigrationReport], None] | None = None,
+) -> MigrationReport:
+    history_directory = get_history_directory(project_path)
+    file_paths = sorted(history_directory.glob("*.json")) if history_directory.is_dir() else []
+
+    report = MigrationReport(total=len(file_paths))
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for file_path, (status, size) in zip(file_paths, executor.map(migrate_chat_file, file_paths, chunksize=16)):
+            setattr(report, status, getattr(report, status) + 1)
+            if status == "failed":
+                report.failed_files.append(file_path)
+            report.bytes += size
+            report.seconds = time.perf_counter() - start
+
+            if on_progress is not None:
+                on_progress(report)
+
+    report.seconds = time.perf_counter() - start
+
+    return report
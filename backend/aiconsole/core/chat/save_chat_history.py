@@ -13,45 +13,151 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+"""
+Saving a chat takes a snapshot of it on the event loop, the snapshot is then written by ChatWriter
+in a storage thread. Repeated saves of a chat waiting to be written are coalesced into one write.
+"""
+import asyncio
+import logging
+from functools import lru_cache
 
-import json
-import os
-
+from aiconsole.core.chat.chat_cache import chat_cache
+from aiconsole.core.chat.chat_journal import truncate_chat_journal
+from aiconsole.core.chat.chat_search_index import chat_search_index
+from aiconsole.core.chat.chat_storage import (
+    run_in_storage_thread,
+    submit_to_storage_thread,
+)
+from aiconsole.core.chat.load_chat_history import CHAT_SCHEMA_VERSION
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    ChatSnapshot,
+    WriteResult,
+    chat_storage_backend,
+)
 from aiconsole.core.chat.types import Chat
 from aiconsole.core.project.paths import get_history_directory
 
+_log = logging.getLogger(__name__)
+
+
+def take_chat_snapshot(chat: Chat, scope: str = "default") -> ChatSnapshot:
+    chat_cache().invalidate(chat.id)
+
+    # lock_id is runtime state, snapshots can be taken while the chat is locked
+    content = chat.model_dump(exclude={"id", "last_modified", "lock_id"})
+    content["journal_seq"] = chat.journal_seq
+    content["schema_version"] = CHAT_SCHEMA_VERSION
+
+    return ChatSnapshot(
+        chat_id=chat.id,
+        history_directory=get_history_directory(),
+        content=content,
+        scopes={scope},
+        journal_seq=chat.journal_seq,
+        is_empty=len(chat.message_groups) == 0 and chat.chat_options.is_default(),
+    )
+
+
+def write_chat_snapshot(snapshot: ChatSnapshot) -> tuple[WriteResult, dict | None]:
+    """
+    Only does I/O, safe to run in a storage thread. Returns the content written, if any.
+    """
+    result, content = chat_storage_backend().write(snapshot)
+
+    try:
+        if result == "written" and content is not None:
+            chat_search_index().index_chat(snapshot.history_directory, snapshot.chat_id, content)
+        elif result == "removed":
+            chat_search_index().remove(snapshot.history_directory, snapshot.chat_id)
+    except Exception as e:
+        # The chat is saved, it will be reindexed by the next reconcile
+        _log.exception(e)
+        _log.error(f"Failed to index chat {snapshot.chat_id} for search: {e}")
+
+    return result, content
+
+
+def _after_write(chat: Chat, snapshot: ChatSnapshot, result: WriteResult, content: dict | None):
+    # The chat might have been mutated while the snapshot was being written
+    up_to_date = chat.journal_seq == snapshot.journal_seq
+
+    chat_storage_backend().after_write(chat.id, result, content)
+
+    # The snapshot now contains the journaled mutations up to its seq
+    if result == "removed" or "message_groups" in snapshot.scopes:
+        if up_to_date:
+            truncate_chat_journal(chat.id)
+        else:
+            # Mutations applied while it was written, like a streamed response, stay journaled
+            submit_to_storage_thread(truncate_chat_journal, chat.id, up_to_seq=snapshot.journal_seq)
+
+    if up_to_date:
+        chat_cache().restamp(chat)
+
 
 def save_chat_history(chat: Chat, scope: str = "default"):
-    history_directory = get_history_directory()
-    file_path = history_directory / f"{chat.id}.json"
-
-    new_content = chat.model_dump(exclude={"id", "last_modified"})
-
-    if len(chat.message_groups) == 0 and chat.chat_options.is_default():
-        if os.path.exists(file_path):
-            os.remove(file_path)
-    else:
-        os.makedirs(history_directory, exist_ok=True)
-
-        # check if file exists and contents are the same
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf8", errors="replace") as f:
-                old_content = json.load(f)
-                if scope == "chat_options" and (
-                    "chat_options" not in old_content or old_content["chat_options"] != new_content["chat_options"]
-                ):
-                    old_content["chat_options"] = new_content["chat_options"]
-                    new_content = old_content
-                elif scope == "message_groups" and old_content["message_groups"] != new_content["message_groups"]:
-                    old_content["message_groups"] = new_content["message_groups"]
-                    new_content = old_content
-                elif scope == "name" and ("name" not in old_content or old_content["name"] != new_content["name"]):
-                    old_content["name"] = new_content["name"]
-                    old_content["title_edited"] = True
-                    new_content = old_content
-                else:
-                    return  # contents are the same, no need to write to file
-
-        # write new content to file
-        with open(file_path, "w", encoding="utf8", errors="replace") as f:
-            json.dump(new_content, f)
+    """
+    Saves the chat right away, blocking the caller. In async code use chat_writer() instead.
+    """
+    snapshot = take_chat_snapshot(chat, scope)
+    _after_write(chat, snapshot, *write_chat_snapshot(snapshot))
+
+
+class ChatWriter:
+    def __init__(self):
+        self._pending: dict[str, tuple[Chat, ChatSnapshot]] = {}
+        self._writing: str | None = None
+        self._task: asyncio.Task | None = None
+
+    def schedule(self, chat: Chat, scope: str = "default") -> None:
+        """
+        Takes a snapshot of the chat now and writes it in the background.
+        """
+        snapshot = take_chat_snapshot(chat, scope)
+
+        pending = self._pending.get(chat.id)
+        if pending is not None:
+            # The new snapshot is a superset of the pending one
+            snapshot.scopes |= pending[1].scopes
+
+        self._pending[chat.id] = (chat, snapshot)
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._write_pending())
+
+    async def save(self, chat: Chat, scope: str = "default") -> None:
+        """
+        Schedules the save and waits until the chat is on disk.
+        """
+        self.schedule(chat, scope)
+        await self.flush(chat.id)
+
+    async def flush(self, chat_id: str | None = None) -> None:
+        """
+        Waits until all pending saves, or those of the given chat, are on disk.
+        """
+        while self._task is not None and (chat_id is None or chat_id in self._pending or chat_id == self._writing):
+            await asyncio.shield(self._task)
+
+    async def _write_pending(self):
+        try:
+            while self._pending:
+                chat_id = next(iter(self._pending))
+                chat, snapshot = self._pending.pop(chat_id)
+                self._writing = chat_id
+
+                try:
+                    result, content = await run_in_storage_thread(write_chat_snapshot, snapshot)
+                    _after_write(chat, snapshot, result, content)
+                except Exception as e:
+                    _log.exception(e)
+                    _log.error(f"Failed to save chat {chat_id}: {e}")
+                finally:
+                    self._writing = None
+        finally:
+            self._task = None
+
+
+@lru_cache
+def chat_writer() -> ChatWriter:
+    return ChatWriter()
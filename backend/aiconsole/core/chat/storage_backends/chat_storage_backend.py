@@ -0,0 +1,113 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Chats are persisted by a storage backend, selected with CHAT_STORAGE_BACKEND.
+
+Backends are used by load_chat_history, save_chat_history and the chat endpoints, nothing else
+should touch the stored chats directly. load and write are blocking and run in a storage thread,
+the rest of the methods are called on the event loop unless noted otherwise.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Literal, Protocol
+
+from aiconsole.consts import CHAT_STORAGE_BACKEND
+from aiconsole.core.chat.chat_mutations import ChatMutation
+from aiconsole.core.chat.types import Chat, ChatHeadline
+
+WriteResult = Literal["written", "removed", "unchanged"]
+
+
+@dataclass
+class ChatSnapshot:
+    chat_id: str
+    history_directory: Path
+    content: dict
+    # Parts of an existing chat to update, "default" only creates the chat if it does not exist
+    scopes: set[str]
+    journal_seq: int
+    is_empty: bool
+
+
+class ChatStorageBackend(Protocol):
+    def load(self, chat_id: str, project_path: Path | None = None) -> Chat | None:
+        ...
+
+    def write(self, snapshot: ChatSnapshot) -> tuple[WriteResult, dict | None]:
+        """
+        Returns the content of the chat as written, if anything was written.
+        """
+        ...
+
+    def after_write(self, chat_id: str, result: WriteResult, content: dict | None) -> None:
+        ...
+
+    def put(self, history_directory: Path, chat_id: str, content: dict, last_modified: datetime) -> None:
+        """
+        Stores the chat as a whole, replacing any stored chat with the same id, used by imports. Blocking.
+        """
+        ...
+
+    def record_mutation(self, chat: Chat, mutation: ChatMutation) -> None:
+        """
+        Persists a mutation already applied to a locked chat, before the next snapshot of it is written.
+        """
+        ...
+
+    def delete(self, chat_id: str) -> bool:
+        ...
+
+    def list_chat_ids(self, project_path: Path | None = None) -> list[str]:
+        """
+        Most recently modified first.
+        """
+        ...
+
+    async def get_headlines(
+        self, offset: int = 0, limit: int | None = None, since: datetime | None = None
+    ) -> list[ChatHeadline]:
+        """
+        Most recently modified first.
+        """
+        ...
+
+    async def reconcile(self) -> None:
+        """
+        Called when a project is opened, the chats might have been changed while it was closed.
+        """
+        ...
+
+    def get_location(self, chat_id: str) -> Path:
+        """
+        File in which the chat is stored.
+        """
+        ...
+
+
+@lru_cache
+def chat_storage_backend() -> ChatStorageBackend:
+    if CHAT_STORAGE_BACKEND == "sqlite":
+        from aiconsole.core.chat.storage_backends.sqlite_chat_storage import (
+            SQLiteChatStorage,
+        )
+
+        return SQLiteChatStorage()
+
+    from aiconsole.core.chat.storage_backends.json_chat_storage import JSONChatStorage
+
+    return JSONChatStorage()
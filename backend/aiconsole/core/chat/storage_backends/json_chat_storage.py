@@ -0,0 +1,253 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Default backend, every chat is a <id>.json file in the chats directory, with the mutations applied
+since the file was written kept in a journal next to it, see chat_journal.
+
+Digests of the fields of every chat file written are kept in memory. A save compares the digests
+of the fields in its scopes, so unchanged saves do not touch the file, and changed saves replace
+it without reading it first. Only files changed outside of this process, or snapshots disagreeing
+with the file outside of their scopes, are read and merged.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+from send2trash import send2trash
+
+from aiconsole.core.chat.chat_headline_index import chat_headline_index
+from aiconsole.core.chat.chat_journal import append_to_chat_journal
+from aiconsole.core.chat.chat_mutations import ChatMutation
+from aiconsole.core.chat.chat_storage import (
+    dump_json,
+    join_json_fields,
+    load_json,
+    write_atomically,
+)
+from aiconsole.core.chat.load_chat_history import (
+    CHAT_SCHEMA_VERSION,
+    get_chat_name,
+    migrate_chat_data,
+)
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    ChatSnapshot,
+    WriteResult,
+)
+from aiconsole.core.chat.types import Chat, ChatHeadline
+from aiconsole.core.project.paths import get_history_directory
+
+# Fields of the chat file written by each save scope, see save_chat_history
+_SCOPE_FIELDS: dict[str, tuple[str, ...]] = {
+    "chat_options": ("chat_options",),
+    "message_groups": ("message_groups", "journal_seq", "schema_version"),
+    "name": ("name", "title_edited"),
+}
+
+
+@dataclass
+class _PersistedChat:
+    # mtime_ns and size of the file when it was written
+    stamp: tuple[int, int]
+    # Field name -> digest of its encoded value
+    digests: dict[str, bytes]
+
+
+def _digest(content: bytes) -> bytes:
+    return hashlib.blake2b(content, digest_size=16).digest()
+
+
+def _stamp(file_path: Path) -> tuple[int, int] | None:
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class JSONChatStorage:
+    def __init__(self):
+        # Digests of the chat files last written or read for writing, so saves need not read the files they replace
+        self._persisted: dict[Path, _PersistedChat] = {}
+
+    def load(self, chat_id: str, project_path: Path | None = None) -> Chat | None:
+        file_path = get_history_directory(project_path) / f"{chat_id}.json"
+
+        if not file_path.exists():
+            return None
+
+        with open(file_path, "rb") as f:
+            data = load_json(f.read())
+
+        # Files written by the current version need no migration
+        if data.get("schema_version") != CHAT_SCHEMA_VERSION:
+            migrate_chat_data(data)
+
+        del data["schema_version"]
+
+        data["name"] = get_chat_name(data)
+
+        if "title_edited" not in data or not data["title_edited"]:
+            data["title_edited"] = False
+
+        if "id" in data:
+            del data["id"]
+
+        if "last_modified" in data:
+            del data["last_modified"]
+
+        return Chat(
+            id=chat_id,
+            last_modified=datetime.fromtimestamp(os.path.getmtime(file_path)),
+            **data,
+        )
+
+    def write(self, snapshot: ChatSnapshot) -> tuple[WriteResult, dict | None]:
+        file_path = snapshot.history_directory / f"{snapshot.chat_id}.json"
+
+        if snapshot.is_empty:
+            self._persisted.pop(file_path, None)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            return "removed", None
+
+        new_content = snapshot.content
+        if "name" in snapshot.scopes:
+            new_content = {**new_content, "title_edited": True}
+
+        fields = {key: dump_json(value) for key, value in new_content.items()}
+        digests = {key: _digest(value) for key, value in fields.items()}
+
+        persisted = self._persisted.get(file_path)
+        stamp = _stamp(file_path)
+
+        if stamp is None:
+            pass  # new chat, written as a whole
+        elif persisted is not None and persisted.stamp == stamp:
+            scoped = {key for scope in snapshot.scopes for key in _SCOPE_FIELDS.get(scope, ())}
+
+            if all(digests[key] == persisted.digests.get(key) for key in scoped):
+                return "unchanged", None  # contents are the same, no need to write to file
+
+            # The snapshot can replace the file as a whole only if it agrees with the file outside of its scopes
+            if any(digests[key] != persisted.digests.get(key) for key in digests.keys() - scoped):
+                return self._merge_into_file(file_path, snapshot, new_content)
+        else:
+            # Not written by this process yet, or changed outside of it
+            return self._merge_into_file(file_path, snapshot, new_content)
+
+        os.makedirs(file_path.parent, exist_ok=True)
+        write_atomically(file_path, join_json_fields(fields))
+        self._remember(file_path, digests)
+
+        return "written", new_content
+
+    def _merge_into_file(
+        self, file_path: Path, snapshot: ChatSnapshot, new_content: dict
+    ) -> tuple[WriteResult, dict | None]:
+        with open(file_path, "rb") as f:
+            old_content = load_json(f.read())
+
+        changed = False
+
+        if "chat_options" in snapshot.scopes and (
+            "chat_options" not in old_content or old_content["chat_options"] != new_content["chat_options"]
+        ):
+            old_content["chat_options"] = new_content["chat_options"]
+            changed = True
+
+        if "message_groups" in snapshot.scopes and (
+            old_content.get("message_groups") != new_content["message_groups"]
+            or old_content.get("journal_seq", 0) != new_content["journal_seq"]
+        ):
+            old_content["message_groups"] = new_content["message_groups"]
+            old_content["journal_seq"] = new_content["journal_seq"]
+            # Everything else in the file is either current or handled by the load fast path
+            old_content["schema_version"] = new_content["schema_version"]
+            changed = True
+
+        if "name" in snapshot.scopes and ("name" not in old_content or old_content["name"] != new_content["name"]):
+            old_content["name"] = new_content["name"]
+            old_content["title_edited"] = True
+            changed = True
+
+        fields = {key: dump_json(value) for key, value in old_content.items()}
+
+        if changed:
+            write_atomically(file_path, join_json_fields(fields))
+
+        self._remember(file_path, {key: _digest(value) for key, value in fields.items()})
+
+        return ("written", old_content) if changed else ("unchanged", None)
+
+    def _remember(self, file_path: Path, digests: dict[str, bytes]) -> None:
+        stamp = _stamp(file_path)
+        if stamp is not None:
+            self._persisted[file_path] = _PersistedChat(stamp=stamp, digests=digests)
+
+    def after_write(self, chat_id: str, result: WriteResult, content: dict | None) -> None:
+        if result == "removed":
+            chat_headline_index().remove(chat_id)
+        elif result == "written" and content is not None:
+            chat_headline_index().update(chat_id, content)
+
+    def put(self, history_directory: Path, chat_id: str, content: dict, last_modified: datetime) -> None:
+        file_path = history_directory / f"{chat_id}.json"
+        fields = {key: dump_json(value) for key, value in content.items()}
+
+        os.makedirs(history_directory, exist_ok=True)
+        write_atomically(file_path, join_json_fields(fields))
+
+        # Chats are listed by modification time
+        os.utime(file_path, (last_modified.timestamp(), last_modified.timestamp()))
+        self._remember(file_path, {key: _digest(value) for key, value in fields.items()})
+
+    def record_mutation(self, chat: Chat, mutation: ChatMutation) -> None:
+        append_to_chat_journal(chat, mutation)
+
+    def delete(self, chat_id: str) -> bool:
+        file_path = self.get_location(chat_id)
+        if not file_path.exists():
+            return False
+
+        send2trash(file_path)
+        chat_headline_index().remove(chat_id)
+        return True
+
+    def list_chat_ids(self, project_path: Path | None = None) -> list[str]:
+        history_directory = get_history_directory(project_path)
+        if not history_directory.is_dir():
+            return []
+
+        with os.scandir(history_directory) as entries:
+            files = [entry for entry in entries if entry.is_file() and entry.name.endswith(".json")]
+
+        # Sort the files based on modification time (descending order)
+        files.sort(key=lambda entry: entry.stat().st_mtime_ns, reverse=True)
+
+        return [file.name.split(".")[0] for file in files]
+
+    async def get_headlines(
+        self, offset: int = 0, limit: int | None = None, since: datetime | None = None
+    ) -> list[ChatHeadline]:
+        return await chat_headline_index().get_headlines(offset=offset, limit=limit, since=since)
+
+    async def reconcile(self) -> None:
+        await chat_headline_index().reconcile()
+
+    def get_location(self, chat_id: str) -> Path:
+        return get_history_directory() / f"{chat_id}.json"
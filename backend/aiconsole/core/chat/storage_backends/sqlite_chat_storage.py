@@ -0,0 +1,870 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Keeps all chats of a project in a single SQLite database in the chats directory, enabled with CHAT_STORAGE_BACKEND=sqlite.
+
+Message groups, messages and tool calls are rows of their own tables. Instead of being journaled, every
+mutation of a locked chat updates just the rows it touches, and snapshots of chats whose rows are already
+up to date skip rewriting the message groups. Row updates are queued and written in batches by a storage thread,
+consecutive appends to the same field, like streamed tokens, coalesced into a single update. chats.journal_seq is the sequence number of the last mutation
+reflected in the rows, or -1 after a row update failed, in which case the next snapshot rewrites the chat.
+
+Like everywhere else, message groups are expected to change only through mutations.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator
+
+from aiconsole.core.chat.apply_mutation import MUTATION_HANDLERS
+from aiconsole.core.chat.chat_journal import replay_chat_journal
+from aiconsole.core.chat.chat_mutations import (
+    ChatMutation,
+    CreateMessageGroupMutation,
+    CreateMessageMutation,
+    CreateToolCallMutation,
+    DeleteMessageGroupMutation,
+    DeleteMessageMutation,
+    DeleteToolCallMutation,
+    SetIsAnalysisInProgressMutation,
+)
+from aiconsole.core.chat.chat_storage import (
+    run_in_storage_thread,
+    submit_to_storage_thread,
+)
+from aiconsole.core.chat.load_chat_history import get_chat_name
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    ChatSnapshot,
+    WriteResult,
+)
+from aiconsole.core.chat.storage_backends.json_chat_storage import JSONChatStorage
+from aiconsole.core.chat.types import Chat, ChatHeadline
+from aiconsole.core.project.paths import get_history_directory
+
+_log = logging.getLogger(__name__)
+
+DATABASE_FILE_NAME = "chats.sqlite3"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chats (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    headline TEXT NOT NULL,
+    title_edited INTEGER NOT NULL,
+    chat_options TEXT NOT NULL,
+    is_analysis_in_progress INTEGER NOT NULL,
+    journal_seq INTEGER NOT NULL,
+    last_modified REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chats_last_modified ON chats (last_modified);
+
+CREATE TABLE IF NOT EXISTS message_groups (
+    chat_id TEXT NOT NULL REFERENCES chats (id) ON DELETE CASCADE,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    actor_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    task TEXT NOT NULL,
+    analysis TEXT NOT NULL,
+    materials_ids TEXT NOT NULL,
+    PRIMARY KEY (chat_id, id)
+);
+
+CREATE TABLE IF NOT EXISTS messages (
+    chat_id TEXT NOT NULL,
+    message_group_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    timestamp TEXT NOT NULL,
+    content TEXT NOT NULL,
+    requested_format TEXT,
+    is_streaming INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, id),
+    FOREIGN KEY (chat_id, message_group_id) REFERENCES message_groups (chat_id, id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS messages_message_group ON messages (chat_id, message_group_id);
+
+CREATE TABLE IF NOT EXISTS tool_calls (
+    chat_id TEXT NOT NULL,
+    message_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    language TEXT,
+    code TEXT NOT NULL,
+    headline TEXT NOT NULL,
+    output TEXT,
+    is_streaming INTEGER NOT NULL,
+    is_executing INTEGER NOT NULL,
+    PRIMARY KEY (chat_id, id),
+    FOREIGN KEY (chat_id, message_id) REFERENCES messages (chat_id, id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS tool_calls_message ON tool_calls (chat_id, message_id);
+"""
+
+_INSERT_MESSAGE_GROUP = """
+INSERT INTO message_groups (chat_id, id, position, actor_id, role, task, analysis, materials_ids)
+VALUES (:chat_id, :id, :position, :actor_id, :role, :task, :analysis, :materials_ids)
+"""
+_UPDATE_MESSAGE_GROUP = """
+UPDATE message_groups SET actor_id = :actor_id, role = :role, task = :task, analysis = :analysis,
+materials_ids = :materials_ids WHERE chat_id = :chat_id AND id = :id
+"""
+_INSERT_MESSAGE = """
+INSERT INTO messages (chat_id, message_group_id, id, position, timestamp, content, requested_format, is_streaming)
+VALUES (:chat_id, :message_group_id, :id, :position, :timestamp, :content, :requested_format, :is_streaming)
+"""
+_UPDATE_MESSAGE = """
+UPDATE messages SET timestamp = :timestamp, content = :content, requested_format = :requested_format,
+is_streaming = :is_streaming WHERE chat_id = :chat_id AND id = :id
+"""
+_INSERT_TOOL_CALL = """
+INSERT INTO tool_calls (chat_id, message_id, id, position, language, code, headline, output, is_streaming, is_executing)
+VALUES (:chat_id, :message_id, :id, :position, :language, :code, :headline, :output, :is_streaming, :is_executing)
+"""
+_UPDATE_TOOL_CALL = """
+UPDATE tool_calls SET language = :language, code = :code, headline = :headline, output = :output,
+is_streaming = :is_streaming, is_executing = :is_executing WHERE chat_id = :chat_id AND id = :id
+"""
+
+# Append* mutations are applied in place, without reading the text they append to
+_APPEND_STATEMENTS: dict[str, tuple[str, str, str]] = {
+    "AppendToTaskMessageGroupMutation": (
+        "UPDATE message_groups SET task = task || ? WHERE chat_id = ? AND id = ?",
+        "task_delta",
+        "message_group_id",
+    ),
+    "AppendToAnalysisMessageGroupMutation": (
+        "UPDATE message_groups SET analysis = analysis || ? WHERE chat_id = ? AND id = ?",
+        "analysis_delta",
+        "message_group_id",
+    ),
+    "AppendToContentMessageMutation": (
+        "UPDATE messages SET content = content || ?, is_streaming = 1 WHERE chat_id = ? AND id = ?",
+        "content_delta",
+        "message_id",
+    ),
+    "AppendToHeadlineToolCallMutation": (
+        "UPDATE tool_calls SET headline = headline || ? WHERE chat_id = ? AND id = ?",
+        "headline_delta",
+        "tool_call_id",
+    ),
+    "AppendToCodeToolCallMutation": (
+        "UPDATE tool_calls SET code = code || ? WHERE chat_id = ? AND id = ?",
+        "code_delta",
+        "tool_call_id",
+    ),
+    "AppendToOutputToolCallMutation": (
+        "UPDATE tool_calls SET output = COALESCE(output, '') || ? WHERE chat_id = ? AND id = ?",
+        "output_delta",
+        "tool_call_id",
+    ),
+}
+
+
+class _RowsOutOfSync(Exception):
+    pass
+
+
+def _message_group_row(chat_id: str, message_group: dict, position: int | None = None) -> dict:
+    return {
+        "chat_id": chat_id,
+        "id": message_group["id"],
+        "position": position,
+        "actor_id": json.dumps(message_group["actor_id"]),
+        "role": message_group["role"],
+        "task": message_group["task"],
+        "analysis": message_group["analysis"],
+        "materials_ids": json.dumps(message_group["materials_ids"]),
+    }
+
+
+def _message_row(chat_id: str, message_group_id: str, message: dict, position: int | None = None) -> dict:
+    requested_format = message.get("requested_format")
+    return {
+        "chat_id": chat_id,
+        "message_group_id": message_group_id,
+        "id": message["id"],
+        "position": position,
+        "timestamp": message["timestamp"],
+        "content": message["content"],
+        "requested_format": json.dumps(requested_format) if requested_format is not None else None,
+        "is_streaming": message.get("is_streaming", False),
+    }
+
+
+def _tool_call_row(chat_id: str, message_id: str, tool_call: dict, position: int | None = None) -> dict:
+    return {
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "id": tool_call["id"],
+        "position": position,
+        "language": tool_call.get("language"),
+        "code": tool_call["code"],
+        "headline": tool_call["headline"],
+        "output": tool_call.get("output"),
+        "is_streaming": tool_call.get("is_streaming", False),
+        "is_executing": tool_call.get("is_executing", False),
+    }
+
+
+def _execute_one(db: sqlite3.Connection, sql: str, parameters: dict | tuple) -> None:
+    if db.execute(sql, parameters).rowcount != 1:
+        raise _RowsOutOfSync(sql)
+
+
+def _next_position(db: sqlite3.Connection, table: str, chat_id: str) -> int:
+    return db.execute(f"SELECT COALESCE(MAX(position), -1) + 1 FROM {table} WHERE chat_id = ?", (chat_id,)).fetchone()[
+        0
+    ]
+
+
+def _insert_message_groups(db: sqlite3.Connection, chat_id: str, message_groups: list[dict]) -> None:
+    for group_position, message_group in enumerate(message_groups):
+        db.execute(_INSERT_MESSAGE_GROUP, _message_group_row(chat_id, message_group, group_position))
+
+        for message_position, message in enumerate(message_group["messages"]):
+            db.execute(_INSERT_MESSAGE, _message_row(chat_id, message_group["id"], message, message_position))
+
+            for tool_call_position, tool_call in enumerate(message["tool_calls"]):
+                db.execute(_INSERT_TOOL_CALL, _tool_call_row(chat_id, message["id"], tool_call, tool_call_position))
+
+
+def _insert_chat(db: sqlite3.Connection, chat_id: str, content: dict, journal_seq: int, last_modified: float) -> None:
+    db.execute(
+        """
+        INSERT INTO chats (id, name, headline, title_edited, chat_options, is_analysis_in_progress, journal_seq,
+        last_modified) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            chat_id,
+            content["name"],
+            get_chat_name(content),
+            content.get("title_edited", False),
+            json.dumps(content["chat_options"]),
+            content.get("is_analysis_in_progress", False),
+            journal_seq,
+            last_modified,
+        ),
+    )
+    _insert_message_groups(db, chat_id, content["message_groups"])
+
+
+def _delete_if_empty(db: sqlite3.Connection, chat_id: str, message_id: str | None, message_group_id: str) -> None:
+    # Keep in sync with the cleanups of DeleteToolCallMutation and DeleteMessageMutation in apply_mutation
+    if message_id is not None:
+        db.execute(
+            """
+            DELETE FROM messages WHERE chat_id = ? AND id = ? AND content = ''
+            AND NOT EXISTS (SELECT 1 FROM tool_calls WHERE chat_id = ? AND message_id = ?)
+            """,
+            (chat_id, message_id, chat_id, message_id),
+        )
+
+    db.execute(
+        """
+        DELETE FROM message_groups WHERE chat_id = ? AND id = ?
+        AND NOT EXISTS (SELECT 1 FROM messages WHERE chat_id = ? AND message_group_id = ?)
+        """,
+        (chat_id, message_group_id, chat_id, message_group_id),
+    )
+
+
+@dataclass
+class _PendingMutation:
+    mutation: ChatMutation
+    # Row written by the mutation, read from the chat when it was recorded, see _capture_row
+    row: dict | None
+    # Deltas of this and of the following Append* mutations of the same field
+    deltas: list[str] = field(default_factory=list)
+    out_of_sync: str | None = None
+
+
+@dataclass
+class _PendingChat:
+    chat_id: str
+    history_directory: Path
+    # Chat without its message groups, inserted if its first mutations come before its first snapshot
+    header: dict
+    first_seq: int
+    last_seq: int
+    mutations: list[_PendingMutation] = field(default_factory=list)
+
+    def append(self, chat: Chat, mutation: ChatMutation) -> None:
+        self.last_seq = chat.journal_seq
+        mutation_type = mutation.__class__.__name__
+
+        if mutation_type in _APPEND_STATEMENTS:
+            _, delta_field, id_field = _APPEND_STATEMENTS[mutation_type]
+            last = self.mutations[-1] if self.mutations else None
+            if (
+                last is not None
+                and last.mutation.__class__ is mutation.__class__
+                and getattr(last.mutation, id_field) == getattr(mutation, id_field)
+            ):
+                last.deltas.append(getattr(mutation, delta_field))
+                return
+
+            self.mutations.append(_PendingMutation(mutation, None, deltas=[getattr(mutation, delta_field)]))
+            return
+
+        try:
+            self.mutations.append(_PendingMutation(mutation, _capture_row(chat, mutation)))
+        except _RowsOutOfSync as e:
+            self.mutations.append(_PendingMutation(mutation, None, out_of_sync=str(e)))
+
+
+def _capture_row(chat: Chat, mutation: ChatMutation) -> dict | None:
+    """
+    Reads what an already applied mutation writes, before later mutations change the chat.
+    """
+    chat_id = chat.id
+    mutation_type = mutation.__class__.__name__
+
+    if isinstance(mutation, CreateMessageGroupMutation):
+        message_group = chat.get_message_group(mutation.message_group_id)
+        if message_group is None:
+            raise _RowsOutOfSync(mutation_type)
+        return _message_group_row(chat_id, message_group.model_dump())
+
+    if isinstance(mutation, CreateMessageMutation):
+        location = chat.get_message_location(mutation.message_id)
+        if location is None:
+            raise _RowsOutOfSync(mutation_type)
+        message = location.message.model_dump(exclude={"tool_calls"})
+        return _message_row(chat_id, location.message_group.id, message)
+
+    if isinstance(mutation, CreateToolCallMutation):
+        tool_call_location = chat.get_tool_call_location(mutation.tool_call_id)
+        if tool_call_location is None:
+            raise _RowsOutOfSync(mutation_type)
+        tool_call = tool_call_location.tool_call.model_dump()
+        return _tool_call_row(chat_id, tool_call_location.message.id, tool_call)
+
+    if isinstance(
+        mutation,
+        (DeleteMessageGroupMutation, DeleteMessageMutation, DeleteToolCallMutation, SetIsAnalysisInProgressMutation),
+    ):
+        return None
+
+    # Remaining mutations set fields of a single tool call, message or message group, rewrite its row
+    if hasattr(mutation, "tool_call_id"):
+        tool_call_location = chat.get_tool_call_location(getattr(mutation, "tool_call_id"))
+        if tool_call_location is None:
+            raise _RowsOutOfSync(mutation_type)
+        return _tool_call_row(chat_id, tool_call_location.message.id, tool_call_location.tool_call.model_dump())
+
+    if hasattr(mutation, "message_id"):
+        location = chat.get_message_location(getattr(mutation, "message_id"))
+        if location is None:
+            raise _RowsOutOfSync(mutation_type)
+        message = location.message.model_dump(exclude={"tool_calls"})
+        return _message_row(chat_id, location.message_group.id, message)
+
+    if hasattr(mutation, "message_group_id"):
+        message_group = chat.get_message_group(getattr(mutation, "message_group_id"))
+        if message_group is None:
+            raise _RowsOutOfSync(mutation_type)
+        return _message_group_row(chat_id, message_group.model_dump())
+
+    raise _RowsOutOfSync(mutation_type)
+
+
+def _update_rows(db: sqlite3.Connection, chat_id: str, pending: _PendingMutation) -> None:
+    """
+    Brings the rows touched by an already applied mutation up to date.
+    """
+    mutation = pending.mutation
+    mutation_type = mutation.__class__.__name__
+
+    if pending.out_of_sync is not None:
+        raise _RowsOutOfSync(pending.out_of_sync)
+
+    # Captured for the mutations creating or rewriting a row
+    captured_row = pending.row or {}
+
+    if mutation_type in _APPEND_STATEMENTS:
+        sql, _, id_field = _APPEND_STATEMENTS[mutation_type]
+        _execute_one(db, sql, ("".join(pending.deltas), chat_id, getattr(mutation, id_field)))
+
+    elif isinstance(mutation, CreateMessageGroupMutation):
+        db.execute(_INSERT_MESSAGE_GROUP, {**captured_row, "position": _next_position(db, "message_groups", chat_id)})
+
+    elif isinstance(mutation, CreateMessageMutation):
+        db.execute(_INSERT_MESSAGE, {**captured_row, "position": _next_position(db, "messages", chat_id)})
+
+    elif isinstance(mutation, CreateToolCallMutation):
+        db.execute(_INSERT_TOOL_CALL, {**captured_row, "position": _next_position(db, "tool_calls", chat_id)})
+
+    elif isinstance(mutation, DeleteMessageGroupMutation):
+        _execute_one(
+            db, "DELETE FROM message_groups WHERE chat_id = ? AND id = ?", (chat_id, mutation.message_group_id)
+        )
+
+    elif isinstance(mutation, DeleteMessageMutation):
+        row = db.execute(
+            "SELECT message_group_id FROM messages WHERE chat_id = ? AND id = ?", (chat_id, mutation.message_id)
+        ).fetchone()
+        if row is None:
+            raise _RowsOutOfSync(mutation_type)
+        db.execute("DELETE FROM messages WHERE chat_id = ? AND id = ?", (chat_id, mutation.message_id))
+        _delete_if_empty(db, chat_id, None, row[0])
+
+    elif isinstance(mutation, DeleteToolCallMutation):
+        row = db.execute(
+            """
+            SELECT tool_calls.message_id, messages.message_group_id FROM tool_calls JOIN messages
+            ON messages.chat_id = tool_calls.chat_id AND messages.id = tool_calls.message_id
+            WHERE tool_calls.chat_id = ? AND tool_calls.id = ?
+            """,
+            (chat_id, mutation.tool_call_id),
+        ).fetchone()
+        if row is None:
+            raise _RowsOutOfSync(mutation_type)
+        db.execute("DELETE FROM tool_calls WHERE chat_id = ? AND id = ?", (chat_id, mutation.tool_call_id))
+        _delete_if_empty(db, chat_id, row[0], row[1])
+
+    elif isinstance(mutation, SetIsAnalysisInProgressMutation):
+        _execute_one(
+            db,
+            "UPDATE chats SET is_analysis_in_progress = ? WHERE id = ?",
+            (mutation.is_analysis_in_progress, chat_id),
+        )
+
+    elif hasattr(mutation, "tool_call_id"):
+        _execute_one(db, _UPDATE_TOOL_CALL, captured_row)
+
+    elif hasattr(mutation, "message_id"):
+        _execute_one(db, _UPDATE_MESSAGE, captured_row)
+
+    elif hasattr(mutation, "message_group_id"):
+        _execute_one(db, _UPDATE_MESSAGE_GROUP, captured_row)
+
+    else:
+        raise _RowsOutOfSync(mutation_type)
+
+
+class SQLiteChatStorage:
+    def __init__(self):
+        self._connections: dict[Path, sqlite3.Connection] = {}
+        # A connection is shared by the event loop and the storage threads, one transaction at a time
+        self._lock = threading.Lock()
+        # Mutations recorded on the event loop, waiting for a storage thread to write them
+        self._pending: dict[tuple[Path, str], _PendingChat] = {}
+        self._pending_lock = threading.Lock()
+        self._flush_scheduled = False
+        # Held while writing pending mutations, so they are written in the order they were recorded
+        self._flush_lock = threading.Lock()
+
+    def load(self, chat_id: str, project_path: Path | None = None) -> Chat | None:
+        self.flush_mutations()
+
+        history_directory = get_history_directory(project_path)
+        if not self._exists(history_directory):
+            return None
+
+        with self._transaction(history_directory) as db:
+            chat_row = db.execute(
+                """
+                SELECT name, title_edited, chat_options, is_analysis_in_progress, journal_seq, last_modified
+                FROM chats WHERE id = ?
+                """,
+                (chat_id,),
+            ).fetchone()
+
+            if chat_row is None:
+                return None
+
+            group_rows = db.execute(
+                """
+                SELECT id, actor_id, role, task, analysis, materials_ids FROM message_groups
+                WHERE chat_id = ? ORDER BY position
+                """,
+                (chat_id,),
+            ).fetchall()
+            message_rows = db.execute(
+                """
+                SELECT message_group_id, id, timestamp, content, requested_format, is_streaming FROM messages
+                WHERE chat_id = ? ORDER BY position
+                """,
+                (chat_id,),
+            ).fetchall()
+            tool_call_rows = db.execute(
+                """
+                SELECT message_id, id, language, code, headline, output, is_streaming, is_executing FROM tool_calls
+                WHERE chat_id = ? ORDER BY position
+                """,
+                (chat_id,),
+            ).fetchall()
+
+        tool_calls: dict[str, list[dict]] = {}
+        for message_id, id, language, code, headline, output, is_streaming, is_executing in tool_call_rows:
+            tool_calls.setdefault(message_id, []).append(
+                {
+                    "id": id,
+                    "language": language,
+                    "code": code,
+                    "headline": headline,
+                    "output": output,
+                    "is_streaming": bool(is_streaming),
+                    "is_executing": bool(is_executing),
+                }
+            )
+
+        messages: dict[str, list[dict]] = {}
+        for message_group_id, id, timestamp, content, requested_format, is_streaming in message_rows:
+            messages.setdefault(message_group_id, []).append(
+                {
+                    "id": id,
+                    "timestamp": timestamp,
+                    "content": content,
+                    "requested_format": json.loads(requested_format) if requested_format is not None else None,
+                    "tool_calls": tool_calls.get(id, []),
+                    "is_streaming": bool(is_streaming),
+                }
+            )
+
+        name, title_edited, chat_options, is_analysis_in_progress, journal_seq, last_modified = chat_row
+        data = {
+            "name": name,
+            "title_edited": bool(title_edited),
+            "chat_options": json.loads(chat_options),
+            "is_analysis_in_progress": bool(is_analysis_in_progress),
+            "message_groups": [
+                {
+                    "id": id,
+                    "actor_id": json.loads(actor_id),
+                    "role": role,
+                    "task": task,
+                    "analysis": analysis,
+                    "materials_ids": json.loads(materials_ids),
+                    "messages": messages.get(id, []),
+                }
+                for id, actor_id, role, task, analysis, materials_ids in group_rows
+            ],
+        }
+        data["name"] = get_chat_name(data)
+
+        return Chat(
+            id=chat_id,
+            last_modified=datetime.fromtimestamp(last_modified),
+            journal_seq=max(journal_seq, 0),
+            **data,
+        )
+
+    def write(self, snapshot: ChatSnapshot) -> tuple[WriteResult, dict | None]:
+        chat_id = snapshot.chat_id
+        content = snapshot.content
+
+        if snapshot.is_empty and not self._exists(snapshot.history_directory):
+            return "removed", None
+
+        # Rows are compared with the snapshot by the sequence number of the last mutation written to them
+        self.flush_mutations()
+
+        with self._transaction(snapshot.history_directory) as db:
+            row = db.execute("SELECT name, title_edited, journal_seq FROM chats WHERE id = ?", (chat_id,)).fetchone()
+
+            if snapshot.is_empty:
+                db.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+                return "removed", None
+
+            if row is None:
+                _insert_chat(db, chat_id, content, snapshot.journal_seq, time.time())
+                return "written", content
+
+            name, title_edited, journal_seq = row
+            changed = False
+
+            if "chat_options" in snapshot.scopes:
+                chat_options = json.dumps(content["chat_options"])
+                cursor = db.execute(
+                    "UPDATE chats SET chat_options = ? WHERE id = ? AND chat_options != ?",
+                    (chat_options, chat_id, chat_options),
+                )
+                changed = changed or cursor.rowcount > 0
+
+            # Rows updated by later mutations are newer than the snapshot
+            if "message_groups" in snapshot.scopes and (journal_seq < 0 or journal_seq < snapshot.journal_seq):
+                db.execute("DELETE FROM message_groups WHERE chat_id = ?", (chat_id,))
+                _insert_message_groups(db, chat_id, content["message_groups"])
+                db.execute(
+                    "UPDATE chats SET is_analysis_in_progress = ?, journal_seq = ? WHERE id = ?",
+                    (content["is_analysis_in_progress"], snapshot.journal_seq, chat_id),
+                )
+                changed = True
+
+            if "name" in snapshot.scopes and (name != content["name"] or not title_edited):
+                name, title_edited = content["name"], True
+                db.execute("UPDATE chats SET name = ?, title_edited = 1 WHERE id = ?", (name, chat_id))
+                changed = True
+
+            if not changed:
+                return "unchanged", None
+
+            headline = get_chat_name({**content, "name": name, "title_edited": title_edited})
+            db.execute(
+                "UPDATE chats SET headline = ?, last_modified = ? WHERE id = ?", (headline, time.time(), chat_id)
+            )
+
+        return "written", content
+
+    def after_write(self, chat_id: str, result: WriteResult, content: dict | None) -> None:
+        pass
+
+    def put(self, history_directory: Path, chat_id: str, content: dict, last_modified: datetime) -> None:
+        self.flush_mutations()
+
+        with self._transaction(history_directory) as db:
+            db.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+            _insert_chat(db, chat_id, content, content.get("journal_seq", 0), last_modified.timestamp())
+
+    def record_mutation(self, chat: Chat, mutation: ChatMutation) -> None:
+        if mutation.__class__.__name__ not in MUTATION_HANDLERS:
+            return
+
+        chat.journal_seq += 1
+        key = (get_history_directory(), chat.id)
+
+        with self._pending_lock:
+            pending_chat = self._pending.get(key)
+            if pending_chat is None:
+                pending_chat = self._pending[key] = _PendingChat(
+                    chat_id=chat.id,
+                    history_directory=key[0],
+                    header=chat.model_dump(exclude={"id", "last_modified", "lock_id", "message_groups"}),
+                    first_seq=chat.journal_seq,
+                    last_seq=chat.journal_seq,
+                )
+            pending_chat.append(chat, mutation)
+
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                submit_to_storage_thread(self._flush_in_background)
+
+    def flush_mutations(self) -> None:
+        """
+        Writes the recorded mutations still waiting for a storage thread. Blocking.
+        """
+        with self._flush_lock:
+            while True:
+                with self._pending_lock:
+                    pending_chats = list(self._pending.values())
+                    self._pending.clear()
+                    if not pending_chats:
+                        self._flush_scheduled = False
+                        return
+
+                for pending_chat in pending_chats:
+                    self._write_pending_chat(pending_chat)
+
+    def _flush_in_background(self) -> None:
+        try:
+            self.flush_mutations()
+        except Exception as e:
+            _log.exception(f"Failed to write chat mutations: {e}")
+            with self._pending_lock:
+                self._flush_scheduled = False
+
+    def _write_pending_chat(self, pending_chat: _PendingChat) -> None:
+        chat_id = pending_chat.chat_id
+
+        try:
+            with self._transaction(pending_chat.history_directory) as db:
+                # The first mutations of a new chat come before its first snapshot
+                if db.execute("SELECT 1 FROM chats WHERE id = ?", (chat_id,)).fetchone() is None:
+                    content = {**pending_chat.header, "message_groups": []}
+                    _insert_chat(db, chat_id, content, pending_chat.first_seq - 1, time.time())
+
+                for pending in pending_chat.mutations:
+                    _update_rows(db, chat_id, pending)
+
+                _execute_one(
+                    db,
+                    "UPDATE chats SET journal_seq = ?, last_modified = ? WHERE id = ? AND journal_seq = ?",
+                    (pending_chat.last_seq, time.time(), chat_id, pending_chat.first_seq - 1),
+                )
+        except (_RowsOutOfSync, sqlite3.Error) as e:
+            _log.debug(f"Rows of chat {chat_id} are out of sync after mutations up to {pending_chat.last_seq}: {e}")
+
+            # Left for the next snapshot to rewrite
+            with self._transaction(pending_chat.history_directory) as db:
+                db.execute("UPDATE chats SET journal_seq = -1 WHERE id = ?", (chat_id,))
+
+    def delete(self, chat_id: str) -> bool:
+        # Otherwise pending mutations would create the chat again
+        self.flush_mutations()
+
+        history_directory = get_history_directory()
+        if not self._exists(history_directory):
+            return False
+
+        with self._transaction(history_directory) as db:
+            return db.execute("DELETE FROM chats WHERE id = ?", (chat_id,)).rowcount > 0
+
+    def list_chat_ids(self, project_path: Path | None = None) -> list[str]:
+        self.flush_mutations()
+
+        history_directory = get_history_directory(project_path)
+        if not self._exists(history_directory):
+            return []
+
+        with self._transaction(history_directory) as db:
+            return [row[0] for row in db.execute("SELECT id FROM chats ORDER BY last_modified DESC")]
+
+    async def get_headlines(
+        self, offset: int = 0, limit: int | None = None, since: datetime | None = None
+    ) -> list[ChatHeadline]:
+        return await run_in_storage_thread(self._get_headlines, get_history_directory(), offset, limit, since)
+
+    def _get_headlines(
+        self, history_directory: Path, offset: int, limit: int | None, since: datetime | None
+    ) -> list[ChatHeadline]:
+        self.flush_mutations()
+
+        if not self._exists(history_directory):
+            return []
+
+        with self._transaction(history_directory) as db:
+            rows = db.execute(
+                """
+                SELECT id, headline, last_modified FROM chats WHERE last_modified > ?
+                ORDER BY last_modified DESC LIMIT ? OFFSET ?
+                """,
+                (since.timestamp() if since is not None else 0, limit if limit is not None else -1, offset),
+            ).fetchall()
+
+        return [
+            ChatHeadline(id=id, name=headline, last_modified=datetime.fromtimestamp(last_modified))
+            for id, headline, last_modified in rows
+        ]
+
+    async def reconcile(self) -> None:
+        # The database is the only source of truth, there is nothing to reconcile
+        pass
+
+    def get_location(self, chat_id: str) -> Path:
+        return get_history_directory() / DATABASE_FILE_NAME
+
+    def close(self) -> None:
+        self.flush_mutations()
+
+        with self._lock:
+            for db in self._connections.values():
+                db.close()
+            self._connections.clear()
+
+    def _exists(self, history_directory: Path) -> bool:
+        # Reading from a project without a database should not create one
+        return (
+            history_directory / DATABASE_FILE_NAME in self._connections
+            or (history_directory / DATABASE_FILE_NAME).exists()
+        )
+
+    @contextmanager
+    def _transaction(self, history_directory: Path) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            db = self._connect(history_directory)
+            db.execute("BEGIN")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _connect(self, history_directory: Path) -> sqlite3.Connection:
+        file_path = history_directory / DATABASE_FILE_NAME
+
+        db = self._connections.get(file_path)
+        if db is None:
+            os.makedirs(history_directory, exist_ok=True)
+
+            db = sqlite3.connect(file_path, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode = WAL")
+            # Commits are not synced to disk, a crash can lose the last few mutations but never corrupts the database
+            db.execute("PRAGMA synchronous = NORMAL")
+            db.execute("PRAGMA foreign_keys = ON")
+            db.executescript(_SCHEMA)
+
+            self._connections[file_path] = db
+
+        return db
+
+
+@dataclass
+class ImportReport:
+    total: int = 0
+    imported: int = 0
+    failed: int = 0
+    seconds: float = 0
+
+    @property
+    def done(self) -> int:
+        return self.imported + self.failed
+
+    def __str__(self) -> str:
+        return (
+            f"{self.done}/{self.total} chats ({self.imported} imported, {self.failed} failed) in {self.seconds:.2f}s"
+        )
+
+
+def import_json_chats(
+    project_path: Path,
+    storage: SQLiteChatStorage | None = None,
+    on_progress: Callable[[ImportReport], None] | None = None,
+) -> ImportReport:
+    """
+    Copies the chat files of a project, with their journals replayed, into its database. Chats already
+    in the database are replaced, the files are left in place.
+    """
+    storage = storage or SQLiteChatStorage()
+    json_storage = JSONChatStorage()
+    history_directory = get_history_directory(project_path)
+
+    chat_ids = json_storage.list_chat_ids(project_path)
+
+    report = ImportReport(total=len(chat_ids))
+    start = time.perf_counter()
+
+    for chat_id in chat_ids:
+        try:
+            chat = json_storage.load(chat_id, project_path)
+            assert chat is not None
+            replay_chat_journal(chat, project_path)
+
+            content = chat.model_dump(exclude={"id", "last_modified", "lock_id"})
+            storage.put(history_directory, chat_id, {**content, "journal_seq": chat.journal_seq}, chat.last_modified)
+
+            report.imported += 1
+        except Exception as e:
+            _log.exception(e)
+            _log.error(f"Failed to import chat {chat_id}: {e}")
+            report.failed += 1
+
+        report.seconds = time.perf_counter() - start
+        if on_progress is not None:
+            on_progress(report)
+
+    report.seconds = time.perf_counter() - start
+
+    return report
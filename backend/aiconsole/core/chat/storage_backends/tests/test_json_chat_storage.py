@@ -0,0 +1,83 @@
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from aiconsole.core.chat.save_chat_history import take_chat_snapshot
+from aiconsole.core.chat.storage_backends.json_chat_storage import JSONChatStorage
+from aiconsole.core.chat.types import Chat
+
+
+@pytest.fixture
+def merges(monkeypatch: pytest.MonkeyPatch) -> list[str]:
+    """
+    Chats whose files had to be read before being written.
+    """
+    merges = []
+    merge_into_file = JSONChatStorage._merge_into_file
+
+    def counting_merge_into_file(self, file_path, snapshot, new_content):
+        merges.append(snapshot.chat_id)
+        return merge_into_file(self, file_path, snapshot, new_content)
+
+    monkeypatch.setattr(JSONChatStorage, "_merge_into_file", counting_merge_into_file)
+    return merges
+
+
+def _read(project_directory: Path) -> dict:
+    return json.loads((project_directory / "chats" / "chat.json").read_text())
+
+
+def test_should_detect_changes_without_reading_the_file(
+    project_directory: Path, merges: list[str], make_chat: Callable[..., Chat]
+):
+    storage = JSONChatStorage()
+    chat = make_chat()
+
+    assert storage.write(take_chat_snapshot(chat))[0] == "written"
+    assert storage.write(take_chat_snapshot(chat, scope="message_groups"))[0] == "unchanged"
+
+    chat.message_groups[0].messages[0].content = "Changed"
+    assert storage.write(take_chat_snapshot(chat, scope="message_groups"))[0] == "written"
+
+    chat.name = "Renamed"
+    assert storage.write(take_chat_snapshot(chat, scope="name"))[0] == "written"
+
+    assert merges == []
+    content = _read(project_directory)
+    assert content["message_groups"][0]["messages"][0]["content"] == "Changed"
+    assert (content["name"], content["title_edited"]) == ("Renamed", True)
+
+
+def test_should_merge_snapshots_disagreeing_with_the_file_outside_of_their_scopes(
+    project_directory: Path, merges: list[str], make_chat: Callable[..., Chat]
+):
+    storage = JSONChatStorage()
+    storage.write(take_chat_snapshot(make_chat()))
+
+    renamed = make_chat()
+    renamed.name = "Renamed"
+    storage.write(take_chat_snapshot(renamed, scope="name"))
+
+    # Still has the old name, which must not overwrite the new one
+    stale = make_chat(content="Changed")
+    assert storage.write(take_chat_snapshot(stale, scope="message_groups"))[0] == "written"
+
+    assert merges == ["chat"]
+    content = _read(project_directory)
+    assert content["name"] == "Renamed"
+    assert content["message_groups"][0]["messages"][0]["content"] == "Changed"
+
+
+def test_should_read_files_changed_outside(project_directory: Path, merges: list[str], make_chat: Callable[..., Chat]):
+    storage = JSONChatStorage()
+    storage.write(take_chat_snapshot(make_chat()))
+
+    file_path = project_directory / "chats" / "chat.json"
+    file_path.write_text(json.dumps({**_read(project_directory), "name": "Edited outside", "title_edited": True}))
+
+    assert storage.write(take_chat_snapshot(make_chat(content="Changed"), scope="message_groups"))[0] == "written"
+
+    assert merges == ["chat"]
+    assert _read(project_directory)["name"] == "Edited outside"
@@ -0,0 +1,162 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from aiconsole.core.chat.actor_id import ActorId
+from aiconsole.core.chat.apply_mutation import apply_mutation
+from aiconsole.core.chat.chat_cache import chat_cache
+from aiconsole.core.chat.chat_mutations import (
+    AppendToContentMessageMutation,
+    AppendToOutputToolCallMutation,
+    ChatMutation,
+    CreateMessageGroupMutation,
+    CreateMessageMutation,
+    CreateToolCallMutation,
+    DeleteToolCallMutation,
+    SetContentMessageMutation,
+    SetIsExecutingToolCallMutation,
+)
+from aiconsole.core.chat.load_chat_history import load_chat_history
+from aiconsole.core.chat.save_chat_history import save_chat_history, take_chat_snapshot
+from aiconsole.core.chat.storage_backends import chat_storage_backend as backend_module
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    chat_storage_backend,
+)
+from aiconsole.core.chat.storage_backends.json_chat_storage import JSONChatStorage
+from aiconsole.core.chat.storage_backends.sqlite_chat_storage import (
+    SQLiteChatStorage,
+    import_json_chats,
+)
+from aiconsole.core.chat.types import AICMessage, Chat
+from aiconsole.core.project.paths import get_history_directory
+
+
+@pytest.fixture(autouse=True)
+def storage(project_directory: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(backend_module, "CHAT_STORAGE_BACKEND", "sqlite")
+    chat_storage_backend.cache_clear()
+    chat_cache().clear()
+
+    storage = chat_storage_backend()
+    assert isinstance(storage, SQLiteChatStorage)
+    yield storage
+
+    storage.close()
+    chat_storage_backend.cache_clear()
+
+
+def _mutate(storage: SQLiteChatStorage, chat: Chat, mutation: ChatMutation):
+    apply_mutation(chat, mutation)
+    storage.record_mutation(chat, mutation)
+
+
+def _dump(chat: Chat) -> dict:
+    return chat.model_dump(exclude={"last_modified"})
+
+
+@pytest.mark.asyncio
+async def test_should_save_load_list_and_delete_chats(storage: SQLiteChatStorage, make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("a", "First"))
+    save_chat_history(make_chat("b", "Second"))
+
+    renamed = make_chat("a", "First")
+    renamed.name = "Renamed"
+    save_chat_history(renamed, scope="name")
+
+    chat = await load_chat_history("b")
+    assert _dump(chat) == _dump(make_chat("b", "Second")) | {"name": "Second"}
+
+    assert storage.list_chat_ids() == ["a", "b"]
+    assert [headline.name for headline in await storage.get_headlines()] == ["Renamed", "Second"]
+    assert [headline.id for headline in await storage.get_headlines(offset=1, limit=1)] == ["b"]
+
+    assert storage.delete("a")
+    assert not storage.delete("a")
+    assert storage.list_chat_ids() == ["b"]
+
+
+@pytest.mark.asyncio
+async def test_should_update_rows_from_mutations(storage: SQLiteChatStorage):
+    chat = Chat(id="chat", name="", last_modified=datetime.now(), message_groups=[])
+    actor_id = ActorId(type="agent", id="agent")
+
+    _mutate(
+        storage,
+        chat,
+        CreateMessageGroupMutation(
+            message_group_id="g", actor_id=actor_id, role="assistant", task="", materials_ids=[], analysis=""
+        ),
+    )
+    _mutate(storage, chat, CreateMessageMutation(message_group_id="g", message_id="m", timestamp="", content=""))
+    for delta in ["Hel", "lo"]:
+        _mutate(storage, chat, AppendToContentMessageMutation(message_id="m", content_delta=delta))
+    _mutate(storage, chat, CreateToolCallMutation(message_id="m", tool_call_id="t", code="print(1)", headline=""))
+    _mutate(storage, chat, AppendToOutputToolCallMutation(tool_call_id="t", output_delta="1\n"))
+    _mutate(storage, chat, SetIsExecutingToolCallMutation(tool_call_id="t", is_executing=True))
+    _mutate(storage, chat, CreateToolCallMutation(message_id="m", tool_call_id="u", code="", headline=""))
+    _mutate(storage, chat, DeleteToolCallMutation(tool_call_id="u"))
+
+    loaded = storage.load("chat")
+    assert loaded is not None
+    assert _dump(loaded) == _dump(chat) | {"name": "Hello"}
+    assert loaded.journal_seq == chat.journal_seq == 9
+
+    # Rows are already up to date, the snapshot has nothing to write
+    assert storage.write(take_chat_snapshot(chat, scope="message_groups"))[0] == "unchanged"
+
+
+def test_should_coalesce_streamed_appends_into_a_single_update(
+    storage: SQLiteChatStorage, make_chat: Callable[..., Chat]
+):
+    chat = make_chat(content="")
+    save_chat_history(chat)
+    statements: list[str] = []
+    storage._connect(get_history_directory()).set_trace_callback(statements.append)
+
+    # Keeps the storage thread from writing the mutations while they are recorded
+    with storage._flush_lock:
+        for i in range(500):
+            _mutate(storage, chat, AppendToContentMessageMutation(message_id="m", content_delta=f"{i} "))
+    storage.flush_mutations()
+
+    loaded = storage.load("chat")
+    assert loaded is not None
+    assert loaded.message_groups[0].messages[0].content == "".join(f"{i} " for i in range(500))
+    assert loaded.journal_seq == 500
+    assert len([statement for statement in statements if "content = content ||" in statement]) == 1
+
+
+@pytest.mark.asyncio
+async def test_should_rewrite_chat_whose_rows_are_out_of_sync(
+    storage: SQLiteChatStorage, make_chat: Callable[..., Chat]
+):
+    chat = make_chat()
+    save_chat_history(chat)
+
+    # Changed without a mutation, the rows no longer match
+    chat.message_groups[0].messages.append(AICMessage(id="n", timestamp="", content=""))
+    chat.invalidate_index()
+    _mutate(storage, chat, SetContentMessageMutation(message_id="n", content="World"))
+
+    save_chat_history(chat, scope="message_groups")
+
+    loaded = storage.load("chat")
+    assert loaded is not None
+    assert [message.content for message in loaded.message_groups[0].messages] == ["Hello", "World"]
+
+
+def test_should_import_json_chats(tmp_path: Path, storage: SQLiteChatStorage, make_chat: Callable[..., Chat]):
+    json_storage = JSONChatStorage()
+    for chat_id, content in [("a", "First"), ("b", "Second")]:
+        json_storage.write(take_chat_snapshot(make_chat(chat_id, content)))
+
+    report = import_json_chats(tmp_path, storage)
+
+    assert (report.imported, report.failed) == (2, 0)
+    assert set(storage.list_chat_ids()) == {"a", "b"}
+
+    loaded = storage.load("a")
+    assert loaded is not None
+    assert loaded.message_groups == make_chat("a", "First").message_groups
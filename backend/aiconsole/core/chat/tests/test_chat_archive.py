@@ -0,0 +1,98 @@
+import io
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from aiconsole.core.blobs.blob_store import get_blob_path, put_blob
+from aiconsole.core.chat.chat_archive import encode_archive, export_chats, import_chats
+from aiconsole.core.chat.chat_journal import get_chat_journal_path
+from aiconsole.core.chat.save_chat_history import save_chat_history
+from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+    chat_storage_backend,
+)
+from aiconsole.core.chat.types import Chat
+
+
+def _archive(compress: bool = False) -> io.BytesIO:
+    return io.BytesIO(b"".join(encode_archive(export_chats(), compress=compress)))
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_should_move_chats_and_their_blobs_between_projects(
+    project_directory: Path, compress: bool, make_chat: Callable[..., Chat]
+):
+    blob = put_blob(b"x" * 100, "text/plain")
+    save_chat_history(make_chat("first", "Hello", output=f"\n{blob}\n"))
+    save_chat_history(make_chat("second", "World"))
+    os.utime(project_directory / "chats" / "first.json", (1_700_000_000, 1_700_000_000))
+
+    archive = _archive(compress)
+    other_project = project_directory / "other"
+
+    report = import_chats(archive, other_project, workers=2)
+
+    assert (report.imported, report.blobs, report.failed) == (2, 1, 0)
+    assert get_blob_path(blob.sha256, other_project).read_bytes() == b"x" * 100
+
+    first = chat_storage_backend().load("first", other_project)
+    assert first is not None
+    assert first.message_groups[0].messages[0].content == "Hello"
+    assert first.last_modified == datetime.fromtimestamp(1_700_000_000)
+    assert chat_storage_backend().list_chat_ids(other_project) == ["second", "first"]
+
+
+def test_should_skip_existing_chats_unless_replacing(project_directory: Path, make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("chat", "Archived"))
+    archive = _archive()
+
+    save_chat_history(make_chat("chat", "Local"))
+    journal_path = get_chat_journal_path("chat")
+    journal_path.write_text("")
+
+    report = import_chats(archive, project_directory, workers=1)
+    assert (report.imported, report.skipped) == (0, 1)
+
+    archive.seek(0)
+    report = import_chats(archive, project_directory, replace=True, workers=1)
+    assert (report.imported, report.skipped) == (1, 0)
+
+    chat = chat_storage_backend().load("chat", project_directory)
+    assert chat is not None
+    assert chat.message_groups[0].messages[0].content == "Archived"
+    assert not journal_path.exists()
+
+
+def test_should_skip_chats_repeated_in_the_archive(project_directory: Path, make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("chat", "First"))
+    first = _archive().getvalue().splitlines(keepends=True)
+    save_chat_history(make_chat("chat", "Second"))
+    second = _archive().getvalue().splitlines(keepends=True)
+
+    report = import_chats(io.BytesIO(b"".join(first + second[1:])), project_directory / "other", workers=1)
+    assert (report.imported, report.skipped) == (1, 1)
+
+    chat = chat_storage_backend().load("chat", project_directory / "other")
+    assert chat is not None
+    assert chat.message_groups[0].messages[0].content == "First"
+
+
+def test_should_count_invalid_lines_and_reject_other_files(project_directory: Path, make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("chat", "Hello"))
+    lines = _archive().getvalue().splitlines(keepends=True)
+    broken = [
+        lines[0],
+        b'{"type": "chat", "id": "../escape", "last_modified": "2024-01-01T00:00:00", "chat": {}}\n',
+        b'{"type": "chat", "id": "invalid", "last_modified": "2024-01-01T00:00:00", "chat": {"message_groups": 1}}\n',
+        lines[1],
+    ]
+
+    report = import_chats(io.BytesIO(b"".join(broken)), project_directory / "other", workers=1)
+
+    assert (report.imported, report.failed) == (1, 2)
+    assert not (project_directory / "escape.json").exists()
+
+    with pytest.raises(ValueError):
+        import_chats(io.BytesIO(b'{"id": "chat"}\n'), project_directory / "other")
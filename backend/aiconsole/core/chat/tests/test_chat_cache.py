@@ -0,0 +1,64 @@
+import os
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from aiconsole.core.chat.chat_cache import ChatCache
+from aiconsole.core.chat.types import Chat
+
+
+@pytest.fixture(autouse=True)
+def project_directory(project_directory: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    (project_directory / "chats").mkdir()
+    return project_directory
+
+
+def _chat(id: str, project_directory: Path, size: int = 10) -> Chat:
+    (project_directory / "chats" / f"{id}.json").write_text("x" * size)
+    return Chat(id=id, name=id, last_modified=datetime.now(), message_groups=[])
+
+
+def test_should_count_hits_and_misses(project_directory: Path):
+    cache = ChatCache()
+    chat = _chat("a", project_directory)
+
+    assert cache.get("a") is None
+    cache.put(chat)
+
+    assert cache.get("a") is chat
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_should_drop_entry_when_file_changes(project_directory: Path):
+    cache = ChatCache()
+    chat = _chat("a", project_directory)
+    cache.put(chat)
+
+    file_path = project_directory / "chats" / "a.json"
+    file_path.write_text("changed")
+    os.utime(file_path, ns=(0, 0))
+
+    assert cache.get("a") is None
+
+
+def test_should_evict_least_recently_used(project_directory: Path):
+    cache = ChatCache(max_chats=2, max_bytes=25)
+
+    a = _chat("a", project_directory)
+    b = _chat("b", project_directory)
+    c = _chat("c", project_directory)
+
+    cache.put(a)
+    cache.put(b)
+    cache.get("a")
+    cache.put(c)
+
+    # Over both limits, "b" was used least recently
+    assert cache.get("b") is None
+    assert cache.get("a") is a
+    assert cache.get("c") is c
+    assert cache.size_bytes == 20
+
+    cache.invalidate("a")
+    assert cache.get("a") is None
@@ -0,0 +1,99 @@
+import asyncio
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from aiconsole.core.chat import chat_checkpointer as chat_checkpointer_module
+from aiconsole.core.chat.apply_mutation import apply_mutation
+from aiconsole.core.chat.chat_checkpointer import ChatCheckpointer, checkpoint_stats
+from aiconsole.core.chat.chat_mutations import (
+    AppendToContentMessageMutation,
+    SetIsAnalysisInProgressMutation,
+)
+from aiconsole.core.chat.save_chat_history import chat_writer
+from aiconsole.core.chat.types import Chat
+
+
+@pytest.fixture(autouse=True)
+def project_directory(project_directory: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    monkeypatch.setattr(chat_checkpointer_module, "_TICK_SECONDS", 0.01)
+    monkeypatch.setattr(chat_checkpointer_module, "CHAT_CHECKPOINT_INTERVAL_SECONDS", 60)
+    monkeypatch.setattr(chat_checkpointer_module, "CHAT_CHECKPOINT_EVERY_MUTATIONS", 3)
+    monkeypatch.setattr(chat_checkpointer_module, "CHAT_CHECKPOINT_STREAMING_BACKOFF_SECONDS", 0.1)
+    monkeypatch.setattr(chat_checkpointer_module, "CHAT_CHECKPOINT_MAX_DELAY_SECONDS", 60)
+    return project_directory
+
+
+def _read_content(project_directory: Path) -> str | None:
+    path = project_directory / "chats" / "chat.json"
+    if not path.exists():
+        return None
+    with open(path) as f:
+        return json.load(f)["message_groups"][0]["messages"][0]["content"]
+
+
+def _mutate(checkpointer: ChatCheckpointer, chat: Chat, mutation):
+    apply_mutation(chat, mutation)
+    checkpointer.mark_dirty(chat, mutation)
+
+
+async def _wait_until_idle(checkpointer: ChatCheckpointer):
+    while checkpointer._task is not None:
+        await asyncio.sleep(0.01)
+    await chat_writer().flush()
+
+
+@pytest.mark.asyncio
+async def test_should_checkpoint_locked_chat_after_enough_mutations(
+    project_directory: Path, make_chat: Callable[..., Chat]
+):
+    checkpointer = ChatCheckpointer()
+    chat = make_chat(content="", lock_id="request")
+    checkpoints = checkpoint_stats.checkpoints
+
+    for _ in range(3):
+        _mutate(checkpointer, chat, SetIsAnalysisInProgressMutation(is_analysis_in_progress=True))
+    apply_mutation(chat, AppendToContentMessageMutation(message_id="m", content_delta="Hello"))
+    checkpointer.mark_dirty(chat, SetIsAnalysisInProgressMutation(is_analysis_in_progress=False))
+
+    await _wait_until_idle(checkpointer)
+
+    assert _read_content(project_directory) == "Hello"
+    assert checkpoint_stats.checkpoints == checkpoints + 1
+    assert checkpoint_stats.last_seconds > 0
+
+
+@pytest.mark.asyncio
+async def test_should_wait_for_a_pause_in_streaming(project_directory: Path, make_chat: Callable[..., Chat]):
+    checkpointer = ChatCheckpointer()
+    chat = make_chat(content="", lock_id="request")
+
+    for _ in range(10):
+        _mutate(checkpointer, chat, AppendToContentMessageMutation(message_id="m", content_delta="a"))
+        await asyncio.sleep(0.02)
+
+    # Due by the mutation count but still streaming
+    assert _read_content(project_directory) is None
+
+    await _wait_until_idle(checkpointer)
+
+    assert _read_content(project_directory) == "a" * 10
+
+
+@pytest.mark.asyncio
+async def test_should_not_checkpoint_after_the_lock_is_released(
+    project_directory: Path, make_chat: Callable[..., Chat]
+):
+    checkpointer = ChatCheckpointer()
+    chat = make_chat(content="", lock_id="request")
+
+    for _ in range(3):
+        _mutate(checkpointer, chat, SetIsAnalysisInProgressMutation(is_analysis_in_progress=True))
+    chat.lock_id = None
+    checkpointer.forget(chat.id)
+
+    await _wait_until_idle(checkpointer)
+
+    assert _read_content(project_directory) is None
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from aiconsole.core.chat import chat_headline_index as chat_headline_index_module
+from aiconsole.core.chat.chat_headline_index import INDEX_FILE_NAME, ChatHeadlineIndex
+from aiconsole.core.chat.save_chat_history import save_chat_history
+from aiconsole.core.chat.types import Chat
+from aiconsole.core.project.paths import get_history_directory
+
+
+@pytest.fixture(autouse=True)
+def index(project_directory: Path, monkeypatch: pytest.MonkeyPatch) -> ChatHeadlineIndex:
+    index = ChatHeadlineIndex()
+    monkeypatch.setattr("aiconsole.core.chat.storage_backends.json_chat_storage.chat_headline_index", lambda: index)
+    return index
+
+
+@pytest.mark.asyncio
+async def test_should_keep_headlines_up_to_date_on_save_rename_and_delete(
+    index: ChatHeadlineIndex, make_chat: Callable[..., Chat]
+):
+    save_chat_history(make_chat("a", "First"))
+    save_chat_history(make_chat("b", "Second"))
+
+    assert {headline.name for headline in await index.get_headlines()} == {"First", "Second"}
+
+    renamed = make_chat("a", "First")
+    renamed.name = "Renamed"
+    save_chat_history(renamed, scope="name")
+
+    empty = make_chat("b", "")
+    empty.message_groups = []
+    save_chat_history(empty)
+
+    assert [headline.name for headline in await index.get_headlines()] == ["Renamed"]
+
+    # Survives a restart without reparsing
+    reloaded = ChatHeadlineIndex()
+    await reloaded.reconcile()
+    assert [headline.name for headline in await reloaded.get_headlines()] == ["Renamed"]
+
+
+@pytest.mark.asyncio
+async def test_should_reconcile_with_files_changed_outside(index: ChatHeadlineIndex, make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("a", "First"))
+    save_chat_history(make_chat("b", "Second"))
+    await index.get_headlines()
+
+    # Chat copied in while the server was not running, another one removed
+    with open(get_history_directory() / "c.json", "w") as f:
+        json.dump(make_chat("c", "Third").model_dump(exclude={"id", "last_modified"}), f)
+    (get_history_directory() / "b.json").unlink()
+
+    reloaded = ChatHeadlineIndex()
+    await reloaded.reconcile()
+
+    assert {headline.name for headline in await reloaded.get_headlines()} == {"First", "Third"}
+    assert (get_history_directory() / INDEX_FILE_NAME).exists()
+
+
+@pytest.mark.asyncio
+async def test_should_show_concurrent_callers_the_complete_index(
+    make_chat: Callable[..., Chat], monkeypatch: pytest.MonkeyPatch
+):
+    os.makedirs(get_history_directory())
+    for i in range(20):
+        with open(get_history_directory() / f"{i}.json", "w") as f:
+            json.dump(make_chat(str(i), f"Chat {i}").model_dump(exclude={"id", "last_modified"}), f)
+
+    async def load_chat_history(chat_id: str):
+        raise AssertionError("Chats without a journal are indexed without being loaded")
+
+    monkeypatch.setattr(chat_headline_index_module, "load_chat_history", load_chat_history)
+
+    index = ChatHeadlineIndex()
+    results = await asyncio.gather(*(index.get_headlines() for _ in range(5)))
+
+    assert [len(headlines) for headlines in results] == [20] * 5
+    assert {headline.name for headline in results[0]} == {f"Chat {i}" for i in range(20)}
+
+
+@pytest.mark.asyncio
+async def test_should_paginate_most_recent_first(index: ChatHeadlineIndex, make_chat: Callable[..., Chat]):
+    for i in range(5):
+        save_chat_history(make_chat(str(i), f"Chat {i}"))
+
+    headlines = await index.get_headlines()
+    since = headlines[2].last_modified
+
+    assert [headline.id for headline in await index.get_headlines(offset=1, limit=2)] == [
+        headline.id for headline in headlines[1:3]
+    ]
+    assert [headline.id for headline in await index.get_headlines(since=since)] == [
+        headline.id for headline in headlines if headline.last_modified > since
+    ]
+
+
+@pytest.mark.asyncio
+async def test_should_accept_timezone_aware_since(index: ChatHeadlineIndex, make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("a", "First"))
+
+    assert [
+        headline.id for headline in await index.get_headlines(since=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    ] == ["a"]
+    assert await index.get_headlines(since=datetime.now(timezone.utc) + timedelta(hours=1)) == []
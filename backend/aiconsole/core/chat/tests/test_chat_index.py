@@ -0,0 +1,126 @@
+import random
+from datetime import datetime
+
+import pytest
+
+from aiconsole.core.chat.actor_id import ActorId
+from aiconsole.core.chat.apply_mutation import apply_mutation
+from aiconsole.core.chat.chat_mutations import (
+    AppendToContentMessageMutation,
+    CreateMessageGroupMutation,
+    CreateMessageMutation,
+    CreateToolCallMutation,
+    DeleteMessageGroupMutation,
+    DeleteMessageMutation,
+    DeleteToolCallMutation,
+)
+from aiconsole.core.chat.types import AICMessage, AICMessageGroup, AICToolCall, Chat
+
+
+@pytest.fixture
+def chat() -> Chat:
+    return Chat(id="chat", name="", last_modified=datetime.now(), message_groups=[])
+
+
+def _all_ids(chat: Chat) -> tuple[list[str], list[str], list[str]]:
+    groups = [group.id for group in chat.message_groups]
+    messages = [message.id for group in chat.message_groups for message in group.messages]
+    tool_calls = [
+        tool_call.id for group in chat.message_groups for message in group.messages for tool_call in message.tool_calls
+    ]
+    return groups, messages, tool_calls
+
+
+def _assert_index_consistent(chat: Chat, known_ids: set[str]):
+    for id in known_ids:
+        assert chat.get_message_group(id) is chat._scan_message_group(id)
+
+        indexed_message = chat.get_message_location(id)
+        scanned_message = chat._scan_message_location(id)
+        assert (indexed_message is None) == (scanned_message is None)
+        if indexed_message and scanned_message:
+            assert indexed_message.message_group is scanned_message.message_group
+            assert indexed_message.message is scanned_message.message
+
+        indexed_tool_call = chat.get_tool_call_location(id)
+        scanned_tool_call = chat._scan_tool_call_location(id)
+        assert (indexed_tool_call is None) == (scanned_tool_call is None)
+        if indexed_tool_call and scanned_tool_call:
+            assert indexed_tool_call.message_group is scanned_tool_call.message_group
+            assert indexed_tool_call.message is scanned_tool_call.message
+            assert indexed_tool_call.tool_call is scanned_tool_call.tool_call
+
+
+def test_index_is_built_lazily_for_loaded_chat():
+    tool_call = AICToolCall(id="tc", code="print(1)", headline="")
+    message = AICMessage(id="m", timestamp="", content="", tool_calls=[tool_call])
+    group = AICMessageGroup(
+        id="g",
+        actor_id=ActorId(type="user", id="user"),
+        role="user",
+        analysis="",
+        task="",
+        materials_ids=[],
+        messages=[message],
+    )
+    chat = Chat(id="chat", name="", last_modified=datetime.now(), message_groups=[group])
+
+    assert chat._tool_calls_index is None
+
+    location = chat.get_tool_call_location("tc")
+
+    assert location is not None
+    assert location.tool_call is tool_call
+    assert location.message is message
+    assert location.message_group is group
+
+
+def test_index_matches_scan_after_random_mutations(chat: Chat):
+    rng = random.Random(1234)
+    known_ids: set[str] = set()
+
+    for step in range(2000):
+        groups, messages, tool_calls = _all_ids(chat)
+        new_id = f"id-{step}"
+        action = rng.random()
+
+        if action < 0.15 or not groups:
+            mutation = CreateMessageGroupMutation(
+                message_group_id=new_id,
+                actor_id=ActorId(type="agent", id="assistant"),
+                role="assistant",
+                task="",
+                materials_ids=[],
+                analysis="",
+            )
+        elif action < 0.4:
+            mutation = CreateMessageMutation(
+                message_group_id=rng.choice(groups),
+                message_id=new_id,
+                timestamp="",
+                content=rng.choice(["", "content"]),
+            )
+        elif action < 0.65 and messages:
+            mutation = CreateToolCallMutation(
+                message_id=rng.choice(messages), tool_call_id=new_id, code="", headline=""
+            )
+        elif action < 0.75 and messages:
+            mutation = AppendToContentMessageMutation(message_id=rng.choice(messages), content_delta="x")
+        elif action < 0.85 and tool_calls:
+            mutation = DeleteToolCallMutation(tool_call_id=rng.choice(tool_calls))
+        elif action < 0.95 and messages:
+            mutation = DeleteMessageMutation(message_id=rng.choice(messages))
+        else:
+            mutation = DeleteMessageGroupMutation(message_group_id=rng.choice(groups))
+
+        known_ids.add(new_id)
+        apply_mutation(chat, mutation)
+
+        if step % 200 == 0:
+            _assert_index_consistent(chat, known_ids)
+
+    _assert_index_consistent(chat, known_ids)
+
+    # A rebuilt index must agree with the incrementally maintained one
+    chat.invalidate_index()
+    _assert_index_consistent(chat, known_ids)
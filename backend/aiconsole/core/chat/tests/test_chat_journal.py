@@ -0,0 +1,97 @@
+import json
+
+import pytest
+
+from aiconsole.core.chat import chat_journal
+from aiconsole.core.chat.actor_id import ActorId
+from aiconsole.core.chat.apply_mutation import apply_mutation
+from aiconsole.core.chat.chat_journal import (
+    append_to_chat_journal,
+    get_chat_journal_path,
+    truncate_chat_journal,
+)
+from aiconsole.core.chat.chat_mutations import (
+    AppendToContentMessageMutation,
+    ChatMutation,
+    CreateMessageGroupMutation,
+    CreateMessageMutation,
+)
+from aiconsole.core.chat.load_chat_history import load_chat_history
+from aiconsole.core.chat.save_chat_history import chat_writer, save_chat_history
+from aiconsole.core.chat.types import Chat
+
+pytestmark = pytest.mark.usefixtures("project_directory")
+
+
+def _mutations() -> list[ChatMutation]:
+    return [
+        CreateMessageGroupMutation(
+            message_group_id="g",
+            actor_id=ActorId(type="user", id="user"),
+            role="user",
+            task="",
+            materials_ids=[],
+            analysis="",
+        ),
+        CreateMessageMutation(message_group_id="g", message_id="m", timestamp="2024-01-01T00:00:00", content=""),
+        *[AppendToContentMessageMutation(message_id="m", content_delta=str(i)) for i in range(10)],
+    ]
+
+
+async def _mutate(chat: Chat, mutations: list[ChatMutation]):
+    for mutation in mutations:
+        apply_mutation(chat, mutation)
+        append_to_chat_journal(chat, mutation)
+        # Let the snapshots be written as they are taken
+        await chat_writer().flush()
+
+
+@pytest.mark.asyncio
+async def test_should_recover_unsaved_mutations_from_journal():
+    chat = await load_chat_history("chat")
+    await _mutate(chat, _mutations())
+
+    # No snapshot was taken, simulate a crash by loading from disk
+    recovered = await load_chat_history("chat")
+
+    assert recovered.message_groups == chat.message_groups
+    assert recovered.journal_seq == chat.journal_seq
+
+
+def _journaled_seqs() -> list[int]:
+    # Written by a storage thread
+    chat_journal._get_journal(get_chat_journal_path("chat")).flush()
+    return [json.loads(line)["seq"] for line in get_chat_journal_path("chat").read_text().splitlines()]
+
+
+@pytest.mark.asyncio
+async def test_should_not_replay_mutations_contained_in_snapshot(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(chat_journal, "CHAT_JOURNAL_COMPACT_BYTES", 500)
+
+    chat = await load_chat_history("chat")
+    await _mutate(chat, _mutations())
+
+    # Compaction happened along the way, the journal only holds the tail
+    assert 0 < len(_journaled_seqs()) < len(_mutations())
+
+    recovered = await load_chat_history("chat")
+    assert recovered.message_groups == chat.message_groups
+
+    save_chat_history(chat, scope="message_groups")
+    assert not get_chat_journal_path("chat").exists()
+
+    reloaded = await load_chat_history("chat")
+    assert reloaded.message_groups == chat.message_groups
+    assert reloaded.message_groups[0].messages[0].content == "0123456789"
+
+
+@pytest.mark.asyncio
+async def test_should_keep_mutations_applied_after_the_snapshot_when_truncating():
+    chat = await load_chat_history("chat")
+    await _mutate(chat, _mutations())
+
+    truncate_chat_journal("chat", up_to_seq=chat.journal_seq - 3)
+    assert _journaled_seqs() == [chat.journal_seq - 2, chat.journal_seq - 1, chat.journal_seq]
+
+    truncate_chat_journal("chat", up_to_seq=chat.journal_seq)
+    assert not get_chat_journal_path("chat").exists()
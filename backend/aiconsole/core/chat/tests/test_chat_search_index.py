@@ -0,0 +1,103 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from aiconsole.core.chat.chat_search_index import chat_search_index
+from aiconsole.core.chat.save_chat_history import save_chat_history
+from aiconsole.core.chat.types import Chat
+from aiconsole.core.project.paths import get_history_directory
+
+
+@pytest.fixture(autouse=True)
+def project_directory(project_directory: Path):
+    yield project_directory
+    chat_search_index().close()
+
+
+@pytest.mark.asyncio
+async def test_should_rank_and_highlight_matches(make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("a", "Pandas can read parquet files", output="parquet parquet parquet"))
+    save_chat_history(make_chat("b", "Let's plot the data with matplotlib"))
+
+    results = (await chat_search_index().search("parquet")).results
+
+    assert [result.chat_id for result in results] == ["a"]
+    result = results[0]
+    assert (result.message_group_id, result.field) == ("g", "output")
+    assert [result.snippet[start:end] for start, end in result.highlights] == ["parquet"] * 3
+
+    # Last word is matched as a prefix
+    assert [result.chat_id for result in (await chat_search_index().search("plot matpl")).results] == ["b"]
+    assert (await chat_search_index().search("plot parquet")).results == []
+    assert (await chat_search_index().search("  ")).results == []
+
+
+@pytest.mark.asyncio
+async def test_should_paginate(make_chat: Callable[..., Chat]):
+    for i in range(5):
+        save_chat_history(make_chat(f"c{i}", f"common word {i}"))
+
+    first = await chat_search_index().search("common", limit=3)
+    second = await chat_search_index().search("common", offset=3, limit=3)
+
+    assert first.has_more and not second.has_more
+    assert len({result.chat_id for result in first.results + second.results}) == 5
+
+
+@pytest.mark.asyncio
+async def test_should_rank_all_matches_not_only_recent_ones(make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("best", "parquet parquet parquet parquet"))
+    history_directory = get_history_directory()
+    for i in range(2500):
+        content = make_chat(f"c{i}", f"a long message mentioning parquet once among many other words {i}")
+        chat_search_index().index_chat(history_directory, f"c{i}", content.model_dump(mode="json"))
+
+    results = await chat_search_index().search("parquet", limit=5)
+
+    assert results.results[0].chat_id == "best"
+    assert results.has_more
+
+
+@pytest.mark.asyncio
+async def test_should_reindex_changed_chats_only_where_they_changed(
+    project_directory: Path, make_chat: Callable[..., Chat]
+):
+    history_directory = project_directory / "chats"
+    chat = make_chat("a", "first version", output="unchanged output")
+    save_chat_history(chat)
+
+    with chat_search_index()._transaction(history_directory) as db:
+        output_segment_id = db.execute("SELECT id FROM segments WHERE key = 't:output'").fetchone()[0]
+
+    chat.message_groups[0].messages[0].content = "second version"
+    save_chat_history(chat, scope="message_groups")
+
+    assert (await chat_search_index().search("first")).results == []
+    assert len((await chat_search_index().search("second")).results) == 1
+
+    with chat_search_index()._transaction(history_directory) as db:
+        assert db.execute("SELECT id FROM segments WHERE key = 't:output'").fetchone()[0] == output_segment_id
+
+    # Emptied chats are removed
+    chat.message_groups = []
+    save_chat_history(chat, scope="message_groups")
+    assert (await chat_search_index().search("second")).results == []
+
+
+@pytest.mark.asyncio
+async def test_should_reconcile_with_chats_changed_outside(project_directory: Path, make_chat: Callable[..., Chat]):
+    save_chat_history(make_chat("a", "indexed on save"))
+
+    file_path = project_directory / "chats" / "b.json"
+    content = make_chat("b", "written while the app was closed").model_dump(exclude={"id", "last_modified", "lock_id"})
+    file_path.write_text(json.dumps(content))
+    os.remove(project_directory / "chats" / "a.json")
+
+    await chat_search_index().reconcile()
+
+    assert [result.chat_id for result in (await chat_search_index().search("closed")).results] == ["b"]
+    assert (await chat_search_index().search("indexed")).results == []
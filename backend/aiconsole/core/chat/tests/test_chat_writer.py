@@ -0,0 +1,58 @@
+import json
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from aiconsole.core.chat import save_chat_history as save_chat_history_module
+from aiconsole.core.chat.load_chat_history import load_chat_history
+from aiconsole.core.chat.save_chat_history import ChatWriter
+from aiconsole.core.chat.types import Chat
+
+
+@pytest.mark.asyncio
+async def test_should_coalesce_repeated_saves_of_a_chat(
+    project_directory: Path, monkeypatch: pytest.MonkeyPatch, make_chat: Callable[..., Chat]
+):
+    writes = []
+    write_chat_snapshot = save_chat_history_module.write_chat_snapshot
+
+    def counting_write(snapshot):
+        writes.append(snapshot)
+        return write_chat_snapshot(snapshot)
+
+    monkeypatch.setattr(save_chat_history_module, "write_chat_snapshot", counting_write)
+
+    writer = ChatWriter()
+    chat = make_chat()
+
+    writer.schedule(chat)
+    chat.message_groups[0].messages[0].content = "Hello world"
+    writer.schedule(chat, scope="message_groups")
+    chat.name = "Renamed"
+    writer.schedule(chat, scope="name")
+
+    await writer.flush()
+
+    assert len(writes) == 1
+    assert writes[0].scopes == {"default", "message_groups", "name"}
+
+    with open(project_directory / "chats" / "chat.json") as f:
+        content = json.load(f)
+    assert content["name"] == "Renamed"
+    assert content["message_groups"][0]["messages"][0]["content"] == "Hello world"
+
+
+@pytest.mark.asyncio
+async def test_should_write_snapshot_taken_at_schedule_time(project_directory: Path, make_chat: Callable[..., Chat]):
+    writer = ChatWriter()
+    chat = make_chat()
+
+    writer.schedule(chat)
+    # Changed after the save was requested, must not leak into the file
+    chat.message_groups[0].messages[0].content = "Changed"
+
+    await writer.flush("chat")
+
+    assert (await load_chat_history("chat")).message_groups[0].messages[0].content == "Hello"
+    assert [path.name for path in (project_directory / "chats").iterdir() if path.name.endswith(".tmp")] == []
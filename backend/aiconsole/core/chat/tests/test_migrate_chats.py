@@ -0,0 +1,76 @@
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+from aiconsole.core.chat.load_chat_history import CHAT_SCHEMA_VERSION, load_chat_history
+from aiconsole.core.chat.migrate_chats import migrate_chats
+from aiconsole.core.chat.save_chat_history import save_chat_history
+
+LEGACY_CHAT = {
+    "title": "Legacy",
+    "messages": [
+        {"id": "m1", "role": "user", "agent_id": "user", "content": "Hello", "timestamp": "2023-01-01T00:00:00"},
+        {"id": "m2", "role": "assistant", "agent_id": "coder", "content": "Hi", "timestamp": "2023-01-01T00:00:01"},
+    ],
+}
+
+
+@pytest.fixture(autouse=True)
+def project_directory(project_directory: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    os.makedirs(project_directory / "chats")
+    return project_directory
+
+
+def _write_legacy_chat(project_directory: Path, chat_id: str) -> Path:
+    file_path = project_directory / "chats" / f"{chat_id}.json"
+    with open(file_path, "w") as f:
+        json.dump(LEGACY_CHAT, f)
+    os.utime(file_path, (1_700_000_000, 1_700_000_000))
+    return file_path
+
+
+@pytest.mark.asyncio
+async def test_should_migrate_chats_without_changing_how_they_load(project_directory: Path):
+    file_paths = [_write_legacy_chat(project_directory, f"chat{i}") for i in range(3)]
+    before = await load_chat_history("chat0")
+
+    report = migrate_chats(project_directory, workers=2)
+
+    assert (report.total, report.migrated, report.failed) == (3, 3, 0)
+    for file_path in file_paths:
+        with open(file_path) as f:
+            assert json.load(f)["schema_version"] == CHAT_SCHEMA_VERSION
+        assert os.path.getmtime(file_path) == 1_700_000_000
+
+    after = await load_chat_history("chat0")
+    assert after.model_dump() == before.model_dump()
+
+    assert migrate_chats(project_directory, workers=2).current == 3
+
+
+def test_should_list_files_which_failed_to_migrate(project_directory: Path):
+    _write_legacy_chat(project_directory, "chat")
+    broken = project_directory / "chats" / "broken.json"
+    broken.write_text("{")
+
+    report = migrate_chats(project_directory, workers=1)
+
+    assert (report.migrated, report.failed) == (1, 1)
+    assert report.failed_files == [broken]
+
+
+@pytest.mark.asyncio
+async def test_should_save_current_schema_version(project_directory: Path):
+    _write_legacy_chat(project_directory, "chat")
+
+    chat = await load_chat_history("chat")
+    save_chat_history(chat, scope="message_groups")
+
+    with open(project_directory / "chats" / "chat.json") as f:
+        assert json.load(f)["schema_version"] == CHAT_SCHEMA_VERSION
+
+    assert (await load_chat_history("chat")).model_dump(exclude={"last_modified"}) == chat.model_dump(
+        exclude={"last_modified"}
+    )
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from aiconsole.core.chat import locking
+from aiconsole.core.chat.locking import (
+    DefaultChatMutator,
+    SequentialChatMutator,
+    get_mutation_queue_depths,
+)
+
+
+def _sequential_mutator(chat_id: str) -> SequentialChatMutator:
+    return SequentialChatMutator(DefaultChatMutator(chat_id=chat_id, request_id="request", connection=None))
+
+
+@pytest.mark.asyncio
+async def test_should_run_submitted_work_in_fifo_order():
+    chat_mutator = _sequential_mutator("fifo")
+    order: list[int] = []
+
+    def append(i: int):
+        async def f():
+            await asyncio.sleep(0)
+            order.append(i)
+
+        return f
+
+    for i in range(100):
+        await chat_mutator.in_sequence(append(i))
+
+    assert get_mutation_queue_depths()["fifo"]["depth"] > 0
+
+    await chat_mutator.wait_for_all_mutations()
+
+    assert order == list(range(100))
+    assert get_mutation_queue_depths()["fifo"]["max_depth"] >= 100
+
+
+@pytest.mark.asyncio
+async def test_should_propagate_errors_to_the_submitter_only():
+    chat_mutator = _sequential_mutator("errors")
+
+    async def fail():
+        raise ValueError("boom")
+
+    failed = await chat_mutator.in_sequence(fail)
+
+    with pytest.raises(ValueError):
+        await failed
+
+    # The actor keeps working after a failure
+    await chat_mutator.wait_for_all_mutations()
+
+
+@pytest.mark.asyncio
+async def test_should_keep_running_queued_work_after_a_cancelled_one():
+    chat_mutator = _sequential_mutator("cancelled")
+
+    async def cancelled():
+        raise asyncio.CancelledError()
+
+    async def done():
+        return "done"
+
+    first = await chat_mutator.in_sequence(cancelled)
+    second = await chat_mutator.in_sequence(done)
+
+    assert await asyncio.wait_for(second, timeout=1) == "done"
+    assert first.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_should_cancel_queued_work_when_the_actor_is_cancelled():
+    chat_mutator = _sequential_mutator("stopped")
+    started = asyncio.Event()
+
+    async def block():
+        started.set()
+        await asyncio.Event().wait()
+
+    first = await chat_mutator.in_sequence(block)
+    second = await chat_mutator.in_sequence(block)
+    await started.wait()
+
+    worker = locking._mutation_actors["stopped"]._worker
+    assert worker is not None
+    worker.cancel()
+    await asyncio.sleep(0)
+
+    assert first.cancelled() and second.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_should_shut_down_actor_when_idle(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(locking, "mutation_actor_idle_timeout", 0.01)
+    chat_mutator = _sequential_mutator("idle")
+
+    await chat_mutator.wait_for_all_mutations()
+    assert "idle" in get_mutation_queue_depths()
+
+    await asyncio.sleep(0.1)
+    assert "idle" not in get_mutation_queue_depths()
+
+    # A new actor is started on demand
+    await chat_mutator.wait_for_all_mutations()
@@ -0,0 +1,99 @@
+from aiconsole.core.chat.apply_mutation import apply_mutation
+from aiconsole.core.chat.chat_mutations import (
+    AppendToCodeToolCallMutation,
+    AppendToContentMessageMutation,
+    AppendToOutputToolCallMutation,
+)
+from aiconsole.core.chat.types import AICMessage, AICMessageGroup, AICToolCall, Chat
+
+
+def _chat() -> Chat:
+    return Chat.model_validate(
+        {
+            "id": "chat",
+            "name": "",
+            "last_modified": "2024-01-01T00:00:00",
+            "message_groups": [
+                {
+                    "id": "g",
+                    "actor_id": {"type": "agent", "id": "agent"},
+                    "role": "assistant",
+                    "task": "",
+                    "materials_ids": [],
+                    "analysis": "",
+                    "messages": [
+                        {
+                            "id": "m",
+                            "timestamp": "",
+                            "content": "Hello",
+                            "tool_calls": [{"id": "t", "code": "print(", "headline": ""}],
+                        }
+                    ],
+                }
+            ],
+        }
+    )
+
+
+def test_should_dump_streamed_fields_as_plain_strings():
+    chat = _chat()
+
+    apply_mutation(chat, AppendToContentMessageMutation(message_id="m", content_delta=" world"))
+    apply_mutation(chat, AppendToCodeToolCallMutation(tool_call_id="t", code_delta="1)"))
+    apply_mutation(chat, AppendToOutputToolCallMutation(tool_call_id="t", output_delta="1\n"))
+    apply_mutation(chat, AppendToOutputToolCallMutation(tool_call_id="t", output_delta="2\n"))
+
+    message = chat.model_dump(mode="json")["message_groups"][0]["messages"][0]
+    assert message["content"] == "Hello world"
+    assert message["tool_calls"][0]["code"] == "print(1)"
+    assert message["tool_calls"][0]["output"] == "1\n2\n"
+
+    assert Chat.model_validate(chat.model_dump()).message_groups == chat.message_groups
+
+
+def test_should_construct_and_assign_by_public_names():
+    tool_call = AICToolCall(id="t", code="a", headline="")
+    assert tool_call.output is None
+    assert "output" in tool_call.model_dump() and tool_call.model_dump()["output"] is None
+
+    tool_call.output = "b"
+    tool_call.code = "c"
+    message = AICMessage(id="m", timestamp="", content="d", tool_calls=[tool_call])
+    message.content = "e"
+
+    group = AICMessageGroup(
+        id="g", actor_id={"type": "user", "id": "user"}, role="user", task="", materials_ids=[], analysis="", messages=[message]  # type: ignore
+    )
+    assert group.messages[0].content == "e"
+    assert group.messages[0].tool_calls[0].model_dump() == {
+        "id": "t",
+        "language": None,
+        "code": "c",
+        "headline": "",
+        "output": "b",
+        "is_streaming": False,
+        "is_executing": False,
+    }
+
+
+def test_should_keep_the_public_field_names_in_the_schema():
+    assert {"code", "output"} <= AICToolCall.model_json_schema()["properties"].keys()
+    assert "content" in AICMessage.model_json_schema()["properties"]
+    assert "content" in AICMessage.model_json_schema(by_alias=False)["properties"]
+
+
+def test_should_read_copy_and_replace_while_streaming():
+    chat = _chat()
+    message = chat.message_groups[0].messages[0]
+
+    apply_mutation(chat, AppendToContentMessageMutation(message_id="m", content_delta=" world"))
+    copied = message.model_copy()
+    apply_mutation(chat, AppendToContentMessageMutation(message_id="m", content_delta="!"))
+
+    assert copied.content == "Hello world"
+    assert message.content == "Hello world!"
+
+    apply_mutation(chat, AppendToContentMessageMutation(message_id="m", content_delta="?"))
+    message.content = "Replaced"
+    assert message.content == "Replaced"
+    assert message.model_dump()["content"] == "Replaced"
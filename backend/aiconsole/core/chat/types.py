@@ -18,18 +18,20 @@ from dataclasses import dataclass
 from datetime import datetime
 from typing import Optional
 
-from pydantic import BaseModel, Field, field_serializer
+from pydantic import BaseModel, Field, PrivateAttr, field_serializer
 
 from aiconsole.core.assets.types import EditableObject
 from aiconsole.core.chat.actor_id import ActorId
 from aiconsole.core.code_running.code_interpreters.language import LanguageStr
 from aiconsole.core.gpt.tool_definition import ToolDefinition
 from aiconsole.core.gpt.types import GPTRole
+from aiconsole.utils.text_buffer import StreamedTextModel
 
 
-class AICToolCall(BaseModel):
+class AICToolCall(StreamedTextModel):
     id: str
     language: LanguageStr | None = None
+    # code and output are streamed, see StreamedTextModel
     code: str
     headline: str
     output: str | None = None
@@ -38,9 +40,10 @@ class AICToolCall(BaseModel):
     is_executing: bool = False
 
 
-class AICMessage(BaseModel):
+class AICMessage(StreamedTextModel):
     id: str
     timestamp: str
+    # content is streamed, see StreamedTextModel
     content: str
     requested_format: ToolDefinition | None = None
     tool_calls: list[AICToolCall] = []
@@ -96,21 +99,115 @@ class Chat(ChatHeadline):
     chat_options: ChatOptions = Field(default_factory=ChatOptions)
     message_groups: list[AICMessageGroup]
     is_analysis_in_progress: bool = False
+    # Sequence number of the last journaled mutation reflected in this chat, see chat_journal
+    journal_seq: int = Field(default=0, exclude=True)
+
+    # id -> location index, built lazily on first lookup and then kept up to date by apply_mutation
+    _message_groups_index: dict[str, AICMessageGroup] | None = PrivateAttr(default=None)
+    _messages_index: dict[str, AICMessageLocation] | None = PrivateAttr(default=None)
+    _tool_calls_index: dict[str, AICToolCallLocation] | None = PrivateAttr(default=None)
 
     def get_message_group(self, message_group_id: str) -> AICMessageGroup | None:
+        self._ensure_index()
+        assert self._message_groups_index is not None
+        return self._message_groups_index.get(message_group_id)
+
+    def get_message_location(self, message_id: str) -> AICMessageLocation | None:
+        self._ensure_index()
+        assert self._messages_index is not None
+        return self._messages_index.get(message_id)
+
+    def get_tool_call_location(self, tool_call_id: str) -> AICToolCallLocation | None:
+        self._ensure_index()
+        assert self._tool_calls_index is not None
+        return self._tool_calls_index.get(tool_call_id)
+
+    def invalidate_index(self) -> None:
+        """
+        Drops the id index, it will be rebuilt on the next lookup.
+        Call this after modifying message_groups without going through apply_mutation.
+        """
+        self._message_groups_index = None
+        self._messages_index = None
+        self._tool_calls_index = None
+
+    def rebuild_index(self) -> None:
+        self._message_groups_index = {}
+        self._messages_index = {}
+        self._tool_calls_index = {}
+
+        for message_group in self.message_groups:
+            self.index_message_group(message_group)
+
+    def index_message_group(self, message_group: AICMessageGroup) -> None:
+        if self._message_groups_index is None:
+            return
+
+        self._message_groups_index.setdefault(message_group.id, message_group)
+
+        for message in message_group.messages:
+            self.index_message(message_group, message)
+
+    def index_message(self, message_group: AICMessageGroup, message: AICMessage) -> None:
+        if self._messages_index is None:
+            return
+
+        self._messages_index.setdefault(message.id, AICMessageLocation(message_group=message_group, message=message))
+
+        for tool_call in message.tool_calls:
+            self.index_tool_call(message_group, message, tool_call)
+
+    def index_tool_call(self, message_group: AICMessageGroup, message: AICMessage, tool_call: AICToolCall) -> None:
+        if self._tool_calls_index is None:
+            return
+
+        self._tool_calls_index.setdefault(
+            tool_call.id,
+            AICToolCallLocation(message_group=message_group, message=message, tool_call=tool_call),
+        )
+
+    def unindex_message_group(self, message_group: AICMessageGroup) -> None:
+        if self._message_groups_index is None:
+            return
+
+        self._message_groups_index.pop(message_group.id, None)
+
+        for message in message_group.messages:
+            self.unindex_message(message)
+
+    def unindex_message(self, message: AICMessage) -> None:
+        if self._messages_index is None:
+            return
+
+        self._messages_index.pop(message.id, None)
+
+        for tool_call in message.tool_calls:
+            self.unindex_tool_call(tool_call)
+
+    def unindex_tool_call(self, tool_call: AICToolCall) -> None:
+        if self._tool_calls_index is None:
+            return
+
+        self._tool_calls_index.pop(tool_call.id, None)
+
+    def _ensure_index(self) -> None:
+        if self._message_groups_index is None or self._messages_index is None or self._tool_calls_index is None:
+            self.rebuild_index()
+
+    def _scan_message_group(self, message_group_id: str) -> AICMessageGroup | None:
         for message_group in self.message_groups:
             if message_group.id == message_group_id:
                 return message_group
         return None
 
-    def get_message_location(self, message_id: str) -> AICMessageLocation | None:
+    def _scan_message_location(self, message_id: str) -> AICMessageLocation | None:
         for message_group in self.message_groups:
             for message in message_group.messages:
                 if message.id == message_id:
                     return AICMessageLocation(message_group=message_group, message=message)
         return None
 
-    def get_tool_call_location(self, tool_call_id: str) -> AICToolCallLocation | None:
+    def _scan_tool_call_location(self, tool_call_id: str) -> AICToolCallLocation | None:
         for message_group in self.message_groups:
             for message in message_group.messages:
                 for tool_call in message.tool_calls:
@@ -129,3 +226,20 @@ class Command(BaseModel):
 
 class ChatHeadlines(BaseModel):
     headlines: list[ChatHeadline]
+
+
+class ChatSearchResult(BaseModel):
+    chat_id: str
+    name: str
+    # Message group of the best matching part of the chat, None if it was the name
+    message_group_id: str | None
+    field: str
+    snippet: str
+    # [start, end) ranges of the matched words in the snippet
+    highlights: list[tuple[int, int]]
+    score: float
+
+
+class ChatSearchResults(BaseModel):
+    results: list[ChatSearchResult]
+    has_more: bool
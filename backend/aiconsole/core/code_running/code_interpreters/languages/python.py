@@ -52,6 +52,14 @@ from aiconsole_toolkit.env import get_current_project_venv_python_path
 
 _log = logging.getLogger(__name__)
 
+# Output format reported by the kernel listener -> media type of the output
+_OUTPUT_MEDIA_TYPES = {
+    "base64.png": "image/png",
+    "base64.jpeg": "image/jpeg",
+    "html": "text/html",
+    "javascript": "application/javascript",
+}
+
 
 async def start_new_async_kernel(
     startup_timeout: float = 60, kernel_name: str = "python", **kwargs: Any
@@ -220,13 +228,18 @@ matplotlib.use('{backend}')
         self.kc.execute(code)  # execute_interactive
 
     async def _capture_output(self, message_queue):
+        # Imported here, the blob store depends on project paths which import the code interpreters
+        from aiconsole.core.blobs.blob_store import externalize_output
+
         while True:
             if self.listener_thread:
                 try:
                     output = message_queue.get(timeout=0.1)
                     _log.debug("Output from queue: %s", output)
                     if content := output.get("content", None):
-                        yield content
+                        yield await externalize_output(
+                            content, _OUTPUT_MEDIA_TYPES.get(output.get("format"), "text/plain")
+                        )
                 except queue.Empty:
                     if self.finish_flag:
                         _log.debug("Finish flag is set, stopping output capture.")
@@ -0,0 +1,388 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Fits the messages of a GPTRequest to the context window of its model, instead of failing the request.
+
+Strategies are applied in order until the messages fit, each eliding the oldest messages first and never touching
+the system prompt or the last CONTEXT_KEEP_LAST_TURNS turns. If that is not enough, as for a long run of tool calls
+after a single user message, the strategies eliding outputs are applied again to the protected turns too, sparing only
+the results of the latest tool calls. Everything elided is listed in a ContextReport.
+Messages are measured with the memoized counts of token_counter, so fitting a request costs no encoding
+of messages seen before.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import TYPE_CHECKING, Callable, Protocol
+
+import tiktoken
+
+from aiconsole.consts import (
+    CONTEXT_KEEP_LAST_TURNS,
+    CONTEXT_STRATEGIES,
+    CONTEXT_TRUNCATED_OUTPUT_TOKENS,
+)
+from aiconsole.core.gpt.token_counter import (
+    LIST_OVERHEAD_TOKENS,
+    get_encoding,
+    token_counter,
+)
+from aiconsole.core.gpt.types import (
+    GPTRequestMessage,
+    GPTRequestTextMessage,
+    GPTRequestToolMessage,
+)
+
+if TYPE_CHECKING:
+    from aiconsole.core.gpt.request import GPTRequest
+
+ELIDED_OUTPUT = "[Output elided to fit the context window]"
+
+# Length of the lines of an old turn kept in its summary
+_SUMMARY_LINE_LENGTH = 200
+_MAX_CACHED_SUMMARIES = 1000
+
+
+@dataclass
+class Elision:
+    strategy: str
+    # Index of the message in the messages of the request
+    message_index: int
+    tokens_saved: int
+
+
+@dataclass
+class ContextReport:
+    budget: int
+    tokens_before: int
+    tokens_after: int = 0
+    elisions: list[Elision] = field(default_factory=list)
+
+    def __str__(self) -> str:
+        strategies: dict[str, int] = {}
+        for elision in self.elisions:
+            strategies[elision.strategy] = strategies.get(elision.strategy, 0) + 1
+
+        return f"{self.tokens_before} -> {self.tokens_after} tokens for a budget of {self.budget}, elided: " + (
+            ", ".join(f"{count} by {strategy}" for strategy, count in strategies.items()) or "nothing"
+        )
+
+
+class ContextWindow:
+    """
+    Messages being fitted to a budget. Strategies replace or remove (set to None) messages before protected_from,
+    or outputs before outputs_protected_from.
+    """
+
+    def __init__(
+        self, messages: list[GPTRequestMessage], budget: int, encoding: tiktoken.Encoding, keep_last_turns: int
+    ):
+        self.messages: list[GPTRequestMessage | None] = list(messages)
+        self.budget = budget
+        self.encoding = encoding
+        self.counts = [self.count(message) for message in messages]
+        self.total = sum(self.counts)
+        self.report = ContextReport(budget=budget, tokens_before=self.total)
+
+        turn_starts = self._turn_starts()
+        if keep_last_turns <= 0:
+            self.protected_from = len(self.messages)
+        elif keep_last_turns >= len(turn_starts):
+            self.protected_from = 0
+        else:
+            self.protected_from = turn_starts[-keep_last_turns]
+        self.outputs_protected_from = self.protected_from
+
+    @property
+    def fits(self) -> bool:
+        return self.total <= self.budget
+
+    def count(self, message: GPTRequestMessage) -> int:
+        return token_counter().count_message(self.encoding, message.model_dump(exclude_none=True))
+
+    def replace(self, index: int, message: GPTRequestMessage | None, strategy: str | None) -> None:
+        """
+        Replaces or removes the message, reported as elided by the strategy, if given.
+        """
+        count = self.count(message) if message is not None else 0
+        saved = self.counts[index] - count
+
+        self.messages[index] = message
+        self.counts[index] = count
+        self.total -= saved
+
+        if strategy is not None:
+            self.report.elisions.append(Elision(strategy=strategy, message_index=index, tokens_saved=saved))
+
+    def elidable_turns(self) -> list[range]:
+        """
+        Turns before the protected ones, oldest first. A turn starts with a user message.
+        """
+        starts = [start for start in self._turn_starts() if start < self.protected_from]
+        return [range(start, end) for start, end in zip(starts, [*starts[1:], self.protected_from])]
+
+    def latest_tool_results_start(self) -> int:
+        """
+        Index after the last message with tool calls, where the results of the latest tool calls start.
+        """
+        for index in range(len(self.messages) - 1, -1, -1):
+            message = self.messages[index]
+            if isinstance(message, GPTRequestTextMessage) and message.tool_calls:
+                return index + 1
+        return len(self.messages)
+
+    def _turn_starts(self) -> list[int]:
+        return [
+            index
+            for index, message in enumerate(self.messages)
+            if index == 0 or (message is not None and message.role == "user")
+        ]
+
+
+class ContextStrategy(Protocol):
+    name: str
+    # Elides only tool outputs, so it may be applied to protected turns as a last resort
+    elides_outputs: bool
+
+    def apply(self, window: ContextWindow) -> None:
+        """
+        Elides messages of the window, oldest first, until it fits.
+        """
+        ...
+
+
+class TruncateLongOutputs:
+    name = "truncate_outputs"
+    elides_outputs = True
+
+    def __init__(self, max_tokens: int = CONTEXT_TRUNCATED_OUTPUT_TOKENS):
+        self.max_tokens = max_tokens
+
+    def apply(self, window: ContextWindow) -> None:
+        for index in range(window.outputs_protected_from):
+            if window.fits:
+                return
+
+            message = window.messages[index]
+            if not isinstance(message, GPTRequestToolMessage) or not message.content:
+                continue
+            if window.counts[index] <= self.max_tokens:
+                continue
+
+            # Characters of the head and of the tail, estimated from the characters per token of the output
+            content = message.content
+            keep = len(content) * self.max_tokens // window.counts[index] // 2
+            if keep == 0:
+                continue
+            content = f"{content[:keep]}\n[... {len(content) - 2 * keep} characters elided ...]\n{content[-keep:]}"
+
+            window.replace(index, message.model_copy(update={"content": content}), self.name)
+
+
+class DropOldToolOutputs:
+    name = "drop_tool_outputs"
+    elides_outputs = True
+
+    def apply(self, window: ContextWindow) -> None:
+        for index in range(window.outputs_protected_from):
+            if window.fits:
+                return
+
+            message = window.messages[index]
+            if isinstance(message, GPTRequestToolMessage) and message.content != ELIDED_OUTPUT:
+                window.replace(index, message.model_copy(update={"content": ELIDED_OUTPUT}), self.name)
+
+
+class SummarizeOldTurns:
+    """
+    Replaces old turns with summaries from context_summaries, or with summaries made of the first line of
+    each of their messages, cached for the next requests.
+    """
+
+    name = "summarize_turns"
+    elides_outputs = False
+
+    def apply(self, window: ContextWindow) -> None:
+        for turn in window.elidable_turns():
+            if window.fits:
+                return
+
+            messages = [message for message in (window.messages[index] for index in turn) if message is not None]
+            if len(messages) <= 1:
+                continue  # nothing to gain, possibly summarized already
+
+            summary = context_summaries().get_or_summarize(messages)
+            summary_message = GPTRequestTextMessage(
+                role="system", content=f"Summary of {len(messages)} earlier messages:\n{summary}"
+            )
+
+            if window.count(summary_message) >= sum(window.counts[index] for index in turn):
+                continue
+
+            window.replace(turn.start, summary_message, self.name)
+            for index in turn[1:]:
+                if window.messages[index] is not None:
+                    window.replace(index, None, self.name)
+
+
+class DropOldTurns:
+    name = "drop_turns"
+    elides_outputs = False
+
+    def apply(self, window: ContextWindow) -> None:
+        turns = window.elidable_turns()
+        dropped = 0
+
+        for turn in turns:
+            if window.fits:
+                return
+
+            for index in turn:
+                if window.messages[index] is not None:
+                    window.replace(index, None, self.name)
+                    dropped += 1
+
+            # A single note in place of all the dropped turns
+            note = GPTRequestTextMessage(role="system", content=f"[{dropped} earlier messages elided]")
+            window.replace(turns[0].start, note, None)
+
+
+class ContextSummaries:
+    """
+    Summaries of turns, keyed by a digest of their messages. Summaries made elsewhere, e.g. by an LLM, can be put here.
+    """
+
+    def __init__(self, max_summaries: int = _MAX_CACHED_SUMMARIES):
+        self.max_summaries = max_summaries
+        self._summaries: OrderedDict[bytes, str] = OrderedDict()
+
+    @staticmethod
+    def key(messages: list[GPTRequestMessage]) -> bytes:
+        dump = json.dumps([message.model_dump(exclude_none=True) for message in messages])
+        return hashlib.blake2b(dump.encode("utf8", errors="replace"), digest_size=16).digest()
+
+    def put(self, messages: list[GPTRequestMessage], summary: str) -> None:
+        key = self.key(messages)
+        self._summaries[key] = summary
+        self._summaries.move_to_end(key)
+        if len(self._summaries) > self.max_summaries:
+            self._summaries.popitem(last=False)
+
+    def get_or_summarize(self, messages: list[GPTRequestMessage]) -> str:
+        summary = self._summaries.get(self.key(messages))
+        if summary is None:
+            summary = _first_lines_summary(messages)
+            self.put(messages, summary)
+        return summary
+
+
+@lru_cache
+def context_summaries() -> ContextSummaries:
+    return ContextSummaries()
+
+
+def _first_lines_summary(messages: list[GPTRequestMessage]) -> str:
+    lines = []
+
+    for message in messages:
+        if isinstance(message, GPTRequestToolMessage):
+            continue  # outputs are the first thing to go
+
+        speaker = f"{message.role} {message.name}" if message.name else message.role
+        text = (message.content or "").strip().split("\n", 1)[0]
+        if len(text) > _SUMMARY_LINE_LENGTH:
+            text = text[:_SUMMARY_LINE_LENGTH] + "..."
+
+        if message.tool_calls:
+            text += " (called " + ", ".join(tool_call.function.name for tool_call in message.tool_calls) + ")"
+
+        if text:
+            lines.append(f"- {speaker}: {text}")
+
+    return "\n".join(lines)
+
+
+class ContextBuilder:
+    def __init__(self, strategies: list[ContextStrategy], keep_last_turns: int = CONTEXT_KEEP_LAST_TURNS):
+        self.strategies = strategies
+        self.keep_last_turns = keep_last_turns
+
+    def fit(self, request: "GPTRequest", reserved_tokens: int) -> tuple[list[GPTRequestMessage], ContextReport]:
+        """
+        Returns the messages of the request fitted to leave reserved_tokens for the response, if the strategies can
+        make them fit, and the report of what was elided.
+        """
+        from aiconsole.core.gpt.request import EXTRA_BUFFER_FOR_ENCODING_OVERHEAD
+
+        model_config = request.model_config
+        encoding = get_encoding(model_config.encoding)
+        counter = token_counter()
+
+        fixed_tokens = (
+            counter.count_tools(encoding, [tool.model_dump() for tool in request.tools])
+            + LIST_OVERHEAD_TOKENS
+            + EXTRA_BUFFER_FOR_ENCODING_OVERHEAD
+        )
+        if request.system_message:
+            fixed_tokens += counter.count_message(
+                encoding,
+                GPTRequestTextMessage(role="system", content=request.system_message).model_dump(exclude_none=True),
+            )
+
+        window = ContextWindow(
+            request.messages,
+            budget=model_config.max_tokens - fixed_tokens - reserved_tokens,
+            encoding=encoding,
+            keep_last_turns=self.keep_last_turns,
+        )
+
+        for strategy in self.strategies:
+            if window.fits:
+                break
+            strategy.apply(window)
+
+        if not window.fits:
+            window.outputs_protected_from = max(window.protected_from, window.latest_tool_results_start())
+            for strategy in self.strategies:
+                if window.fits:
+                    break
+                if strategy.elides_outputs:
+                    strategy.apply(window)
+
+        window.report.tokens_after = window.total
+
+        return [message for message in window.messages if message is not None], window.report
+
+
+_STRATEGY_FACTORIES: dict[str, Callable[[], ContextStrategy]] = {
+    TruncateLongOutputs.name: TruncateLongOutputs,
+    DropOldToolOutputs.name: DropOldToolOutputs,
+    SummarizeOldTurns.name: SummarizeOldTurns,
+    DropOldTurns.name: DropOldTurns,
+}
+
+
+@lru_cache
+def context_builder() -> ContextBuilder:
+    unknown = [name for name in CONTEXT_STRATEGIES if name not in _STRATEGY_FACTORIES]
+    if unknown:
+        raise ValueError(
+            f"Unknown context strategies: {', '.join(unknown)}, available: {', '.join(_STRATEGY_FACTORIES)}"
+        )
+
+    return ContextBuilder([_STRATEGY_FACTORIES[name]() for name in CONTEXT_STRATEGIES])
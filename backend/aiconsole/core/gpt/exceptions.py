@@ -23,3 +23,16 @@ class NoOpenAPIKeyException(Exception):
             "Generate API keys in the OpenAI web interface. "
             "See https://platform.openai.com/account/api-keys for details."
         )
+
+
+class ResponseCacheMissError(Exception):
+    def __init__(self, key: str):
+        super().__init__(key)
+        self.key = key
+
+    def __str__(self):
+        return (
+            f"LLM response {self.key} is not cached. "
+            "LLM_RESPONSE_CACHE=replay only replays cached responses, "
+            "record them first with LLM_RESPONSE_CACHE=record."
+        )
@@ -24,10 +24,20 @@ from openai import AuthenticationError
 
 from aiconsole.api.websockets.connection_manager import connection_manager
 from aiconsole.api.websockets.server_messages import DebugJSONServerMessage
-from aiconsole.core.gpt.partial import GPTPartialResponse
+from aiconsole.consts import LLM_RESPONSE_CACHE, LLM_RESPONSE_CACHE_REPLAY_SPEED
+from aiconsole.core.gpt.partial import (
+    GPTPartialResponse,
+    chunk_from_dict,
+    chunk_to_dict,
+)
 from aiconsole.core.gpt.request import GPTRequest
+from aiconsole.core.gpt.response_cache import (
+    RecordedStream,
+    request_cache_key,
+    response_cache,
+)
 
-from .exceptions import NoOpenAPIKeyException
+from .exceptions import NoOpenAPIKeyException, ResponseCacheMissError
 from .types import CLEAR_STR, CLEAR_STR_TYPE, GPTChoice, GPTResponse, GPTResponseMessage
 
 _log = logging.getLogger(__name__)
@@ -68,21 +78,52 @@ class GPTExecutor:
         if request.tools:
             request_dict["tools"] = [tool.model_dump(exclude_none=True) for tool in request.tools]
 
+        cache = response_cache() if LLM_RESPONSE_CACHE != "off" else None
+        # Hashes the whole transcript, so only when the cache is on
+        cache_key = request_cache_key(request_dict) if cache else ""
+
+        if cache:
+            recorded = await asyncio.to_thread(cache.get, cache_key)
+
+            if recorded is not None:
+                _log.info(f"Replaying cached GPT response {cache_key}")
+                self.request = request_dict
+                self.partial_response = GPTPartialResponse()
+
+                async for chunk_dict in recorded.replay(LLM_RESPONSE_CACHE_REPLAY_SPEED):
+                    chunk = chunk_from_dict(chunk_dict)
+                    self.partial_response.apply_chunk(chunk)
+                    yield chunk
+                    await asyncio.sleep(0)
+
+                self.response = self.partial_response.to_final_response()
+                return
+
+            if LLM_RESPONSE_CACHE == "replay":
+                raise ResponseCacheMissError(cache_key)
+
         for attempt in range(3):
             try:
                 _log.info("Executing GPT request:", request_dict)
                 self.request = request_dict
-                response = await litellm.acompletion(**request_dict, stream=True)  # caching=True, ttl=60 * 60 * 24
+                recording = RecordedStream()
+                response = await litellm.acompletion(**request_dict, stream=True)
 
                 self.partial_response = GPTPartialResponse()
 
                 async for chunk in response:  # type: ignore
                     self.partial_response.apply_chunk(chunk)
+                    if cache:
+                        recording.append(chunk_to_dict(chunk))
                     yield chunk
                     await asyncio.sleep(0)
 
                 self.response = self.partial_response.to_final_response()
 
+                # Only complete responses are cached
+                if cache:
+                    await asyncio.to_thread(cache.put, cache_key, recording)
+
                 if _log.isEnabledFor(logging.DEBUG):
                     await connection_manager().send_to_all(
                         DebugJSONServerMessage(
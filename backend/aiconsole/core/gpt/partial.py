@@ -14,12 +14,13 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from dataclasses import dataclass, field
+
 from litellm import ModelResponse  # type: ignore
 from litellm.utils import Delta, StreamingChoices  # type: ignore
 from openai.types.chat.chat_completion_chunk import ChoiceDeltaToolCall
-from pydantic import BaseModel
 
-from aiconsole.core.gpt.parse_partial_json import parse_partial_json
+from aiconsole.core.gpt.partial_json_parser import PartialJSONParser
 from aiconsole.core.gpt.types import (
     GPTChoice,
     GPTFunctionCall,
@@ -29,32 +30,46 @@ from aiconsole.core.gpt.types import (
     GPTToolCall,
 )
 
+# The partial classes are plain slotted dataclasses rather than pydantic models, they are mutated on every streamed
+# chunk and only converted to the validated GPTResponse once the stream ends.
+
 
-class GPTPartialFunctionCall(BaseModel):
+@dataclass(slots=True)
+class GPTPartialFunctionCall:
     name: str = ""
-    arguments_builder: list[str] = []
+    arguments_builder: list[str] = field(default_factory=list)
+    _arguments_parser: PartialJSONParser = field(default_factory=PartialJSONParser, repr=False)
 
     @property
     def arguments(self) -> str:
         self.arguments_builder = ["".join(self.arguments_builder)]
         return self.arguments_builder[0]
 
+    def append_arguments(self, delta: str) -> None:
+        self.arguments_builder.append(delta)
+        self._arguments_parser.feed(delta)
+
     @property
     def arguments_dict(self) -> dict | None:
-        return parse_partial_json(self.arguments)
+        """
+        Parsed so far, updated in place as arguments are appended.
+        """
+        return self._arguments_parser.value
 
 
-class GPTPartialToolsCall(BaseModel):
+@dataclass(slots=True)
+class GPTPartialToolsCall:
     id: str = ""
     type: str = ""
-    function: GPTPartialFunctionCall = GPTPartialFunctionCall()
+    function: GPTPartialFunctionCall = field(default_factory=GPTPartialFunctionCall)
 
 
-class GPTPartialMessage(BaseModel):
+@dataclass(slots=True)
+class GPTPartialMessage:
     role: GPTRole | None = None
     content_builder: list[str] | None = None
 
-    tool_calls: list[GPTPartialToolsCall] = []
+    tool_calls: list[GPTPartialToolsCall] = field(default_factory=list)
     name: str | None = None
 
     @property
@@ -66,19 +81,21 @@ class GPTPartialMessage(BaseModel):
         return self.content_builder[0]
 
 
-class GPTPartialChoice(BaseModel):
+@dataclass(slots=True)
+class GPTPartialChoice:
     index: int = 0
-    message: GPTPartialMessage = GPTPartialMessage()
+    message: GPTPartialMessage = field(default_factory=GPTPartialMessage)
     role: str = ""
     finnish_reason: str = ""
 
 
-class GPTPartialResponse(BaseModel):
+@dataclass(slots=True)
+class GPTPartialResponse:
     id: str = ""
     object: str = ""
     created: int = 0
     model: str = ""
-    choices: list[GPTPartialChoice] = []
+    choices: list[GPTPartialChoice] = field(default_factory=list)
 
     def to_final_response(self):
         return GPTResponse(
@@ -161,23 +178,64 @@ class GPTPartialResponse(BaseModel):
                                 chunk_tool_function = tool_call.function
 
                                 if chunk_tool_function:
-                                    while len(message.tool_calls) < chunk_tool_index + 1 and tool_call.id:
-                                        message.tool_calls.append(
-                                            GPTPartialToolsCall(
-                                                id=tool_call.id,
-                                            )
-                                        )
+                                    tool_calls = message.tool_calls
+                                    while len(tool_calls) < chunk_tool_index + 1 and tool_call.id:
+                                        tool_calls.append(GPTPartialToolsCall(id=tool_call.id))
+
+                                    partial_tool_call = tool_calls[chunk_tool_index]
 
                                     if tool_call.type:
-                                        message.tool_calls[chunk_tool_index].type = tool_call.type
-
-                                    if chunk_tool_function:
-                                        if chunk_tool_function.name is not None:
-                                            message.tool_calls[
-                                                chunk_tool_index
-                                            ].function.name = chunk_tool_function.name
-
-                                        if chunk_tool_function.arguments is not None:
-                                            message.tool_calls[chunk_tool_index].function.arguments_builder.append(
-                                                chunk_tool_function.arguments
-                                            )
+                                        partial_tool_call.type = tool_call.type
+
+                                    if chunk_tool_function.name is not None:
+                                        partial_tool_call.function.name = chunk_tool_function.name
+
+                                    if chunk_tool_function.arguments is not None:
+                                        partial_tool_call.function.append_arguments(chunk_tool_function.arguments)
+
+
+def chunk_to_dict(chunk: ModelResponse) -> dict:
+    """
+    Plain data of a streamed chunk, the parts apply_chunk reads, see chunk_from_dict.
+    """
+    choices = []
+    for choice in chunk.choices or []:
+        delta: dict = {}
+
+        if isinstance(choice, StreamingChoices):
+            for key in ("role", "content", "name"):
+                if choice.delta.get(key) is not None:
+                    delta[key] = choice.delta[key]
+
+            tool_calls = choice.delta.get("tool_calls")
+            if tool_calls:
+                delta["tool_calls"] = [
+                    tool_call.model_dump(exclude_none=True)
+                    for tool_call in tool_calls
+                    if isinstance(tool_call, ChoiceDeltaToolCall)
+                ]
+
+        choices.append({"index": choice.index, "finish_reason": choice.finish_reason, "delta": delta})
+
+    return {"id": chunk.id, "created": chunk.created, "model": chunk.model, "choices": choices}
+
+
+def chunk_from_dict(chunk_dict: dict) -> ModelResponse:
+    chunk = ModelResponse(id=chunk_dict["id"], created=chunk_dict["created"], model=chunk_dict["model"], stream=True)
+    choices = []
+
+    for choice in chunk_dict["choices"]:
+        delta = dict(choice.get("delta") or {})
+        if delta.get("tool_calls"):
+            delta["tool_calls"] = [ChoiceDeltaToolCall.model_validate(tool_call) for tool_call in delta["tool_calls"]]
+
+        choices.append(
+            StreamingChoices(
+                index=choice.get("index", 0),
+                finish_reason=choice.get("finish_reason"),
+                delta=Delta(**delta),
+            )
+        )
+
+    chunk.choices = choices
+    return chunk
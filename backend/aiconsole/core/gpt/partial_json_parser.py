@@ -0,0 +1,296 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Incremental parser of JSON streamed in chunks, like the arguments of a tool call. Unlike parse_partial_json,
+which parses the whole text again for every chunk, it keeps its state between chunks, so each chunk is scanned once.
+
+The partial value has unterminated strings and containers closed, and leaves out keys and literals which are
+not complete yet. The value is updated in place, the runs of text inside strings, which is most of the arguments
+of a tool call, are found with a regex instead of a character at a time.
+"""
+import json
+import re
+from typing import Any
+
+from aiconsole.core.gpt.parse_partial_json import parse_partial_json
+
+_VALUE = 0
+_VALUE_OR_END = 1
+_KEY = 2
+_KEY_OR_END = 3
+_COLON = 4
+_AFTER_VALUE = 5
+_STRING = 6
+_LITERAL = 7
+_DONE = 8
+
+_WHITESPACE = " \t\n\r"
+_STRING_SPECIAL = re.compile(r'["\\]')
+_LITERAL_END = re.compile(r"[\s,\]}]")
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+# Location of a value, container and key or index, None for the top level value
+_Target = tuple[dict | list, Any] | None
+
+
+class PartialJSONParser:
+    def __init__(self):
+        self._text: list[str] = []
+        self._state = _VALUE
+        self._stack: list[dict | list] = []
+        # Key being filled of every object on the stack
+        self._keys: list[Any] = []
+        self._root: Any = None
+        # Unprocessed end of the last chunk, an incomplete escape sequence
+        self._carry = ""
+
+        self._string: list[str] = []
+        self._string_target: _Target | str = ""  # "" while reading a key
+        self._string_changed = False
+        self._literal: list[str] = []
+
+        # Not JSON, the value falls back to parse_partial_json of the whole text
+        self._failed = False
+
+    @property
+    def text(self) -> str:
+        self._text = ["".join(self._text)]
+        return self._text[0]
+
+    @property
+    def value(self) -> Any:
+        if self._failed:
+            return parse_partial_json(self.text)
+
+        if self._state == _STRING and self._string_changed and self._string_target != "":
+            self._string = ["".join(self._string)]
+            self._set(self._string_target, self._string[0])  # type: ignore
+            self._string_changed = False
+
+        if self._state == _LITERAL and not self._stack:
+            try:
+                return json.loads("".join(self._literal))
+            except ValueError:
+                return None
+
+        return self._root
+
+    def feed(self, chunk: str) -> None:
+        self._text.append(chunk)
+
+        if self._failed:
+            return
+
+        text = self._carry + chunk
+        self._carry = ""
+
+        try:
+            self._scan(text)
+        except ValueError:
+            self._failed = True
+
+    def _scan(self, text: str) -> None:
+        i = 0
+        n = len(text)
+
+        while i < n:
+            state = self._state
+
+            if state == _STRING:
+                match = _STRING_SPECIAL.search(text, i)
+                end = match.start() if match is not None else n
+
+                if end > i:
+                    self._string.append(text[i:end])
+                    self._string_changed = True
+
+                if match is None:
+                    return
+
+                if text[end] == '"':
+                    self._end_string()
+                    i = end + 1
+                    continue
+
+                decoded, length = _decode_escape(text, end)
+                if decoded is None:
+                    self._carry = text[end:]
+                    return
+
+                self._string.append(decoded)
+                self._string_changed = True
+                i = end + length
+                continue
+
+            if state == _LITERAL:
+                match = _LITERAL_END.search(text, i)
+                end = match.start() if match is not None else n
+                self._literal.append(text[i:end])
+
+                if match is None:
+                    return
+
+                self._end_literal()
+                i = end
+                continue
+
+            char = text[i]
+            i += 1
+
+            if char in _WHITESPACE:
+                continue
+
+            if state == _VALUE or state == _VALUE_OR_END:
+                if char == "]" and state == _VALUE_OR_END:
+                    self._close(list)
+                else:
+                    self._start_value(char)
+            elif state == _KEY or state == _KEY_OR_END:
+                if char == "}" and state == _KEY_OR_END:
+                    self._close(dict)
+                elif char == '"':
+                    self._string = []
+                    self._string_target = ""
+                    self._state = _STRING
+                else:
+                    raise ValueError(f"Expected a key, got {char!r}")
+            elif state == _COLON:
+                if char != ":":
+                    raise ValueError(f"Expected ':', got {char!r}")
+                self._state = _VALUE
+            elif state == _AFTER_VALUE:
+                top = self._stack[-1]
+                if char == ",":
+                    self._state = _KEY if isinstance(top, dict) else _VALUE
+                elif char == "}":
+                    self._close(dict)
+                elif char == "]":
+                    self._close(list)
+                else:
+                    raise ValueError(f"Expected ',' or the end of a container, got {char!r}")
+            else:
+                raise ValueError(f"Unexpected {char!r} after the end of the value")
+
+    def _start_value(self, char: str) -> None:
+        if char == "{":
+            self._attach({})
+            self._state = _KEY_OR_END
+        elif char == "[":
+            self._attach([])
+            self._state = _VALUE_OR_END
+        elif char == '"':
+            self._string = []
+            self._string_target = self._attach("")
+            self._string_changed = False
+            self._state = _STRING
+        elif char in "}],:":
+            raise ValueError(f"Expected a value, got {char!r}")
+        else:
+            self._literal = [char]
+            self._state = _LITERAL
+
+    def _attach(self, value: Any) -> _Target:
+        """
+        Puts the value in its place in the current container, containers are pushed on the stack.
+        """
+        target: _Target = None
+
+        if not self._stack:
+            self._root = value
+        else:
+            top = self._stack[-1]
+            if isinstance(top, dict):
+                top[self._keys[-1]] = value
+                target = (top, self._keys[-1])
+            else:
+                top.append(value)
+                target = (top, len(top) - 1)
+
+        if isinstance(value, (dict, list)):
+            self._stack.append(value)
+            self._keys.append(None)
+
+        return target
+
+    def _set(self, target: _Target, value: Any) -> None:
+        if target is None:
+            self._root = value
+        else:
+            container, key = target
+            container[key] = value
+
+    def _close(self, container_type: type) -> None:
+        if not isinstance(self._stack[-1], container_type):
+            raise ValueError("Mismatched end of a container")
+
+        self._stack.pop()
+        self._keys.pop()
+        self._end_value()
+
+    def _end_value(self) -> None:
+        self._state = _AFTER_VALUE if self._stack else _DONE
+
+    def _end_string(self) -> None:
+        value = "".join(self._string)
+        self._string = []
+
+        if self._string_target == "":
+            self._keys[-1] = value
+            self._state = _COLON
+        else:
+            self._set(self._string_target, value)  # type: ignore
+            self._end_value()
+
+    def _end_literal(self) -> None:
+        value = json.loads("".join(self._literal))
+        self._literal = []
+        self._attach(value)
+        self._end_value()
+
+
+def _decode_escape(text: str, start: int) -> tuple[str | None, int]:
+    """
+    Decodes the escape sequence starting with the backslash at start, returns None if it is not complete yet.
+    """
+    if start + 1 >= len(text):
+        return None, 0
+
+    char = text[start + 1]
+    if char != "u":
+        if char not in _ESCAPES:
+            raise ValueError(f"Invalid escape sequence \\{char}")
+        return _ESCAPES[char], 2
+
+    digits = text[start + 2 : start + 6]
+    if len(digits) < 4:
+        return None, 0
+    code = int(digits, 16)
+
+    # A high surrogate is combined with the low one which follows it, like json.loads does
+    if 0xD800 <= code <= 0xDBFF:
+        tail = text[start + 6 : start + 12]
+        if len(tail) < 6 and "\\u".startswith(tail[:2]):
+            return None, 0
+
+        if tail.startswith("\\u"):
+            try:
+                low = int(tail[2:], 16)
+            except ValueError:
+                low = 0
+            if 0xDC00 <= low <= 0xDFFF:
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+
+    return chr(code), 6
@@ -16,11 +16,10 @@
 
 import json
 import logging
-from typing import Literal
-
-import tiktoken
+from typing import TYPE_CHECKING, Literal
 
 from aiconsole.core.gpt.consts import GPTMode
+from aiconsole.core.gpt.token_counter import get_encoding, token_counter
 from aiconsole.core.gpt.token_error import TokenError
 from aiconsole.core.gpt.tool_definition import ToolDefinition
 from aiconsole.core.gpt.types import (
@@ -31,6 +30,9 @@ from aiconsole.core.gpt.types import (
 from aiconsole.core.settings.settings import settings
 from aiconsole_toolkit.settings.settings_data import REFERENCE_TO_GLOBAL_OPENAI_KEY
 
+if TYPE_CHECKING:
+    from aiconsole.core.gpt.context_builder import ContextBuilder, ContextReport
+
 _log = logging.getLogger(__name__)
 
 EXTRA_BUFFER_FOR_ENCODING_OVERHEAD = 50
@@ -48,6 +50,7 @@ class GPTRequest:
         presence_penalty: float = 0,
         min_tokens: int = 0,
         preferred_tokens: int = 0,
+        context_builder: "ContextBuilder | None" = None,
     ):
         self.system_message = system_message
         self.messages = messages
@@ -57,6 +60,13 @@ class GPTRequest:
         self.gpt_mode = gpt_mode
         self.presence_penalty = presence_penalty
         self.max_tokens = 0
+        self.context_report: "ContextReport | None" = None
+
+        if context_builder is not None:
+            # Elides old messages which would not leave room for the preferred response
+            self.messages, self.context_report = context_builder.fit(self, max(min_tokens, preferred_tokens))
+            if self.context_report.elisions:
+                _log.info(f"Fitted request to the context window: {self.context_report}")
 
         # Checks if the given prompt can fit within a specified range of token lengths for the specified AI model.
 
@@ -122,26 +132,21 @@ class GPTRequest:
         return mode_config
 
     def count_tokens(self):
-        encoding = tiktoken.encoding_for_model(self.model_config.encoding)
+        encoding = get_encoding(self.model_config.encoding)
 
-        if self.tools:
-            functions_tokens = len(encoding.encode(",".join(json.dumps(f.model_dump()) for f in self.tools)))
-        else:
-            functions_tokens = 0
+        functions_tokens = token_counter().count_tools(encoding, [f.model_dump() for f in self.tools])
         return self.count_messages_tokens(encoding) + functions_tokens
 
     def count_tokens_for_model(self, model):
-        encoding = tiktoken.encoding_for_model(self.model_config.encoding)
+        encoding = get_encoding(self.model_config.encoding)
         return self.count_messages_tokens(encoding)
 
     def count_messages_tokens(self, encoding):
-        messages_str = json.dumps(self.get_messages_dump())
-        messages_tokens = len(encoding.encode(messages_str))
-
-        return messages_tokens
+        # Counts of messages already seen in earlier requests are reused, see token_counter
+        return token_counter().count_messages(encoding, self.get_messages_dump())
 
     def count_tokens_output(self, message_content: str, message_function_call: dict | None):
-        encoding = tiktoken.encoding_for_model(self.model_config.encoding)
+        encoding = get_encoding(self.model_config.encoding)
 
         return len(encoding.encode(message_content)) + (
             len(encoding.encode(json.dumps(message_function_call))) if message_function_call else 0
@@ -0,0 +1,202 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Project disk cache of streamed LLM responses, for regression suites and prompts that are repeated.
+
+A response is keyed by a hash of the parts of the request that determine it and stored in .aic/llm_cache as JSON lines,
+a header and then every chunk with its offset from the start of the request, so it can be replayed with the recorded
+timing or faster. Entries expire after a TTL counted from when they were recorded (the file mtime) and the least
+recently replayed ones (the file atime) are evicted when the cache grows above its size limit.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncGenerator
+
+from aiconsole.consts import (
+    LLM_RESPONSE_CACHE_MAX_BYTES,
+    LLM_RESPONSE_CACHE_TTL_SECONDS,
+)
+from aiconsole.core.chat.chat_storage import write_atomically
+from aiconsole.core.project.paths import get_aic_directory
+
+_log = logging.getLogger(__name__)
+
+_FORMAT_VERSION = 1
+
+# Parts of a request that determine the response, credentials and settings like api_base are left out
+_KEY_FIELDS = ("model", "messages", "tools", "tool_choice", "temperature")
+
+
+def request_cache_key(request_dict: dict[str, Any]) -> str:
+    keyed = {name: request_dict.get(name) for name in _KEY_FIELDS}
+    serialized = json.dumps(keyed, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(serialized.encode("utf8")).hexdigest()
+
+
+@dataclass
+class RecordedStream:
+    """
+    Chunks of a streamed response, as dicts, with their offsets in seconds from the start of the request.
+    """
+
+    chunks: list[dict] = field(default_factory=list)
+    offsets: list[float] = field(default_factory=list)
+    _started: float = field(default_factory=time.monotonic, repr=False)
+
+    def append(self, chunk: dict) -> None:
+        self.chunks.append(chunk)
+        self.offsets.append(time.monotonic() - self._started)
+
+    async def replay(self, speed: float = 0) -> AsyncGenerator[dict, None]:
+        """
+        Yields the chunks with the recorded delays divided by speed, or without delays for a speed of 0.
+        """
+        previous_offset = 0.0
+        for offset, chunk in zip(self.offsets, self.chunks):
+            if speed > 0 and offset > previous_offset:
+                await asyncio.sleep((offset - previous_offset) / speed)
+            previous_offset = offset
+            yield chunk
+
+    def dumps(self, key: str) -> bytes:
+        lines = [json.dumps({"version": _FORMAT_VERSION, "key": key, "chunks": len(self.chunks)})]
+        lines.extend(
+            json.dumps({"offset": round(offset, 4), "chunk": chunk})
+            for offset, chunk in zip(self.offsets, self.chunks)
+        )
+        return ("\n".join(lines) + "\n").encode("utf8")
+
+    @classmethod
+    def loads(cls, data: bytes) -> "RecordedStream":
+        header, *lines = data.decode("utf8").splitlines()
+        if json.loads(header).get("version") != _FORMAT_VERSION:
+            raise ValueError("Unsupported response cache format")
+
+        stream = cls()
+        for line in lines:
+            record = json.loads(line)
+            stream.chunks.append(record["chunk"])
+            stream.offsets.append(record["offset"])
+        return stream
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        directory: Path,
+        ttl_seconds: float = LLM_RESPONSE_CACHE_TTL_SECONDS,
+        max_bytes: int = LLM_RESPONSE_CACHE_MAX_BYTES,
+    ):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> RecordedStream | None:
+        file_path = self._file_path(key)
+
+        try:
+            stat = file_path.stat()
+            if self._is_expired(stat.st_mtime, time.time()):
+                file_path.unlink(missing_ok=True)
+                self.misses += 1
+                return None
+            stream = RecordedStream.loads(file_path.read_bytes())
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, KeyError) as error:
+            _log.warning(f"Dropping unreadable cached response {key}: {error}")
+            file_path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+
+        # Marks the entry as recently used, keeping the mtime the TTL is counted from
+        os.utime(file_path, (time.time(), stat.st_mtime))
+        self.hits += 1
+        return stream
+
+    def put(self, key: str, stream: RecordedStream) -> None:
+        file_path = self._file_path(key)
+        os.makedirs(file_path.parent, exist_ok=True)
+        write_atomically(file_path, stream.dumps(key))
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes expired entries, then the least recently used ones until the cache fits in max_bytes.
+
+        Scans the cache directory, which is cheap next to the LLM request that a put follows.
+        """
+        with self._lock:
+            now = time.time()
+            entries: list[tuple[float, int, Path]] = []
+            total_bytes = 0
+
+            for file_path in self.directory.glob("*/*.jsonl"):
+                try:
+                    stat = file_path.stat()
+                except FileNotFoundError:
+                    continue
+
+                if self._is_expired(stat.st_mtime, now):
+                    file_path.unlink(missing_ok=True)
+                    continue
+
+                entries.append((stat.st_atime, stat.st_size, file_path))
+                total_bytes += stat.st_size
+
+            if total_bytes <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _, size, file_path in entries:
+                if total_bytes <= self.max_bytes:
+                    break
+                file_path.unlink(missing_ok=True)
+                total_bytes -= size
+
+            _log.debug(f"Evicted cached responses down to {total_bytes} bytes")
+
+    def _is_expired(self, recorded_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - recorded_at > self.ttl_seconds
+
+    def _file_path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.jsonl"
+
+
+def get_response_cache_directory(project_path: Path | None = None) -> Path:
+    return get_aic_directory(project_path) / "llm_cache"
+
+
+def response_cache() -> ResponseCache:
+    return _response_cache(get_response_cache_directory())
+
+
+@lru_cache
+def _response_cache(directory: Path) -> ResponseCache:
+    return ResponseCache(directory)
@@ -0,0 +1,120 @@
+from types import SimpleNamespace
+
+import pytest
+import tiktoken
+
+from aiconsole.core.gpt import context_builder as context_builder_module
+from aiconsole.core.gpt.context_builder import (
+    ELIDED_OUTPUT,
+    ContextBuilder,
+    DropOldToolOutputs,
+    DropOldTurns,
+    SummarizeOldTurns,
+    TruncateLongOutputs,
+    context_summaries,
+)
+from aiconsole.core.gpt.types import (
+    GPTFunctionCall,
+    GPTModeConfig,
+    GPTRequestMessage,
+    GPTRequestTextMessage,
+    GPTRequestToolMessage,
+    GPTToolCall,
+)
+
+
+@pytest.fixture(autouse=True)
+def encoding(monkeypatch: pytest.MonkeyPatch) -> tiktoken.Encoding:
+    # Every byte is a token, the real encodings have to be downloaded
+    encoding = tiktoken.Encoding(
+        name="bytes", pat_str=r"\S+|\s+", mergeable_ranks={bytes([i]): i for i in range(256)}, special_tokens={}
+    )
+    monkeypatch.setattr(context_builder_module, "get_encoding", lambda model: encoding)
+    return encoding
+
+
+def _turn(i: int, output: str) -> list[GPTRequestMessage]:
+    return [
+        GPTRequestTextMessage(role="user", content=f"Question {i}"),
+        GPTRequestTextMessage(
+            role="assistant",
+            content=f"Answer {i}",
+            tool_calls=[GPTToolCall(id=f"t{i}", function=GPTFunctionCall(name="python", arguments="{}"))],
+        ),
+        GPTRequestToolMessage(tool_call_id=f"t{i}", content=output),
+    ]
+
+
+def _request(messages: list[GPTRequestMessage], max_tokens: int) -> SimpleNamespace:
+    return SimpleNamespace(
+        system_message="You are a helpful assistant.",
+        messages=messages,
+        tools=[],
+        model_config=GPTModeConfig(max_tokens=max_tokens),
+    )
+
+
+def _builder() -> ContextBuilder:
+    return ContextBuilder(
+        [TruncateLongOutputs(max_tokens=100), DropOldToolOutputs(), SummarizeOldTurns(), DropOldTurns()],
+        keep_last_turns=2,
+    )
+
+
+def test_should_leave_fitting_requests_alone():
+    messages = [*_turn(0, "out"), *_turn(1, "out")]
+
+    fitted, report = _builder().fit(_request(messages, max_tokens=10_000), reserved_tokens=100)  # type: ignore
+
+    assert fitted == messages
+    assert report.elisions == []
+    assert report.tokens_after == report.tokens_before
+
+
+def test_should_truncate_old_outputs_first_and_keep_last_turns():
+    messages = [*_turn(0, "a" * 5000), *_turn(1, "b" * 5000), *_turn(2, "c" * 5000)]
+
+    fitted, report = _builder().fit(_request(messages, max_tokens=12_000), reserved_tokens=100)  # type: ignore
+
+    assert [elision.strategy for elision in report.elisions] == ["truncate_outputs"]
+    assert report.tokens_after <= report.budget
+    assert fitted[2].content.startswith("aaa") and "characters elided" in fitted[2].content  # type: ignore
+    assert fitted[3:] == messages[3:]
+
+
+def test_should_summarize_and_drop_old_turns_when_outputs_are_not_enough():
+    messages = [message for i in range(20) for message in _turn(i, "x" * 50)]
+
+    fitted, report = _builder().fit(_request(messages, max_tokens=1500), reserved_tokens=100)  # type: ignore
+
+    strategies = {elision.strategy for elision in report.elisions}
+    assert {"drop_tool_outputs", "summarize_turns"} <= strategies
+    assert report.tokens_after <= report.budget
+    assert fitted[-6:] == messages[-6:]
+    assert all(message.content == ELIDED_OUTPUT for message in fitted[:-6] if message.role == "tool")
+
+
+def test_should_use_cached_summaries():
+    messages = [*_turn(0, "x" * 2000), *_turn(1, "out"), *_turn(2, "out")]
+    context_summaries().put(messages[:3], "Asked a question, got an answer")
+
+    fitted, report = ContextBuilder([SummarizeOldTurns()], keep_last_turns=2).fit(
+        _request(messages, max_tokens=1000), reserved_tokens=100  # type: ignore
+    )
+
+    assert fitted[0].content == "Summary of 3 earlier messages:\nAsked a question, got an answer"
+    assert fitted[1:] == messages[3:]
+
+
+def test_should_elide_outputs_of_a_long_run_after_a_single_user_message():
+    messages: list[GPTRequestMessage] = [GPTRequestTextMessage(role="user", content="Build the project")]
+    for i in range(30):
+        messages += _turn(i, "x" * 2000)[1:]
+
+    fitted, report = _builder().fit(_request(messages, max_tokens=12_000), reserved_tokens=100)  # type: ignore
+
+    assert "truncate_outputs" in {elision.strategy for elision in report.elisions}
+    assert {elision.strategy for elision in report.elisions} <= {"truncate_outputs", "drop_tool_outputs"}
+    assert report.tokens_after <= report.budget
+    assert fitted[0] == messages[0]
+    assert fitted[-2:] == messages[-2:]
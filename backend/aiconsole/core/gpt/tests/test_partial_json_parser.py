@@ -0,0 +1,80 @@
+import copy
+import json
+import random
+
+import pytest
+
+from aiconsole.core.gpt import partial_json_parser
+from aiconsole.core.gpt.parse_partial_json import parse_partial_json
+from aiconsole.core.gpt.partial_json_parser import PartialJSONParser
+
+DOCUMENTS = [
+    {"code": 'print("Hello\\nworld")\nfor i in range(10):\n\tprint(i)', "headline": "Printing numbers"},
+    {"thinking_process": "Let me think", "next_step": "Write code", "relevant_material_ids": ["a", "b"]},
+    {"nested": {"list": [1, 2.5, -3e2, True, False, None, {"x": []}], "empty": {}}, "emoji": "😀 é \u0001"},
+    [],
+    "just a string",
+]
+
+
+def _feed_in_chunks(text: str, seed: int) -> PartialJSONParser:
+    rng = random.Random(seed)
+    parser = PartialJSONParser()
+    i = 0
+    while i < len(text):
+        size = rng.randint(1, 7)
+        parser.feed(text[i : i + size])
+        i += size
+    return parser
+
+
+@pytest.mark.parametrize("document", DOCUMENTS)
+@pytest.mark.parametrize("ensure_ascii", [True, False])
+def test_should_parse_chunked_documents(document, ensure_ascii: bool):
+    text = json.dumps(document, ensure_ascii=ensure_ascii, indent=1 if isinstance(document, dict) else None)
+
+    for seed in range(20):
+        assert _feed_in_chunks(text, seed).value == document
+
+
+@pytest.mark.parametrize("document", DOCUMENTS[:3])
+def test_should_match_parse_partial_json_on_every_prefix(document):
+    text = json.dumps(document)
+    parser = PartialJSONParser()
+
+    for i, char in enumerate(text):
+        parser.feed(char)
+        expected = parse_partial_json(text[: i + 1])
+
+        # Incomplete literals are left out instead of failing the whole value, escapes are decoded once complete
+        if expected is not None and parser._state != partial_json_parser._LITERAL and not parser._carry:
+            assert parser.value == expected, text[: i + 1]
+
+
+def test_should_stream_string_values_with_raw_newlines():
+    parser = PartialJSONParser()
+    values = []
+
+    for chunk in ['{"code": "a', "\nb\\", "n", "c", "\\u00e9", '"', ', "headline": "H']:
+        parser.feed(chunk)
+        # The value is updated in place
+        values.append(copy.deepcopy(parser.value))
+
+    assert [value["code"] for value in values] == [
+        "a",
+        "a\nb",
+        "a\nb\n",
+        "a\nb\nc",
+        "a\nb\ncé",
+        "a\nb\ncé",
+        "a\nb\ncé",
+    ]
+    assert values[-1] == {"code": "a\nb\ncé", "headline": "H"}
+
+
+def test_should_fall_back_to_parse_partial_json_for_other_text():
+    parser = PartialJSONParser()
+    parser.feed("print(1)")
+
+    assert parser.value is None
+    assert parser.text == "print(1)"
@@ -0,0 +1,109 @@
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from aiconsole.core.gpt.response_cache import (
+    RecordedStream,
+    ResponseCache,
+    request_cache_key,
+)
+
+
+def _request(**overrides) -> dict:
+    return {
+        "model": "gpt-4-1106-preview",
+        "messages": [{"role": "user", "content": "Hello"}],
+        "temperature": 0.2,
+        "api_key": "sk-1",
+        **overrides,
+    }
+
+
+def _stream(*contents: str) -> RecordedStream:
+    stream = RecordedStream()
+    for content in contents:
+        stream.append(
+            {"id": "1", "created": 0, "model": "gpt-4", "choices": [{"index": 0, "delta": {"content": content}}]}
+        )
+    return stream
+
+
+def test_key_should_depend_only_on_what_determines_the_response():
+    key = request_cache_key(_request())
+
+    assert request_cache_key(_request(api_key="sk-2", api_base="http://localhost")) == key
+    assert request_cache_key(dict(reversed(_request().items()))) == key
+    assert request_cache_key(_request(temperature=0.7)) != key
+    assert request_cache_key(_request(tool_choice={"type": "function", "function": {"name": "python"}})) != key
+    assert request_cache_key(_request(messages=[{"role": "user", "content": "Hi"}])) != key
+
+
+def test_should_replay_stored_stream(tmp_path: Path):
+    cache = ResponseCache(tmp_path)
+    stream = _stream("Hello", " world")
+
+    assert cache.get("a" * 64) is None
+    cache.put("a" * 64, stream)
+    cached = cache.get("a" * 64)
+
+    assert cached is not None
+    assert cached.chunks == stream.chunks
+    assert cached.offsets == pytest.approx(stream.offsets, abs=1e-3)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_should_expire_entries_after_ttl(tmp_path: Path):
+    cache = ResponseCache(tmp_path, ttl_seconds=60)
+    cache.put("a" * 64, _stream("old"))
+    file_path = next(tmp_path.glob("*/*.jsonl"))
+    recorded_at = time.time() - 120
+    os.utime(file_path, (recorded_at, recorded_at))
+
+    assert cache.get("a" * 64) is None
+    assert not file_path.exists()
+
+
+def test_should_evict_least_recently_replayed_entries_above_max_bytes(tmp_path: Path):
+    entry_size = len(_stream("x" * 100).dumps("a" * 64))
+    cache = ResponseCache(tmp_path, max_bytes=entry_size * 2)
+
+    cache.put("a" * 64, _stream("x" * 100))
+    cache.put("b" * 64, _stream("y" * 100))
+    for file_path in tmp_path.glob("*/*.jsonl"):
+        os.utime(file_path, (time.time() - 10, file_path.stat().st_mtime))
+    cache.get("a" * 64)
+    cache.put("c" * 64, _stream("z" * 100))
+
+    assert cache.get("a" * 64) is not None
+    assert cache.get("b" * 64) is None
+    assert cache.get("c" * 64) is not None
+
+
+def test_should_drop_unreadable_entry(tmp_path: Path):
+    cache = ResponseCache(tmp_path)
+    cache.put("a" * 64, _stream("Hello"))
+    file_path = next(tmp_path.glob("*/*.jsonl"))
+    file_path.write_text("not json")
+
+    assert cache.get("a" * 64) is None
+    assert not file_path.exists()
+
+
+@pytest.mark.asyncio
+async def test_should_replay_with_accelerated_timing():
+    stream = _stream("a", "b", "c")
+    stream.offsets = [0.0, 0.2, 0.4]
+
+    start = time.monotonic()
+    replayed = [chunk async for chunk in stream.replay(speed=4)]
+    accelerated = time.monotonic() - start
+
+    start = time.monotonic()
+    [chunk async for chunk in stream.replay()]
+    instant = time.monotonic() - start
+
+    assert replayed == stream.chunks
+    assert 0.09 <= accelerated < 0.3
+    assert instant < 0.05
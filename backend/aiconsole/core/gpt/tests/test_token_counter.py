@@ -0,0 +1,89 @@
+import json
+
+import pytest
+import tiktoken
+
+from aiconsole.core.gpt.token_counter import TokenCounter
+
+# Same pre-tokenization as cl100k_base, with a small vocabulary which does not need to be downloaded
+_PAT_STR = r"""(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"""
+_MERGES = [
+    b'{"',
+    b" {",
+    b' {"',
+    b'"}',
+    b'"},',
+    b'"}]',
+    b"[{",
+    b'[{"',
+    b'":',
+    b'",',
+    b"ro",
+    b"role",
+    b"us",
+    b"user",
+    b" the",
+]
+
+
+@pytest.fixture
+def encoding() -> tiktoken.Encoding:
+    mergeable_ranks = {bytes([i]): i for i in range(256)}
+    for token in _MERGES:
+        mergeable_ranks[token] = len(mergeable_ranks)
+
+    return tiktoken.Encoding(name="test", pat_str=_PAT_STR, mergeable_ranks=mergeable_ranks, special_tokens={})
+
+
+def _messages(count: int) -> list[dict]:
+    return [
+        {"role": "user" if i % 2 == 0 else "assistant", "content": f'Message {i} about the "code"\n{{x: {i}}}'}
+        for i in range(count)
+    ]
+
+
+def test_should_match_encoding_the_whole_transcript(encoding: tiktoken.Encoding):
+    counter = TokenCounter()
+
+    for count in [0, 1, 2, 50, 500]:
+        messages = _messages(count)
+        # Only the brackets around the list are counted differently, however long it is
+        assert abs(counter.count_messages(encoding, messages) - len(encoding.encode(json.dumps(messages)))) <= 1
+
+
+def test_should_encode_only_new_messages(encoding: tiktoken.Encoding):
+    counter = TokenCounter()
+    messages = _messages(10)
+
+    counter.count_messages(encoding, messages)
+    assert counter.misses == 10
+
+    counter.count_messages(encoding, messages + [{"role": "user", "content": "One more"}])
+    assert counter.misses == 11
+    assert counter.hits == 10
+
+
+def test_should_count_tool_definition_sets_once(encoding: tiktoken.Encoding):
+    counter = TokenCounter()
+    tools = [{"type": "function", "function": {"name": "python", "parameters": {"type": "object"}}}]
+
+    expected = len(encoding.encode(json.dumps(tools[0])))
+    assert counter.count_tools(encoding, tools) == expected
+    assert counter.count_tools(encoding, tools) == expected
+    assert counter.count_tools(encoding, []) == 0
+    assert counter.misses == 1
+
+
+def test_should_evict_least_recently_used_counts(encoding: tiktoken.Encoding):
+    counter = TokenCounter(max_entries=2)
+
+    counter.count(encoding, "a")
+    counter.count(encoding, "b")
+    counter.count(encoding, "a")
+    counter.count(encoding, "c")
+
+    counter.count(encoding, "a")
+    assert counter.misses == 3
+
+    counter.count(encoding, "b")
+    assert counter.misses == 4
@@ -0,0 +1,98 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""
+Token counts of request messages and tool definitions, memoized by encoding and a digest of the counted text,
+so counting a request encodes only the messages not seen before.
+
+A request is counted as its messages dumped to a JSON list. tiktoken splits text into pieces before encoding
+and never merges tokens across pieces, and as a message dumped to JSON starts and ends with punctuation,
+counting it with the separators around it, ' ' + message + ',', gives the same tokens it has in the whole list.
+The sum of the message counts differs from encoding the list only around its brackets, by a token or two.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from functools import lru_cache
+
+import tiktoken
+
+from aiconsole.consts import TOKEN_COUNT_CACHE_SIZE
+
+# The brackets around the list take the place of the separators of its first and last message
+LIST_OVERHEAD_TOKENS = 1
+
+
+@lru_cache
+def get_encoding(model: str) -> tiktoken.Encoding:
+    return tiktoken.encoding_for_model(model)
+
+
+class TokenCounter:
+    def __init__(self, max_entries: int = TOKEN_COUNT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._counts: OrderedDict[tuple[str, bytes], int] = OrderedDict()
+
+    def count(self, encoding: tiktoken.Encoding, text: str) -> int:
+        key = (encoding.name, hashlib.blake2b(text.encode("utf8", errors="replace"), digest_size=16).digest())
+
+        count = self._counts.get(key)
+        if count is not None:
+            self._counts.move_to_end(key)
+            self.hits += 1
+            return count
+
+        self.misses += 1
+        count = len(encoding.encode(text))
+
+        self._counts[key] = count
+        if len(self._counts) > self.max_entries:
+            self._counts.popitem(last=False)
+
+        return count
+
+    def count_message(self, encoding: tiktoken.Encoding, message: dict) -> int:
+        """
+        Tokens the message adds to a dumped list of messages.
+        """
+        return self.count(encoding, " " + json.dumps(message) + ",")
+
+    def count_messages(self, encoding: tiktoken.Encoding, messages: list[dict]) -> int:
+        """
+        Tokens of json.dumps(messages), summed from the counts of the messages.
+        """
+        if not messages:
+            return self.count(encoding, "[]")
+
+        return sum(self.count_message(encoding, message) for message in messages) + LIST_OVERHEAD_TOKENS
+
+    def count_tools(self, encoding: tiktoken.Encoding, tools: list[dict]) -> int:
+        """
+        Tokens of the tool definitions of a request, a set of tools is usually sent with many requests.
+        """
+        if not tools:
+            return 0
+
+        return self.count(encoding, ",".join(json.dumps(tool) for tool in tools))
+
+    def clear(self) -> None:
+        self._counts.clear()
+
+
+@lru_cache
+def token_counter() -> TokenCounter:
+    return TokenCounter()
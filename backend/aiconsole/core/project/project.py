@@ -103,6 +103,10 @@ async def close_project():
 
 async def reinitialize_project():
     from aiconsole.core.assets import assets
+    from aiconsole.core.chat.chat_search_index import chat_search_index
+    from aiconsole.core.chat.storage_backends.chat_storage_backend import (
+        chat_storage_backend,
+    )
     from aiconsole.core.project.paths import (
         get_project_directory,
         get_project_directory_safe,
@@ -136,6 +140,9 @@ async def reinitialize_project():
     await _materials.reload(initial=True)
     await _agents.reload(initial=True)
 
+    await chat_storage_backend().reconcile()
+    chat_search_index().start_reconcile()
+
 
 async def choose_project(path: Path, background_tasks: BackgroundTasks):
     if not path.exists():
@@ -17,14 +17,55 @@
 import argparse
 import logging
 import os
+import sys
+from pathlib import Path
+from typing import Callable, Protocol, TypeVar
 
 from uvicorn import run
 
 _log = logging.getLogger(__name__)
 
 
+class _ProgressReport(Protocol):
+    seconds: float
+
+
+_Report = TypeVar("_Report", bound=_ProgressReport)
+
+
+def _progress_printer(is_finished: Callable[[_Report], bool] | None = None) -> Callable[[_Report], None]:
+    """
+    Returns an on_progress callback of the chat commands, printing the report to stderr at most once a second,
+    and once it is finished.
+    """
+    last_printed = 0.0
+
+    def print_progress(report: _Report) -> None:
+        nonlocal last_printed
+        if report.seconds - last_printed >= 1 or (is_finished is not None and is_finished(report)):
+            last_printed = report.seconds
+            print(report, file=sys.stderr)
+
+    return print_progress
+
+
+def _add_command(
+    commands: "argparse._SubParsersAction[argparse.ArgumentParser]",
+    name: str,
+    description: str,
+    run_command: Callable[[argparse.Namespace], None],
+) -> argparse.ArgumentParser:
+    command = commands.add_parser(name, help=description, description=description)
+    command.set_defaults(run_command=run_command)
+    return command
+
+
+def _project_path_argument(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("project_path", type=Path, nargs="?", help="Project directory.", default=Path(os.getcwd()))
+
+
 def run_aiconsole(dev: bool):
-    parser = argparse.ArgumentParser(description="Start the backend server.")
+    parser = argparse.ArgumentParser(description="Start the backend server, or run one of the chat commands.")
     parser.add_argument("--port", type=int, help="Port to listen on.", default=8000)
     parser.add_argument(
         "--origin",
@@ -33,15 +74,50 @@ def run_aiconsole(dev: bool):
         default="http://localhost:3000",
     )
 
-    port = parser.parse_args().port
-    origin = parser.parse_args().origin
-    os.environ["CORS_ORIGIN"] = origin
+    commands = parser.add_subparsers(title="commands", dest="command")
+
+    command = _add_command(
+        commands, "migrate-chats", "Convert all chats of a project to the current format.", migrate_chats
+    )
+    _project_path_argument(command)
+    command.add_argument("--workers", type=int, help="Number of worker processes.", default=None)
+
+    command = _add_command(
+        commands,
+        "import-chats-to-sqlite",
+        "Copy all chat files of a project into its SQLite chat database, see CHAT_STORAGE_BACKEND.",
+        import_chats_to_sqlite,
+    )
+    _project_path_argument(command)
+
+    command = _add_command(
+        commands, "export-chats", "Export all chats of a project into an NDJSON archive.", export_chats
+    )
+    _project_path_argument(command)
+    command.add_argument("--output", "-o", type=str, help="Archive file, - for stdout.", default="-")
+    command.add_argument("--compress", action="store_true", help="Gzip the archive, implied by a .gz output file.")
+
+    command = _add_command(
+        commands, "import-chats", "Import chats from an NDJSON archive made by export-chats.", import_chats
+    )
+    command.add_argument("archive", type=str, help="Archive file, plain or gzipped, - for stdin.")
+    _project_path_argument(command)
+    command.add_argument("--replace", action="store_true", help="Replace chats already in the project.")
+    command.add_argument("--workers", type=int, help="Number of validating processes.", default=None)
+
+    args = parser.parse_args()
+
+    if args.command is not None:
+        args.run_command(args)
+        return
+
+    os.environ["CORS_ORIGIN"] = args.origin
 
     try:
         run(
             "aiconsole.app:app",
             host="0.0.0.0",
-            port=port,
+            port=args.port,
             reload=dev,
             factory=True,
         )
@@ -49,6 +125,90 @@ def run_aiconsole(dev: bool):
         _log.info("Exiting ...")
 
 
+def migrate_chats(args: argparse.Namespace):
+    from aiconsole.core.chat.migrate_chats import MigrationReport, migrate_chats
+
+    def is_finished(report: MigrationReport) -> bool:
+        return report.done == report.total
+
+    report = migrate_chats(args.project_path, workers=args.workers, on_progress=_progress_printer(is_finished))
+    print(report)
+
+    if report.failed:
+        print("Failed to migrate:", *report.failed_files, sep="\n  ", file=sys.stderr)
+        sys.exit(1)
+
+
+def import_chats_to_sqlite(args: argparse.Namespace):
+    from aiconsole.core.chat.storage_backends.sqlite_chat_storage import (
+        ImportReport,
+        import_json_chats,
+    )
+
+    def is_finished(report: ImportReport) -> bool:
+        return report.done == report.total
+
+    report = import_json_chats(args.project_path, on_progress=_progress_printer(is_finished))
+    print(report)
+
+    if report.failed:
+        sys.exit(1)
+
+
+def export_chats(args: argparse.Namespace):
+    from aiconsole.core.chat.chat_archive import (
+        ArchiveExportReport,
+        encode_archive,
+        export_chats,
+    )
+
+    report = ArchiveExportReport()
+    chunks = encode_archive(
+        export_chats(args.project_path, report), compress=args.compress or args.output.endswith(".gz")
+    )
+
+    if args.output == "-":
+        for chunk in chunks:
+            sys.stdout.buffer.write(chunk)
+        sys.stdout.buffer.flush()
+    else:
+        with open(args.output, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+    print(f"{report.chats} chats exported, {report.blobs} blobs, {report.failed} failed", file=sys.stderr)
+
+    if report.failed:
+        sys.exit(1)
+
+
+def import_chats(args: argparse.Namespace):
+    from aiconsole.core.chat.chat_archive import import_chats
+
+    try:
+        if args.archive == "-":
+            report = import_chats(
+                sys.stdin.buffer,
+                args.project_path,
+                replace=args.replace,
+                workers=args.workers,
+                on_progress=_progress_printer(),
+            )
+        else:
+            with open(args.archive, "rb") as f:
+                report = import_chats(
+                    f, args.project_path, replace=args.replace, workers=args.workers, on_progress=_progress_printer()
+                )
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+
+    print(report)
+
+    if report.failed:
+        sys.exit(1)
+
+
 def aiconsole_dev():
     run_aiconsole(dev=True)
 
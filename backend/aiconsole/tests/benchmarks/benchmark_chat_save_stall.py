@@ -0,0 +1,97 @@
+"""
+Measures how long saving a large chat blocks the event loop, dumping and writing it with json on the loop
+as save_chat_history used to, versus through ChatWriter, which only takes the snapshot on the loop.
+
+Run with: python -m aiconsole.tests.benchmarks.benchmark_chat_save_stall
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime
+
+from aiconsole.core.chat.actor_id import ActorId
+from aiconsole.core.chat.save_chat_history import chat_writer
+from aiconsole.core.chat.types import AICMessage, AICMessageGroup, AICToolCall, Chat
+from aiconsole.core.project import project
+
+GROUPS = 200
+OUTPUT_SIZE = 100 * 1024
+
+
+def _chat(chat_id: str) -> Chat:
+    return Chat(
+        id=chat_id,
+        name="",
+        last_modified=datetime.now(),
+        message_groups=[
+            AICMessageGroup(
+                id=f"g{i}",
+                actor_id=ActorId(type="agent", id="agent"),
+                role="assistant",
+                task="",
+                materials_ids=[],
+                analysis="",
+                messages=[
+                    AICMessage(
+                        id=f"m{i}",
+                        timestamp="",
+                        content="x" * 1000,
+                        tool_calls=[AICToolCall(id=f"t{i}", code="print()", headline="", output="y" * OUTPUT_SIZE)],
+                    )
+                ],
+            )
+            for i in range(GROUPS)
+        ],
+    )
+
+
+async def _max_stall(save) -> float:
+    """
+    Longest gap between ticks of a coroutine that wants to run every millisecond.
+    """
+    max_gap = 0.0
+    done = False
+
+    async def ticker():
+        nonlocal max_gap
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            max_gap = max(max_gap, now - last)
+            last = now
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    await save()
+    done = True
+    await ticker_task
+
+    return max_gap
+
+
+async def main():
+    project._project_initialized = True
+    os.chdir(tempfile.mkdtemp())
+
+    sync_chat = _chat("sync")
+    writer_chat = _chat("writer")
+
+    async def save_sync():
+        content = sync_chat.model_dump(exclude={"id", "last_modified", "lock_id"})
+        os.makedirs("chats", exist_ok=True)
+        with open(os.path.join("chats", "sync.json"), "w", encoding="utf8", errors="replace") as f:
+            json.dump(content, f)
+
+    async def save_with_writer():
+        await chat_writer().save(writer_chat, scope="message_groups")
+
+    print(f"chat of ~{GROUPS * OUTPUT_SIZE / 1024 / 1024:.0f} MB")
+    print(f"json.dump on the loop: {await _max_stall(save_sync) * 1000:.1f}ms max stall")
+    print(f"chat_writer().save:    {await _max_stall(save_with_writer) * 1000:.1f}ms max stall")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+"""
+Indexes a project of 20 000 synthetic chats for search and measures the latency of queries of different selectivity.
+
+Run with: python -m aiconsole.tests.benchmarks.benchmark_chat_search
+"""
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from aiconsole.core.chat.chat_search_index import chat_search_index
+from aiconsole.core.project import project
+
+CHATS = 20_000
+GROUPS_PER_CHAT = 10
+
+_rng = random.Random(0)
+WORDS = ["".join(_rng.choices("abcdefghijklmnopqrstuvwxyz", k=_rng.randint(3, 10))) for _ in range(5_000)]
+QUERIES = [WORDS[0], f"{WORDS[1]} {WORDS[2]}", WORDS[3][:3], WORDS[4][:2], "nonexistent"]
+
+
+def _content(rng: random.Random, chat_id: str) -> dict:
+    def text(length: int) -> str:
+        return " ".join(rng.choices(WORDS, k=length))
+
+    return {
+        "name": "",
+        "title_edited": False,
+        "message_groups": [
+            {
+                "id": f"{chat_id}g{i}",
+                "analysis": text(10),
+                "messages": [
+                    {
+                        "id": f"{chat_id}m{i}",
+                        "content": text(60),
+                        "tool_calls": [{"id": f"{chat_id}t{i}", "code": text(20), "output": text(40)}],
+                    }
+                ],
+            }
+            for i in range(GROUPS_PER_CHAT)
+        ],
+    }
+
+
+async def main():
+    project._project_initialized = True
+    os.chdir(tempfile.mkdtemp())
+    history_directory = Path("chats").absolute()
+
+    rng = random.Random(0)
+    start = time.perf_counter()
+    for i in range(CHATS):
+        chat_search_index().index_chat(history_directory, f"chat{i}", _content(rng, f"chat{i}"))
+    print(f"indexed {CHATS} chats in {time.perf_counter() - start:.1f}s")
+
+    for query in QUERIES:
+        timings = []
+        for _ in range(10):
+            start = time.perf_counter()
+            results = await chat_search_index().search(query, limit=20)
+            timings.append(time.perf_counter() - start)
+
+        timings.sort()
+        print(
+            f"{query!r:>16}: {len(results.results)} results, "
+            f"median {timings[len(timings) // 2] * 1000:.1f}ms, max {timings[-1] * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
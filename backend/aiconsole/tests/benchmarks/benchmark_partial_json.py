@@ -0,0 +1,46 @@
+"""
+Compares reading the arguments of a streamed tool call after every chunk with parse_partial_json,
+which parses all the arguments received so far each time, and with the incremental PartialJSONParser.
+
+Run with: python -m aiconsole.tests.benchmarks.benchmark_partial_json
+"""
+import json
+import time
+
+from aiconsole.core.gpt.parse_partial_json import parse_partial_json
+from aiconsole.core.gpt.partial_json_parser import PartialJSONParser
+
+CODE_SIZE = 20 * 1024
+CHUNK_SIZE = 4
+
+
+def _chunks() -> list[str]:
+    line = 'print("The quick brown fox jumps over the lazy dog", i)\n'
+    code = (line * (CODE_SIZE // len(line) + 1))[:CODE_SIZE]
+    arguments = json.dumps({"headline": "Printing a lot", "code": code})
+    return [arguments[i : i + CHUNK_SIZE] for i in range(0, len(arguments), CHUNK_SIZE)]
+
+
+def benchmark_parse_partial_json(chunks: list[str]) -> float:
+    start = time.perf_counter()
+    arguments = ""
+    for chunk in chunks:
+        arguments += chunk
+        parse_partial_json(arguments)
+    return time.perf_counter() - start
+
+
+def benchmark_incremental(chunks: list[str]) -> float:
+    start = time.perf_counter()
+    parser = PartialJSONParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        parser.value
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    chunks = _chunks()
+    print(f"{CODE_SIZE // 1024} KB of code in {len(chunks)} chunks")
+    print(f"parse_partial_json: {benchmark_parse_partial_json(chunks):.3f}s")
+    print(f"incremental:        {benchmark_incremental(chunks):.3f}s")
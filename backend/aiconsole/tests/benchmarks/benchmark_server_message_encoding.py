@@ -0,0 +1,58 @@
+"""
+Compares encoding a chat mutation broadcast per recipient (the old send_json path)
+with encoding it once for all of them.
+
+Run with: python -m aiconsole.tests.benchmarks.benchmark_server_message_encoding
+"""
+import json
+import time
+
+from aiconsole.api.websockets.connection_manager import (
+    encode_server_message,
+    encode_stats,
+)
+from aiconsole.api.websockets.server_messages import (
+    NotifyAboutChatMutationServerMessage,
+)
+from aiconsole.core.chat.chat_mutations import AppendToOutputToolCallMutation
+
+MESSAGES = 2000
+RECIPIENTS = 8
+
+
+def _message() -> NotifyAboutChatMutationServerMessage:
+    return NotifyAboutChatMutationServerMessage(
+        request_id="r",
+        chat_id="chat",
+        mutation=AppendToOutputToolCallMutation(tool_call_id="t", output_delta="x" * 4096),
+    )
+
+
+def benchmark_per_recipient() -> float:
+    message = _message()
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        for _ in range(RECIPIENTS):
+            json.dumps(
+                {"type": message.get_type(), **message.model_dump(exclude_none=True, mode="json")},
+                separators=(",", ":"),
+                ensure_ascii=False,
+            )
+    return time.perf_counter() - start
+
+
+def benchmark_once() -> float:
+    message = _message()
+    start = time.perf_counter()
+    for _ in range(MESSAGES):
+        encode_server_message(message)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    print(f"{MESSAGES} messages, {RECIPIENTS} recipients")
+    print(f"per recipient: {benchmark_per_recipient():.3f}s")
+    print(f"once:          {benchmark_once():.3f}s")
+    print(
+        f"average encode time: {encode_stats.average_seconds * 1e6:.1f}us, max: {encode_stats.max_seconds * 1e6:.1f}us"
+    )
@@ -0,0 +1,91 @@
+"""
+Measures GPTPartialResponse accumulating streamed chunks and converting them to a GPTResponse at the end, the work
+GPTExecutor does for every chunk of every response.
+
+Replays responses recorded by the response cache, given as paths to files in .aic/llm_cache, or synthesized streams
+of a plain text answer and a python tool call.
+
+Run with: python -m aiconsole.tests.benchmarks.benchmark_stream_accumulator [.aic/llm_cache/ab/abc...jsonl ...]
+"""
+import json
+import sys
+import time
+
+from litellm import ModelResponse  # type: ignore
+
+from aiconsole.core.gpt.partial import GPTPartialResponse, chunk_from_dict
+from aiconsole.core.gpt.response_cache import RecordedStream
+
+TOKENS = 4000
+REPEATS = 5
+
+_WORDS = "the chat agent code python print import return value for while in of to a and result error file".split()
+
+
+def _chunk_dict(delta: dict, finish_reason: str | None = None) -> dict:
+    return {
+        "id": "chatcmpl-benchmark",
+        "created": 1700000000,
+        "model": "gpt-4-1106-preview",
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _synthesized_streams() -> dict[str, list[dict]]:
+    words = [_WORDS[i % len(_WORDS)] for i in range(TOKENS)]
+
+    text = [_chunk_dict({"role": "assistant", "content": ""})]
+    text += [_chunk_dict({"content": " " + word}) for word in words]
+    text.append(_chunk_dict({}, finish_reason="stop"))
+
+    arguments = json.dumps({"headline": "Printing words", "code": "\n".join(f"print({w!r})" for w in words)})
+    tool_call = [
+        _chunk_dict(
+            {
+                "role": "assistant",
+                "tool_calls": [
+                    {
+                        "index": 0,
+                        "id": "call_benchmark",
+                        "type": "function",
+                        "function": {"name": "python", "arguments": ""},
+                    }
+                ],
+            }
+        )
+    ]
+    tool_call += [
+        _chunk_dict({"tool_calls": [{"index": 0, "function": {"arguments": arguments[i : i + 4]}}]})
+        for i in range(0, len(arguments), 4)
+    ]
+    tool_call.append(_chunk_dict({}, finish_reason="tool_calls"))
+
+    return {"text": text, "tool call": tool_call}
+
+
+def _recorded_streams(paths: list[str]) -> dict[str, list[dict]]:
+    streams = {}
+    for path in paths:
+        with open(path, "rb") as f:
+            streams[path] = RecordedStream.loads(f.read()).chunks
+    return streams
+
+
+def benchmark(chunks: list[ModelResponse]) -> float:
+    start = time.perf_counter()
+    partial_response = GPTPartialResponse()
+    for chunk in chunks:
+        partial_response.apply_chunk(chunk)
+        # Consumers read the tool calls after every chunk
+        for tool_call in partial_response.choices[0].message.tool_calls:
+            tool_call.function.arguments_dict
+    partial_response.to_final_response()
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    streams = _recorded_streams(sys.argv[1:]) if len(sys.argv) > 1 else _synthesized_streams()
+    for name, chunk_dicts in streams.items():
+        chunks = [chunk_from_dict(chunk_dict) for chunk_dict in chunk_dicts]
+        elapsed = min(benchmark(chunks) for _ in range(REPEATS))
+        print(f"{name}: {len(chunks)} chunks in {elapsed * 1000:.1f}ms, {elapsed / len(chunks) * 1e6:.2f}us per chunk")
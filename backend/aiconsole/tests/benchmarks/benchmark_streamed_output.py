@@ -0,0 +1,72 @@
+"""
+Streams 10 MB of tool call output through apply_mutation in small deltas and compares
+plain str concatenation with the StreamedTextModel fields.
+
+Run with: python -m aiconsole.tests.benchmarks.benchmark_streamed_output
+"""
+import time
+from datetime import datetime
+
+from aiconsole.core.chat.actor_id import ActorId
+from aiconsole.core.chat.apply_mutation import apply_mutation
+from aiconsole.core.chat.chat_mutations import AppendToOutputToolCallMutation
+from aiconsole.core.chat.types import AICMessage, AICMessageGroup, AICToolCall, Chat
+
+TOTAL_SIZE = 10 * 1024 * 1024
+# One 4 KB chunk of output per mutation
+DELTA = ("x" * 63 + "\n") * 64
+
+
+def _chat() -> Chat:
+    return Chat(
+        id="benchmark",
+        name="",
+        last_modified=datetime.now(),
+        title_edited=False,
+        message_groups=[
+            AICMessageGroup(
+                id="g",
+                actor_id=ActorId(type="agent", id="agent"),
+                role="assistant",
+                task="",
+                materials_ids=[],
+                analysis="",
+                messages=[
+                    AICMessage(
+                        id="m",
+                        timestamp="",
+                        content="",
+                        tool_calls=[AICToolCall(id="t", code="", headline="")],
+                    )
+                ],
+            )
+        ],
+    )
+
+
+def benchmark_str_concatenation() -> float:
+    # Held in a container, like the model field was, so CPython can not resize the str in place
+    tool_call = {"output": ""}
+    start = time.perf_counter()
+    for _ in range(TOTAL_SIZE // len(DELTA)):
+        tool_call["output"] += DELTA
+    return time.perf_counter() - start
+
+
+def benchmark_text_buffer() -> float:
+    chat = _chat()
+    mutation = AppendToOutputToolCallMutation(tool_call_id="t", output_delta=DELTA)
+
+    start = time.perf_counter()
+    for _ in range(TOTAL_SIZE // len(DELTA)):
+        apply_mutation(chat, mutation)
+    output = chat.message_groups[0].messages[0].tool_calls[0].output
+    elapsed = time.perf_counter() - start
+
+    assert output is not None and len(output) == TOTAL_SIZE
+    return elapsed
+
+
+if __name__ == "__main__":
+    print(f"str +=:     {benchmark_str_concatenation():.3f}s")
+    print(f"Streamed:   {benchmark_text_buffer():.3f}s")
@@ -0,0 +1,68 @@
+"""
+Compares counting the tokens of a long transcript by encoding it as a whole, as GPTRequest used to
+on every request, with summing memoized per message counts, and reports how far the sum is off.
+
+Needs the tiktoken encoding of the model, downloaded on first use.
+
+Run with: python -m aiconsole.tests.benchmarks.benchmark_token_counting
+"""
+import json
+import random
+import time
+
+from aiconsole.core.gpt.consts import GPTEncoding
+from aiconsole.core.gpt.token_counter import TokenCounter, get_encoding
+
+MESSAGES = 400
+# Requests made by a director loop for a single user turn
+REQUESTS = 5
+
+_WORDS = "the chat agent code python print import return value for while in of to a and result error file".split()
+
+
+def _messages() -> list[dict]:
+    random.seed(0)
+    messages = []
+    for i in range(MESSAGES):
+        text = " ".join(random.choice(_WORDS) for _ in range(150))
+        if i % 3 == 0:
+            text += f'\n```python\nfor i in range({i}):\n    print("{text[:40]}", i)\n```'
+        messages.append({"role": "user" if i % 2 == 0 else "assistant", "content": text})
+    return messages
+
+
+def benchmark_full_encode(messages: list[dict]) -> tuple[float, int]:
+    encoding = get_encoding(GPTEncoding.GPT_4)
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        # Each request of the loop sees the transcript grown by one message, counted twice per request
+        transcript = messages[: len(messages) - REQUESTS + i + 1]
+        for _ in range(2):
+            count = len(encoding.encode(json.dumps(transcript)))
+    return time.perf_counter() - start, count
+
+
+def benchmark_memoized(messages: list[dict], counter: TokenCounter) -> tuple[float, int]:
+    encoding = get_encoding(GPTEncoding.GPT_4)
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        transcript = messages[: len(messages) - REQUESTS + i + 1]
+        for _ in range(2):
+            count = counter.count_messages(encoding, transcript)
+    return time.perf_counter() - start, count
+
+
+if __name__ == "__main__":
+    messages = _messages()
+    counter = TokenCounter()
+
+    full_seconds, exact = benchmark_full_encode(messages)
+    # The first request of a chat opened from disk encodes all its messages once
+    cold_seconds, _ = benchmark_memoized(messages, counter)
+    warm_seconds, summed = benchmark_memoized(messages, counter)
+
+    print(f"{MESSAGES} messages, {exact} tokens, {REQUESTS} requests counted twice each")
+    print(f"full encode:     {full_seconds:.3f}s")
+    print(f"memoized, cold:  {cold_seconds:.3f}s")
+    print(f"memoized, warm:  {warm_seconds:.3f}s")
+    print(f"summed count: {summed}, off by {summed - exact} tokens")
@@ -0,0 +1,124 @@
+# The AIConsole Project
+#
+# Copyright 2023 10Clouds
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+from typing import TYPE_CHECKING, Any
+
+from pydantic import (
+    BaseModel,
+    PrivateAttr,
+    SerializerFunctionWrapHandler,
+    model_serializer,
+)
+
+
+class TextBuffer:
+    """
+    Append-only text, appends are O(1) and chunks are joined on the next read.
+    """
+
+    __slots__ = ("_chunks", "_length")
+
+    def __init__(self, text: str = ""):
+        self._chunks: list[str] = [text] if text else []
+        self._length = len(text)
+
+    def append(self, text: str) -> None:
+        if text:
+            self._chunks.append(text)
+            self._length += len(text)
+
+    def __str__(self) -> str:
+        if len(self._chunks) > 1:
+            self._chunks = ["".join(self._chunks)]
+
+        return self._chunks[0] if self._chunks else ""
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __repr__(self) -> str:
+        return f"TextBuffer({str(self)!r})"
+
+
+class StreamedTextModel(BaseModel):
+    """
+    Base of models with str fields streamed in small deltas, see append_text.
+
+    A field being appended to is moved out of the model into a private TextBuffer and joined back on its next read,
+    dump, copy or comparison, so to everything else the fields stay plain str fields.
+    """
+
+    _text_buffers: dict[str, TextBuffer] | None = PrivateAttr(default=None)
+
+    def append_text(self, field: str, text: str) -> None:
+        """
+        Appends to a str field, a None one is treated as empty.
+        """
+        buffers = self._text_buffers
+        if buffers is None:
+            buffers = self._text_buffers = {}
+
+        buffer = buffers.get(field)
+        if buffer is None:
+            buffer = buffers[field] = TextBuffer(self.__dict__.pop(field) or "")
+
+        buffer.append(text)
+
+    def join_text(self) -> None:
+        """
+        Moves the appended text back into the fields.
+        """
+        buffers = self._text_buffers
+        if buffers:
+            self._text_buffers = None
+            for field, buffer in buffers.items():
+                self.__dict__[field] = str(buffer)
+
+    if not TYPE_CHECKING:
+
+        def __getattr__(self, name: str) -> Any:
+            if not name.startswith("_"):
+                private = self.__pydantic_private__
+                buffers = private.get("_text_buffers") if private else None
+                if buffers and name in buffers:
+                    self.join_text()
+                    return self.__dict__[name]
+
+            return super().__getattr__(name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        buffers = self._text_buffers if not name.startswith("_") else None
+        if buffers and name in buffers:
+            # Replaced as a whole, what was appended is gone
+            del buffers[name]
+
+        super().__setattr__(name, value)
+
+    def __eq__(self, other: Any) -> bool:
+        self.join_text()
+        if isinstance(other, StreamedTextModel):
+            other.join_text()
+
+        return super().__eq__(other)
+
+    def __copy__(self):
+        # The copy would share the buffers
+        self.join_text()
+        return super().__copy__()
+
+    @model_serializer(mode="wrap")
+    def _serialize_joined_text(self, handler: SerializerFunctionWrapHandler):
+        self.join_text()
+        return handler(self)